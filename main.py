@@ -5,6 +5,9 @@ from tkinter import messagebox, filedialog
 from tkinter import ttk
 import subprocess
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'common'))
+from analysis_worker import AnalysisWorker
+
 
 class AppConfig:
     """Конфигурация приложения"""
@@ -16,12 +19,29 @@ class AppConfig:
         "Работа с анкетами": "scripts/ankets/ankets_script.py",
         "УДС с сегментами по анкетам": "scripts/stats_ankets/show_low_segments.py"
     }
+    TILE_SERVER = "scripts/tiles/tile_server.py"
+    TILES_ARCHIVE = './sources/tiles/tiles.sqlite'
     VEHICLE_TYPES = ["bus", "minibus", "tramway", "trolleybus"]
-    WINDOW_SIZE = "700x300"
+    WINDOW_SIZE = "700x340"
+    POLL_INTERVAL_MS = 100  # опрос событий фонового обработчика
 
 
 class ScriptRunner:
-    """Класс для управления запуском скриптов"""
+    """Класс для управления запуском скриптов (отдельным процессом, если фоновый обработчик недоступен)"""
+
+    @staticmethod
+    def start_tile_server():
+        """Фоновый запуск локального сервера тайлов, если архив тайлов уже построен"""
+        if not os.path.exists(AppConfig.TILES_ARCHIVE):
+            return None
+        script_path = AppConfig.TILE_SERVER
+        try:
+            return subprocess.Popen([sys.executable, os.path.basename(script_path)],
+                                    cwd=os.path.dirname(script_path),
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Ошибка запуска сервера тайлов: {str(e)}")
+            return None
 
     @staticmethod
     def run_save_route(vehicle_type, route=None):
@@ -85,12 +105,21 @@ class ScriptRunner:
 class MainWindow:
     """Главное окно приложения"""
 
-    def __init__(self, root):
+    def __init__(self, root, worker=None):
         self.root = root
         self.root.title("Лаунчер маршрутов")
         self.root.geometry(AppConfig.WINDOW_SIZE)
 
+        # Фоновый обработчик держит дорожную сеть и данные в памяти; пока он не готов,
+        # скрипты запускаются отдельными процессами, как раньше
+        self.worker = worker
+        self.worker_ready = False
+        self.jobs = {}  # номер задания -> название
+
         self.setup_ui()
+        if self.worker is not None:
+            self.status_var.set("Загрузка фонового обработчика...")
+            self.root.after(AppConfig.POLL_INTERVAL_MS, self._poll_worker)
 
     def setup_ui(self):
         """Настройка пользовательского интерфейса"""
@@ -100,6 +129,10 @@ class MainWindow:
         self.create_transport_section(main_frame)
         self.create_ankets_section(main_frame)
 
+        # Строка состояния: ход выполнения заданий
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(main_frame, textvariable=self.status_var, anchor="w").pack(fill="x", pady=(5, 0))
+
     def create_transport_section(self, parent):
         """Создание секции с работой треками транспорта"""
         transport_frame = ttk.LabelFrame(parent, text="Работа с треками транспорта")
@@ -168,7 +201,7 @@ class MainWindow:
         ttk.Button(
             ankets_frame,
             text="УДС с сегментами по всем анкетам",
-            command=ScriptRunner.run_uds_segments_for_ankets_script
+            command=self.process_ankets_segments
         ).grid(row=2, column=2, padx=10, pady=5)
 
     def _select_anket_file(self):
@@ -181,6 +214,40 @@ class MainWindow:
             self.file_entry.delete(0, tk.END)
             self.file_entry.insert(0, file_path)
 
+    def _run_job(self, kind, title, fallback, **params):
+        """Задание фоновому обработчику или, если он не готов, запуск скрипта отдельным процессом"""
+        if self.worker_ready and self.worker.is_alive():
+            job_id = self.worker.submit(kind, **params)
+            self.jobs[job_id] = title
+            self.status_var.set(f"{title}: в очереди")
+        else:
+            fallback()
+
+    def _poll_worker(self):
+        """Забирает события фонового обработчика, не блокируя окно"""
+        for event, job_id, data in self.worker.poll():
+            title = self.jobs.get(job_id, "Фоновый обработчик")
+            if event == 'ready':
+                self.worker_ready = True
+                self.status_var.set("Фоновый обработчик готов")
+            elif event == 'failed':
+                self.status_var.set("Фоновый обработчик не запущен, скрипты выполняются отдельно")
+                print(data, file=sys.stderr)
+            elif event == 'progress':
+                self.status_var.set(f"{title}: {data}")
+            elif event == 'done':
+                self.jobs.pop(job_id, None)
+                self.status_var.set(f"{title}: готово за {data['seconds']} с")
+            elif event == 'error':
+                self.jobs.pop(job_id, None)
+                self.status_var.set(f"{title}: ошибка")
+                messagebox.showerror("Ошибка", f"{title}: {data}")
+        if self.worker.is_alive():
+            self.root.after(AppConfig.POLL_INTERVAL_MS, self._poll_worker)
+        elif self.worker_ready:
+            self.worker_ready = False
+            self.status_var.set("Фоновый обработчик остановлен, скрипты выполняются отдельно")
+
     def process_route(self):
         """Обработка нажатия кнопки для обработки маршрута"""
         vehicle_type = self.vehicle_type_var.get()
@@ -190,8 +257,12 @@ class MainWindow:
             messagebox.showwarning("Предупреждение", "Выберите тип транспорта")
             return
 
-        ScriptRunner.run_save_route(vehicle_type, route)
-        ScriptRunner.run_transport_script()
+        def fallback():
+            ScriptRunner.run_save_route(vehicle_type, route)
+            ScriptRunner.run_transport_script()
+
+        self._run_job('transport', f"Маршрут {vehicle_type} {route or 'все'}", fallback,
+                      vehicle_type=vehicle_type, route=route)
 
     def process_show_tracks(self):
         """Обработка нажатия кнопки для обработки маршрута"""
@@ -202,8 +273,12 @@ class MainWindow:
             messagebox.showwarning("Предупреждение", "Выберите тип транспорта")
             return
 
-        ScriptRunner.run_save_route(vehicle_type, route)
-        ScriptRunner.run_show_tracks_script()
+        def fallback():
+            ScriptRunner.run_save_route(vehicle_type, route)
+            ScriptRunner.run_show_tracks_script()
+
+        self._run_job('show_tracks', f"Треки {vehicle_type} {route or 'все'}", fallback,
+                      vehicle_type=vehicle_type, route=route)
 
     def process_anket(self):
         """Обработка нажатия кнопки для обработки маршрута"""
@@ -213,14 +288,29 @@ class MainWindow:
             messagebox.showwarning("Предупреждение", "Выберите файл")
             return
 
-        ScriptRunner.run_ankets_script(gpx_file)
+        self._run_job('anket', f"Анкета {os.path.basename(gpx_file)}",
+                      lambda: ScriptRunner.run_ankets_script(gpx_file), gpx_file=gpx_file)
+
+    def process_ankets_segments(self):
+        """Обработка нажатия кнопки для сегментов по всем анкетам"""
+        self._run_job('ankets_segments', "Сегменты по анкетам",
+                      ScriptRunner.run_uds_segments_for_ankets_script)
 
 
 def main():
     """Точка входа в приложение"""
+    # Фоновый обработчик загружает дорожную сеть и данные, пока открывается окно
+    worker = AnalysisWorker().start()
     root = tk.Tk()
-    app = MainWindow(root)
-    root.mainloop()
+    # Сервер тайлов работает, пока открыто окно: карты загружают с него УДС и сегменты
+    tile_server = ScriptRunner.start_tile_server()
+    app = MainWindow(root, worker)
+    try:
+        root.mainloop()
+    finally:
+        worker.stop()
+        if tile_server is not None:
+            tile_server.terminate()
 
 
 if __name__ == "__main__":
@@ -1,73 +1,36 @@
-import gpxpy
+import os
+import sys
 import folium
 import webbrowser
 import argparse
-from geopy.distance import distance
 from datetime import timedelta
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from gpx_reader import read_gpx
+from track_stats import low_speed_mask, segment_stats, track_summary
+
 def parse_gpx_file(gpx_path):
-    """Парсинг GPX файла и извлечение точек трека"""
-    with open(gpx_path, encoding='utf-8') as gpx_file:
-        gpx = gpxpy.parse(gpx_file)
-
-    points = []
-    for track in gpx.tracks:
-        for segment in track.segments:
-            for point in segment.points:
-                points.append({
-                    'latitude': point.latitude,
-                    'longitude': point.longitude,
-                    'time': point.time,
-                    'elevation': point.elevation
-                })
-    return points
-
-def calculate_statistics(points):
-    """Расчет статистики по точкам трека"""
-    total_distance = 0.0
-    total_time = timedelta()
-    speeds = []
-    segments = []
-
-    for i in range(1, len(points)):
-        prev = points[i - 1]
-        curr = points[i]
-
-        dist = distance(
-            (prev['latitude'], prev['longitude']),
-            (curr['latitude'], curr['longitude'])
-        ).meters
-
-        time_diff = curr['time'] - prev['time']
-
-        if time_diff.total_seconds() > 0:
-            speed = (dist / time_diff.total_seconds()) * 3.6  # км/ч
-            total_distance += dist
-            total_time += time_diff
-            speeds.append(speed)
-
-            segments.append({
-                'start': (prev['latitude'], prev['longitude']),
-                'end': (curr['latitude'], curr['longitude']),
-                'speed': speed,
-                'distance': dist,
-                'time': time_diff
-            })
-
-    avg_speed = (total_distance / total_time.total_seconds()) * 3.6 if total_time.total_seconds() > 0 else 0
-    low_speed_threshold = avg_speed * 0.5
+    """Парсинг GPX файла: массивы lat, lon, elevation, time (мс) точек трека"""
+    return read_gpx(gpx_path)
+
+def calculate_statistics(track):
+    """Расчет статистики по точкам трека (все отрезки — одним векторным расчетом)"""
+    segments = segment_stats(track)
+    summary = track_summary(segments)
 
     return {
-        'total_distance': total_distance,
-        'total_time': total_time,
-        'avg_speed': avg_speed,
-        'low_speed_threshold': low_speed_threshold,
+        'total_distance': summary['total_distance'],
+        'total_time': timedelta(seconds=summary['total_time_sec']),
+        'avg_speed': summary['avg_speed'],
+        'low_speed_threshold': summary['low_speed_threshold'],
         'segments': segments
     }
 
-def create_map(points, stats):
+def create_map(track, stats):
     """Создание интерактивной карты с треком"""
-    start_coords = (points[0]['latitude'], points[0]['longitude'])
+    lat = track['lat']
+    lon = track['lon']
+    start_coords = (float(lat[0]), float(lon[0]))
     mymap = folium.Map(location=start_coords, zoom_start=15)
 
     # Группы слоев
@@ -77,7 +40,7 @@ def create_map(points, stats):
 
     # Основной трек
     folium.PolyLine(
-        locations=[(p['latitude'], p['longitude']) for p in points],
+        locations=list(zip(lat.tolist(), lon.tolist())),
         color='blue',
         weight=3,
         opacity=0.7,
@@ -85,25 +48,27 @@ def create_map(points, stats):
     ).add_to(line_group)
 
     # Участки с низкой скоростью
-    for seg in stats['segments']:
-        if seg['speed'] < stats['low_speed_threshold']:
-            folium.PolyLine(
-                locations=[seg['start'], seg['end']],
-                color='red',
-                weight=5,
-                opacity=0.9,
-                popup=f"Низкая скорость: {seg['speed']:.1f} км/ч"
-            ).add_to(low_speed_group)
+    segments = stats['segments']
+    low_speed = segments[low_speed_mask(segments, stats['low_speed_threshold'])]
+    for start_lat, start_lon, end_lat, end_lon, speed in zip(
+            *(low_speed[column].tolist() for column in ('start_lat', 'start_lon', 'end_lat', 'end_lon', 'speed_kmh'))):
+        folium.PolyLine(
+            locations=[(start_lat, start_lon), (end_lat, end_lon)],
+            color='red',
+            weight=5,
+            opacity=0.9,
+            popup=f"Низкая скорость: {speed:.1f} км/ч"
+        ).add_to(low_speed_group)
 
     # Маркеры старта и финиша
     folium.Marker(
-        location=(points[0]['latitude'], points[0]['longitude']),
+        location=start_coords,
         popup="Старт",
         icon=folium.Icon(color='green')
     ).add_to(mymap)
 
     folium.Marker(
-        location=(points[-1]['latitude'], points[-1]['longitude']),
+        location=(float(lat[-1]), float(lon[-1])),
         popup="Финиш",
         icon=folium.Icon(color='red')
     ).add_to(mymap)
@@ -135,7 +100,7 @@ def create_map(points, stats):
         Порог низкой скорости: {stats['low_speed_threshold']:.1f} км/ч<br>
         Общее расстояние: {stats['total_distance'] / 1000:.2f} км<br>
         Общее время: {str(stats['total_time'])[:-7]}<br>
-        Точек: {len(points)}<br>
+        Точек: {len(lat)}<br>
         <i style="background:red; width:15px; height:15px; display:inline-block;"></i> Участки с низкой скоростью
     </div>
     '''
@@ -146,16 +111,16 @@ def create_map(points, stats):
 def main(gpx_path):
     """Основная функция обработки GPX файла"""
     try:
-        points = parse_gpx_file(gpx_path)
-        if not points:
+        track = parse_gpx_file(gpx_path)
+        if len(track['lat']) == 0:
             print("Не удалось извлечь точки трека из GPX файла")
             return
 
-        stats = calculate_statistics(points)
+        stats = calculate_statistics(track)
         print(f"Обработка GPX файла: {gpx_path}")
         print(f"Средняя скорость: {stats['avg_speed']:.1f} км/ч")
 
-        mymap = create_map(points, stats)
+        mymap = create_map(track, stats)
         output_file = gpx_path.replace('.gpx', '_map.html')
         mymap.save(output_file)
         webbrowser.open(output_file)
@@ -0,0 +1,118 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import avl_store
+from route_batch import (CSV_PATH, ROADS_SHP_PATH, VEHICLE_TYPES, ensure_store, init_worker, prepare_routing,
+                         select_routes, take_cache_entries, worker)
+from route_cache import load_route_cache
+from route_pipeline import run_route
+from tile_store import archive_layers, ensure_tile_server
+
+TILES_ARCHIVE = '../../sources/tiles/tiles.sqlite'
+OUTPUT_DIR = '../../sources/batch'
+SUMMARY_FILE = 'summary.csv'
+
+
+def process_route(store_dir, vehicle_type, route, output_dir):
+    """
+    Обработка одного маршрута в процессе-исполнителе: результаты — в отдельный каталог маршрута
+
+    Параметры:
+        store_dir (str): Каталог колоночного хранилища AVL-данных
+        vehicle_type (str): Тип транспорта
+        route (str): Номер маршрута
+        output_dir (str): Общий каталог результатов
+
+    Возвращает:
+        tuple: (итоги маршрута (run_route) или описание ошибки в поле error,
+            новые записи кэша маршрутов для основного процесса)
+    """
+    start = time.perf_counter()
+    summary = {'vehicle_type': vehicle_type, 'route': route}
+    try:
+        df = avl_store.read_route(store_dir, vehicle_type, route)
+        if df.empty:
+            return {**summary, 'error': 'нет данных'}, take_cache_entries()
+        result = run_route(
+            df, worker['road_net'],
+            output_dir=os.path.join(output_dir, f'{vehicle_type}_{route}'),
+            route_cache=worker['route_cache'],
+            router=worker['router'],
+            tile_server=worker['tile_server'],
+            write_segments=True,
+            verbose=False,
+        )
+        summary = {**summary, **result}
+    except Exception as e:
+        # Ошибка одного маршрута не останавливает обработку остальных
+        summary = {**summary, 'error': str(e), 'seconds': round(time.perf_counter() - start, 1)}
+    return summary, take_cache_entries()
+
+
+def parse_arguments():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(
+        description='Пакетная обработка маршрутов: остановки, скорости, карты и GTFS без интерфейса'
+    )
+    parser.add_argument('routes', nargs='+',
+                        help='Маршруты вида <тип>:<маршрут> (например, bus:10 tramway:1) или all — все из routes.json')
+    parser.add_argument('--vehicle-types', nargs='+', choices=VEHICLE_TYPES, default=list(VEHICLE_TYPES),
+                        help='Типы транспорта для all')
+    parser.add_argument('--csv', default=CSV_PATH, help='Месячный CSV с AVL-данными')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Число процессов')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help='Каталог для результатов')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    start = time.perf_counter()
+
+    routes = select_routes(args.routes, args.vehicle_types)
+    store_dir = ensure_store(args.csv)
+    road_net = prepare_routing(ROADS_SHP_PATH)
+    route_cache = load_route_cache(road_net)
+    tile_server = ensure_tile_server(TILES_ARCHIVE) if 'roads' in archive_layers(TILES_ARCHIVE) else None
+
+    print(f"Маршрутов: {len(routes)}, процессов: {args.workers}")
+    summaries = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(ROADS_SHP_PATH, {'tile_server': tile_server})) as executor:
+        futures = [executor.submit(process_route, store_dir, vehicle_type, route, args.output_dir)
+                   for vehicle_type, route in routes]
+        for future in futures:
+            summary, cache_entries = future.result()
+            route_cache.merge(cache_entries)
+            name = f"{summary['vehicle_type']} {summary['route']}"
+            if 'error' in summary:
+                print(f"  {name}: ошибка — {summary['error']}")
+            else:
+                print(f"  {name}: точек {summary['points']}, ТС {summary['uuids']}, "
+                      f"остановок {summary['stops']}, сегментов {summary['segments']}, {summary['seconds']} с")
+            summaries.append(summary)
+    # Записи кэша маршрутов всех процессов сохраняются один раз из основного процесса
+    route_cache.save()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary_file = os.path.join(args.output_dir, SUMMARY_FILE)
+    summary_table = pd.DataFrame(summaries)
+    for column in ('points', 'uuids', 'stops', 'segments'):
+        if column in summary_table.columns:
+            summary_table[column] = summary_table[column].astype('Int64')
+    summary_table.to_csv(summary_file, index=False, sep=';')
+    failed = sum('error' in summary for summary in summaries)
+    print(f"Обработано маршрутов: {len(summaries) - failed} из {len(summaries)}")
+    print(f"Сводка сохранена в {summary_file}")
+    print(f"Готово за {time.perf_counter() - start:.1f} с")
+    if failed == len(summaries):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'stats_ankets'))
+import avl_store
+from gpx_reader import read_gpx
+from iteration_all_ankets import iter_gpx_files, process_gpx_directory
+from road_network import load_road_network
+from route_pipeline import build_route_map, find_route_stops, match_uuid_tracks, prepare_track, snap_track
+from routing import Router, build_contraction_hierarchy
+from routing_benchmark import sample_pairs
+from synthetic_data import SIZES, generate
+from track_stats import segment_stats
+
+RESULTS_VERSION = 1
+ROUTING_PAIRS = 500
+ROUTING_MAX_DISTANCE_M = 1000
+REGRESSION_TOLERANCE = 0.25  # доля: этап медленнее базового запуска больше чем на столько — регрессия
+REGRESSION_MIN_S = 0.05      # с: меньшая разница времени — шум измерения, а не регрессия
+
+
+def _quiet(*args, **kwargs):
+    pass
+
+
+def git_revision():
+    """Текущий коммит репозитория (None вне git)"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Версии Python и библиотек — чтобы сравнивать только сопоставимые запуски"""
+    import pyarrow
+    import scipy
+    import shapely
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'pyarrow': pyarrow.__version__,
+        'scipy': scipy.__version__,
+        'shapely': shapely.__version__,
+    }
+
+
+def _silent(func, *args, **kwargs):
+    """Вызов без вывода хода работы в консоль (сообщения этапов мешают таблице результатов)"""
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        return func(*args, **kwargs)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def time_stage(run, repeat):
+    """
+    Время этапа: run вызывается repeat раз
+
+    Возвращает:
+        tuple: (время запусков, с; результат последнего запуска)
+    """
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = _silent(run)
+        runs.append(time.perf_counter() - start)
+    return runs, result
+
+
+def benchmark_size(size, work_dir, repeat, seed):
+    """
+    Прогон всех этапов на синтетическом наборе данных одного размера
+
+    Этапы идут в порядке конвейера: результат этапа — вход следующего
+    (как в transports_with_stops.py и iteration_all_ankets.py)
+
+    Возвращает:
+        dict: Параметры и объем данных, время этапов
+    """
+    data_dir = os.path.join(work_dir, size)
+    shutil.rmtree(data_dir, ignore_errors=True)
+    start = time.perf_counter()
+    data = generate(data_dir, size, seed)
+    generate_s = time.perf_counter() - start
+    cache_dir = os.path.join(data_dir, 'cache')
+
+    stages = {}
+
+    def record(name, items, run):
+        runs, result = time_stage(run, repeat)
+        best = min(runs)
+        stages[name] = {
+            'seconds': best,
+            'median_seconds': float(np.median(runs)),
+            'runs': runs,
+            'items': items,
+            'items_per_second': items / best if best > 0 else None,
+        }
+        print(f"  {name:<16} {best:9.3f} с  {items:>9} шт.  {stages[name]['items_per_second'] or 0:>12.0f} шт./с")
+        return result
+
+    road_net = record('network', data['links'],
+                      lambda: load_road_network(data['shp'], cache_dir=cache_dir, rebuild=True))
+    record('contraction', road_net.n_nodes, lambda: build_contraction_hierarchy(road_net))
+    router = _silent(Router, road_net, mode='ch')
+
+    store_dir = os.path.join(data_dir, 'store')
+    record('ingest', data['avl_points'], lambda: avl_store.build_store(data['csv'], store_dir))
+    vehicle_type, route = data['routes'][0]
+    points = prepare_track(avl_store.read_route(store_dir, vehicle_type, route))
+
+    df = record('snapping', len(points), lambda: snap_track(road_net, points))
+    pairs = sample_pairs(road_net, ROUTING_PAIRS, ROUTING_MAX_DISTANCE_M, seed=seed)
+    record('routing', len(pairs),
+           lambda: [router.shortest_path_length(source, target) for source, target in pairs])
+    tracks = record('map_matching', len(df), lambda: match_uuid_tracks(road_net, df, router=router))
+    # Остановки — по исходным GPS-координатам, как в run_route
+    stops = record('stop_detection', len(points), lambda: find_route_stops(points, log=_quiet))
+
+    gpx_files = list(iter_gpx_files(data['gpx_dir']))
+    record('segment_stats', data['gpx_points'],
+           lambda: [segment_stats(read_gpx(path)) for path in gpx_files])
+
+    output_dir = os.path.join(data_dir, 'output')
+    os.makedirs(output_dir, exist_ok=True)
+    geojson_path = os.path.join(output_dir, 'low_speed_segments.geojson')
+
+    def write_geojson():
+        # Заново с пустым хранилищем: иначе повторный запуск не пересчитывает файлы
+        store = os.path.join(output_dir, 'segments_store')
+        shutil.rmtree(store, ignore_errors=True)
+        return process_gpx_directory(data['gpx_dir'], geojson_path, store_dir=store)
+
+    record('geojson', data['gpx_points'], write_geojson)
+
+    avg_speed_kmh = df['speed'].mean() * 3.6
+    map_file = os.path.join(output_dir, 'map.html')
+
+    def write_map():
+        build_route_map(road_net, df, stops, tracks, avg_speed_kmh, avg_speed_kmh / 2, log=_quiet).save(map_file)
+
+    record('map', len(df), write_map)
+
+    return {
+        'params': data['params'],
+        'data': {
+            'links': data['links'],
+            'nodes': road_net.n_nodes,
+            'avl_points': data['avl_points'],
+            'route_points': len(df),
+            'uuids': len(tracks),
+            'gpx_files': data['gpx_files'],
+            'gpx_points': data['gpx_points'],
+        },
+        'generate_seconds': generate_s,
+        'stages': stages,
+    }
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Сравнение с результатами предыдущего запуска по лучшему времени этапов
+
+    Возвращает:
+        list: Регрессии (размер, этап, базовое время, текущее время)
+    """
+    regressions = []
+    print(f"\nСравнение с {baseline.get('git_commit') or 'базовым запуском'} (допуск {tolerance:.0%}):")
+    for size, current in results['sizes'].items():
+        previous = baseline.get('sizes', {}).get(size)
+        if previous is None:
+            continue
+        if previous['params'] != current['params']:
+            print(f"  {size}: другие параметры набора данных, сравнение пропущено")
+            continue
+        for name, stage in current['stages'].items():
+            if name not in previous['stages']:
+                continue
+            before, after = previous['stages'][name]['seconds'], stage['seconds']
+            ratio = after / before if before > 0 else np.inf
+            flag = ''
+            if ratio > 1 + tolerance and after - before > REGRESSION_MIN_S:
+                flag = '  РЕГРЕССИЯ'
+                regressions.append((size, name, before, after))
+            print(f"  {size:<7} {name:<16} {before:9.3f} -> {after:9.3f} с  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def parse_arguments():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(
+        description='Бенчмарк этапов обработки на синтетических данных масштаба Иркутска'
+    )
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small', 'medium'],
+                        help='Размеры наборов данных')
+    parser.add_argument('--repeat', type=int, default=3, help='Запусков каждого этапа (берется лучшее время)')
+    parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора данных')
+    parser.add_argument('--output', help='JSON-файл с результатами')
+    parser.add_argument('--baseline', help='JSON-файл предыдущего запуска для поиска регрессий')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help='Допустимое замедление этапа относительно базового запуска (доля)')
+    parser.add_argument('--work-dir', help='Каталог синтетических данных (по умолчанию временный, '
+                                           'удаляется после запуска)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='benchmark_')
+
+    results = {
+        'version': RESULTS_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_revision(),
+        'environment': environment(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'sizes': {},
+    }
+    try:
+        for size in args.sizes:
+            print(f"Размер {size}: {SIZES[size]}")
+            results['sizes'][size] = benchmark_size(size, work_dir, args.repeat, args.seed)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в «{args.output}»")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Регрессий: {len(regressions)}")
+            sys.exit(1)
+        print("Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
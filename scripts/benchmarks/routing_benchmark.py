@@ -0,0 +1,93 @@
+import argparse
+import os
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from road_network import haversine_m, load_road_network
+from routing import Router
+
+ROADS_SHP_PATH = '../../sources/UDS/Граф Иркутск_link.SHP'
+
+
+def sample_pairs(road_net, count, max_distance_m, seed=0):
+    """
+    Случайные пары узлов на расстоянии не больше max_distance_m друг от друга —
+    как пары соседних GPS-точек одного трека
+    """
+    rng = np.random.default_rng(seed)
+    coords = np.asarray(road_net.node_coords)
+    sources = rng.integers(0, road_net.n_nodes, count * 4)
+    # соседи в радиусе ~max_distance_m (в градусах, с запасом по долготе)
+    radius_deg = max_distance_m / 111_320 / np.cos(np.radians(coords[:, 1].mean()))
+    pairs = []
+    for source, neighbors in zip(sources, road_net.kdtree.query_ball_point(coords[sources], radius_deg)):
+        if not neighbors:
+            continue
+        target = neighbors[rng.integers(0, len(neighbors))]
+        d = haversine_m(coords[source, 0], coords[source, 1], coords[target, 0], coords[target, 1])
+        if target != source and d <= max_distance_m:
+            pairs.append((int(source), int(target)))
+        if len(pairs) == count:
+            break
+    return pairs
+
+
+def time_queries(name, route, pairs):
+    """Время выполнения запросов и найденные длины путей"""
+    start = time.perf_counter()
+    lengths = [route(source, target) for source, target in pairs]
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<22} {elapsed:8.3f} с  {elapsed / len(pairs) * 1e3:8.3f} мс/запрос")
+    return np.array(lengths, dtype=np.float64), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение скорости маршрутизации по графу УДС')
+    parser.add_argument('--pairs', type=int, default=500, help='Число пар узлов')
+    parser.add_argument('--max-distance', type=float, default=1000,
+                        help='Максимальное расстояние между узлами пары, м')
+    args = parser.parse_args()
+
+    road_net = load_road_network(ROADS_SHP_PATH)
+    print(f"Граф: {road_net.n_nodes} узлов, {len(road_net.indices) // 2} ребер")
+    pairs = sample_pairs(road_net, args.pairs, args.max_distance)
+    print(f"Пар узлов: {len(pairs)} (до {args.max_distance:.0f} м)")
+
+    G = road_net.to_networkx()
+    keys = [road_net.node_key(node) for node in range(road_net.n_nodes)]
+
+    def networkx_length(source, target):
+        try:
+            return nx.shortest_path_length(G, keys[source], keys[target], weight='weight')
+        except nx.NetworkXNoPath:
+            return np.inf
+
+    def scipy_length(source, target):
+        return dijkstra(road_net.csgraph, indices=source)[target]
+
+    astar = Router(road_net, mode='astar')
+    start = time.perf_counter()
+    ch = Router(road_net, mode='ch')
+    print(f"Загрузка/предобработка CH: {time.perf_counter() - start:.2f} с")
+
+    print("Время запросов:")
+    reference, baseline = time_queries('nx.shortest_path', networkx_length, pairs)
+    results = {
+        'scipy dijkstra': time_queries('scipy dijkstra', scipy_length, pairs),
+        'Router A*': time_queries('Router A*', astar.shortest_path_length, pairs),
+        'Router CH': time_queries('Router CH', ch.shortest_path_length, pairs),
+    }
+
+    print("Ускорение относительно nx.shortest_path:")
+    for name, (lengths, elapsed) in results.items():
+        mismatch = ~np.isclose(lengths, reference, rtol=1e-9, atol=1e-6)
+        print(f"  {name:<22} x{baseline / elapsed:7.1f}  расхождений длин: {int(mismatch.sum())}")
+
+
+if __name__ == "__main__":
+    main()
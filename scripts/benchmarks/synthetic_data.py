@@ -0,0 +1,391 @@
+import argparse
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+# Центр сетки — центр Иркутска; сеть в той же проекции, что и граф УДС
+ORIGIN_LON, ORIGIN_LAT = 104.28, 52.28
+SHP_CRS = 'ESRI:53004'
+SHP_NAME = 'synthetic_link.shp'
+CSV_NAME = 'december.csv'
+GPX_DIR_NAME = 'ankets'
+
+M_PER_DEG_LAT = 110_574
+M_PER_DEG_LON = 111_320 * np.cos(np.radians(ORIGIN_LAT))
+
+GRID_SPACING_M = 120        # м: расстояние между соседними перекрестками
+MAIN_EVERY = 5              # магистраль — каждая пятая улица сетки
+NODE_JITTER_M = 20          # м: смещение перекрестков от узлов правильной сетки
+STOP_SPACING_M = 400        # м: расстояние между остановками маршрута
+GPS_NOISE_M = 5             # м: СКО ошибки координат GPS
+AVL_INTERVAL_S = 15         # с: средний интервал между отметками AVL
+GPX_INTERVAL_S = 2          # с: средний интервал между точками GPX
+START_TIME = '2024-12-02'   # понедельник
+VEHICLE_TYPES = ('bus', 'tramway', 'trolleybus')
+
+AVL_COLUMNS = ['accept_time', 'signal_time', 'clid', 'uuid', 'vehicle_type', 'route', 'lat', 'lon',
+               'speed', 'direction', 'thread', 'bind_lat', 'bind_lon', 'fly_time', 'life_time', 'd_acc']
+
+# Размеры наборов данных: от быстрой проверки до масштаба Иркутска (~22,7 тыс. дорог в графе УДС)
+SIZES = {
+    'small': {'grid': 31, 'routes': 2, 'uuids': 10, 'points_per_uuid': 300, 'gpx_files': 4,
+              'points_per_gpx': 500},
+    'medium': {'grid': 61, 'routes': 6, 'uuids': 40, 'points_per_uuid': 1000, 'gpx_files': 12,
+               'points_per_gpx': 1500},
+    'large': {'grid': 106, 'routes': 12, 'uuids': 120, 'points_per_uuid': 1500, 'gpx_files': 30,
+              'points_per_gpx': 3000},
+}
+
+
+def to_lonlat(x, y):
+    """Локальные метры от центра сетки -> долгота, широта"""
+    return ORIGIN_LON + np.asarray(x) / M_PER_DEG_LON, ORIGIN_LAT + np.asarray(y) / M_PER_DEG_LAT
+
+
+def grid_nodes(grid, rng, spacing_m=GRID_SPACING_M, jitter_m=NODE_JITTER_M):
+    """
+    Координаты перекрестков сетки grid × grid в локальных метрах
+
+    Возвращает:
+        np.ndarray: Массив формы (grid, grid, 2) — x, y узла (столбец, строка)
+    """
+    offset = (grid - 1) * spacing_m / 2
+    ix, iy = np.meshgrid(np.arange(grid), np.arange(grid), indexing='ij')
+    nodes = np.stack([ix * spacing_m - offset, iy * spacing_m - offset], axis=-1).astype(np.float64)
+    return nodes + rng.uniform(-jitter_m, jitter_m, nodes.shape)
+
+
+def _kept_segments(grid, rng, main_every=MAIN_EVERY):
+    """
+    Отрезки сетки, которые становятся дорогами
+
+    Магистрали (каждая main_every-я улица) проходят через всю сетку, остальные
+    улицы — тупиковые отрезки в 1–3 квартала от одной из ближайших магистралей,
+    поэтому, как в графе УДС, большинство перекрестков — примыкания и тупики
+
+    Возвращает:
+        tuple: (номер улицы, положение отрезка вдоль улицы, магистраль ли) для
+            отрезков вдоль строк (x -> x + 1) и вдоль столбцов (y -> y + 1)
+    """
+    street, position = np.meshgrid(np.arange(grid), np.arange(grid - 1), indexing='ij')
+    street, position = street.ravel(), position.ravel()
+    main = street % main_every == 0
+    block, within = position // main_every, position % main_every
+    n_blocks = (grid - 2) // main_every + 1
+    segments = []
+    for _ in range(2):
+        spur = rng.integers(1, main_every - 1, (grid, n_blocks))[street, block]
+        # Тупик примыкает к левой или правой магистрали квартала (если она есть)
+        from_end = rng.random((grid, n_blocks))[street, block] < 0.5
+        from_end &= (block + 1) * main_every < grid
+        keep = main | np.where(from_end, within >= main_every - spur, within < spur)
+        segments.append((street[keep], position[keep], main[keep]))
+    return segments
+
+
+def road_network(nodes, rng, jitter_m=NODE_JITTER_M):
+    """
+    Дорожная сеть в схеме шейп-файла графа УДС
+
+    Каждый отрезок сетки между перекрестками делится посередине на две дороги;
+    дорога описывает оба направления, как записи с полями R_*
+
+    Возвращает:
+        GeoDataFrame: Дороги в проекции SHP_CRS
+    """
+    grid = nodes.shape[0]
+    node_no = np.arange(grid * grid).reshape(grid, grid) + 1
+    (row_street, row_pos, row_main), (col_street, col_pos, col_main) = _kept_segments(grid, rng)
+    # Отрезки вдоль строк соединяют (x, y) и (x + 1, y), вдоль столбцов — (x, y) и (x, y + 1)
+    starts = np.concatenate([node_no[row_pos, row_street], node_no[col_street, col_pos]])
+    ends = np.concatenate([node_no[row_pos + 1, row_street], node_no[col_street, col_pos + 1]])
+    main = np.concatenate([row_main, col_main])
+
+    flat = nodes.reshape(-1, 2)
+    a, b = flat[starts - 1], flat[ends - 1]
+    middle = (a + b) / 2 + rng.uniform(-jitter_m / 4, jitter_m / 4, a.shape)
+    middle_no = grid * grid + 1 + np.arange(len(starts))
+    # Две половины отрезка: от начала до середины и от середины до конца
+    first = np.stack([a, (a + middle) / 2, middle], axis=1)
+    second = np.stack([middle, (middle + b) / 2, b], axis=1)
+    coords = np.concatenate([first, second])
+    from_no = np.concatenate([starts, middle_no])
+    to_no = np.concatenate([middle_no, ends])
+    main = np.concatenate([main, main])
+
+    lon, lat = to_lonlat(coords[..., 0], coords[..., 1])
+    lines = shapely.linestrings(np.stack([lon, lat], axis=-1))
+    steps = np.diff(coords, axis=1)
+    length_km = np.hypot(steps[..., 0], steps[..., 1]).sum(axis=1) / 1000
+    length = [f'{value:.3f}km' for value in length_km]
+    n = len(from_no)
+    type_no = np.where(main, '49', '0')
+    tsys = np.where(main, 'A,G1,G2,G3,L,MT,P,PR,RA,T,TB,V', 'P,T')
+    lanes = np.where(main, 2, 1).astype(np.int32)
+    capacity = np.where(main, 1800, 900).astype(np.int32)
+    roads = gpd.GeoDataFrame({
+        'NO': np.arange(1, n + 1, dtype=np.int32),
+        'FROMNODENO': from_no.astype(np.int32),
+        'TONODENO': to_no.astype(np.int32),
+        'TYPENO': type_no,
+        'TSYSSET': tsys,
+        'LENGTH': length,
+        'NUMLANES': lanes,
+        'CAPPRT': capacity,
+        'R_NO': np.arange(1, n + 1, dtype=np.int32),
+        'R_FROMNO~1': to_no.astype(np.int32),
+        'R_TONODENO': from_no.astype(np.int32),
+        'R_TYPENO': type_no,
+        'R_TSYSSET': tsys,
+        'R_LENGTH': length,
+        'R_NUMLANES': lanes,
+        'R_CAPPRT': capacity,
+    }, geometry=lines, crs='EPSG:4326')
+    return roads.to_crs(SHP_CRS)
+
+
+def route_path(nodes, rng, min_share=0.5, main_every=MAIN_EVERY):
+    """
+    Путь маршрута по магистралям: от перекрестка вдоль строки, затем вдоль столбца
+
+    Возвращает:
+        np.ndarray: Вершины пути (x, y) в локальных метрах
+    """
+    grid = nodes.shape[0]
+    main = np.arange(0, grid, main_every)
+    span = max(2 * main_every, int(grid * min_share))
+    while True:
+        x0, y0, x1, y1 = rng.choice(main, 4)
+        if abs(x1 - x0) + abs(y1 - y0) >= span and x0 != x1 and y0 != y1:
+            break
+    step_x = 1 if x1 > x0 else -1
+    step_y = 1 if y1 > y0 else -1
+    columns = [(x, y0) for x in range(x0, x1 + step_x, step_x)]
+    rows = [(x1, y) for y in range(y0 + step_y, y1 + step_y, step_y)]
+    return np.array([nodes[x, y] for x, y in columns + rows])
+
+
+def _along(path, distance):
+    """Точки на расстоянии distance от начала ломаной и направление движения (градусы от севера)"""
+    steps = np.diff(path, axis=0)
+    lengths = np.hypot(steps[:, 0], steps[:, 1])
+    passed = np.concatenate([[0], np.cumsum(lengths)])
+    segment = np.clip(np.searchsorted(passed, distance, side='right') - 1, 0, len(lengths) - 1)
+    fraction = (distance - passed[segment]) / lengths[segment]
+    points = path[segment] + steps[segment] * fraction[:, None]
+    heading = np.degrees(np.arctan2(steps[segment, 0], steps[segment, 1])) % 360
+    return points, heading
+
+
+def _schedule(length_m, rng, duration_s, cruise_kmh=(20, 45), dwell_s=(20, 60), terminal_s=(240, 600)):
+    """
+    Опорные точки движения туда-обратно по маршруту длиной length_m
+
+    Между остановками — равномерное движение со случайной скоростью, на
+    остановках и конечных — стоянки
+
+    Возвращает:
+        tuple: (время от начала, с; пройденный путь от начала маршрута, м) опорных точек
+    """
+    stops = np.append(np.arange(0, length_m, STOP_SPACING_M), length_m)
+    times, positions = [0.0], [0.0]
+    forward = True
+    while times[-1] < duration_s:
+        route_stops = stops if forward else length_m - stops
+        for k in range(1, len(route_stops)):
+            speed = rng.uniform(*cruise_kmh) / 3.6
+            times.append(times[-1] + abs(route_stops[k] - route_stops[k - 1]) / speed)
+            positions.append(route_stops[k])
+            dwell = rng.uniform(*(terminal_s if k == len(route_stops) - 1 else dwell_s))
+            times.append(times[-1] + dwell)
+            positions.append(route_stops[k])
+        forward = not forward
+    return np.array(times), np.array(positions)
+
+
+def vehicle_track(path, rng, n_points, interval_s=AVL_INTERVAL_S, noise_m=GPS_NOISE_M):
+    """
+    Отметки одного ТС, курсирующего по маршруту
+
+    Возвращает:
+        dict: Массивы t (с от начала), x, y (м), speed (м/с), direction (градусы)
+    """
+    steps = np.diff(path, axis=0)
+    length = float(np.hypot(steps[:, 0], steps[:, 1]).sum())
+    t = np.cumsum(rng.uniform(0.5, 1.5, n_points) * interval_s)
+    key_times, key_positions = _schedule(length, rng, t[-1] + 1)
+    # Каждое ТС начинает в случайной фазе расписания
+    t = t + rng.uniform(0, key_times[-1] - t[-1])
+    s = np.interp(t, key_times, key_positions)
+    segment = np.clip(np.searchsorted(key_times, t, side='right') - 1, 0, len(key_times) - 2)
+    speed = np.abs(np.diff(key_positions)[segment]) / np.diff(key_times)[segment]
+    points, heading = _along(path, s)
+    backward = np.diff(key_positions)[segment] < 0
+    points = points + rng.normal(0, noise_m, points.shape)
+    return {
+        't': t - t[0],
+        'x': points[:, 0],
+        'y': points[:, 1],
+        'speed': np.maximum(speed + rng.normal(0, 0.3, len(speed)) * (speed > 0), 0),
+        'direction': np.round(np.where(backward, (heading + 180) % 360, heading)),
+    }
+
+
+def _format_times(times):
+    """Моменты времени в виде december.csv: 2024-12-13 0:00:57 (час без ведущего нуля)"""
+    times = pd.DatetimeIndex(times)
+    return (times.strftime('%Y-%m-%d ') + times.hour.astype(str) + times.strftime(':%M:%S')).to_numpy()
+
+
+def avl_tracks(nodes, rng, routes, uuids, points_per_uuid):
+    """
+    AVL-отметки нескольких маршрутов в схеме december.csv
+
+    ТС распределяются по маршрутам поровну, маршруты — по типам транспорта VEHICLE_TYPES
+
+    Возвращает:
+        DataFrame: Отметки всех ТС по возрастанию signal_time
+    """
+    start = pd.Timestamp(START_TIME)
+    frames = []
+    for r in range(routes):
+        path = route_path(nodes, rng)
+        vehicle_type = VEHICLE_TYPES[r % len(VEHICLE_TYPES)]
+        route_uuids = range(r, uuids, routes)
+        for uid in route_uuids:
+            track = vehicle_track(path, rng, points_per_uuid)
+            lon, lat = to_lonlat(track['x'], track['y'])
+            # Рабочий день ТС начинается в 5–7 утра
+            signal_time = start + pd.to_timedelta(rng.uniform(5, 7) * 3600 + track['t'], unit='s').round('s')
+            delay = pd.to_timedelta(rng.integers(1, 60, len(lat)), unit='s')
+            frames.append(pd.DataFrame({
+                'accept_time': signal_time + delay,
+                'signal_time': signal_time,
+                'clid': 'irkutsk',
+                'uuid': 10_000 + uid,
+                'vehicle_type': vehicle_type,
+                'route': str(r + 1),
+                'lat': np.round(lat, 6),
+                'lon': np.round(lon, 6),
+                'speed': np.round(track['speed'], 1),
+                'direction': track['direction'],
+            }))
+    df = pd.concat(frames, ignore_index=True).sort_values('signal_time', kind='stable', ignore_index=True)
+    for column in ('accept_time', 'signal_time'):
+        df[column] = _format_times(df[column])
+    df['thread'] = 'None'
+    df['bind_lat'] = 'None'
+    df['bind_lon'] = 'None'
+    df['fly_time'] = rng.integers(5, 60, len(df)).astype(np.float64)
+    df['life_time'] = 600.0
+    df['d_acc'] = 600.0
+    return df[AVL_COLUMNS]
+
+
+def write_gpx(gpx_path, name, lat, lon, elevation, times):
+    """Трек в формате GPX 1.1 (как записывает Геотрекер: lat, lon, ele, time в UTC)"""
+    stamps = pd.DatetimeIndex(times).strftime('%Y-%m-%dT%H:%M:%SZ')
+    points = ''.join(
+        f'      <trkpt lat="{la:.8f}" lon="{lo:.8f}">\n        <ele>{el:.0f}</ele>\n'
+        f'        <time>{stamp}</time>\n      </trkpt>\n'
+        for la, lo, el, stamp in zip(lat, lon, elevation, stamps)
+    )
+    with open(gpx_path, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>\n"
+                '<gpx xmlns="http://www.topografix.com/GPX/1/1" version="1.1" creator="synthetic_data.py">\n'
+                f'  <metadata>\n    <name>{name}</name>\n  </metadata>\n'
+                f'  <trk>\n    <name>{name}</name>\n    <trkseg>\n{points}    </trkseg>\n  </trk>\n</gpx>\n')
+
+
+def gpx_surveys(nodes, rng, gpx_dir, n_files, points_per_gpx):
+    """
+    GPX-анкеты: поездки учетчиков по маршрутам сетки, по подкаталогу на учетчика
+
+    Возвращает:
+        list: Пути к записанным файлам
+    """
+    paths = []
+    for k in range(n_files):
+        surveyor = f'surveyor_{k % 3 + 1}'
+        os.makedirs(os.path.join(gpx_dir, surveyor), exist_ok=True)
+        track = vehicle_track(route_path(nodes, rng), rng, points_per_gpx, interval_s=GPX_INTERVAL_S)
+        lon, lat = to_lonlat(track['x'], track['y'])
+        elevation = 440 + np.cumsum(rng.normal(0, 0.3, len(lat)))
+        day = pd.Timestamp(START_TIME) + pd.Timedelta(days=k // 3)
+        times = day + pd.to_timedelta(rng.uniform(0, 3) * 3600 + np.round(track['t']), unit='s')
+        name = f'{k + 1}_{k % 12 + 1}_{day:%d.%m}_{surveyor}'
+        path = os.path.join(gpx_dir, surveyor, f'{name}.gpx')
+        write_gpx(path, name, lat, lon, elevation, times)
+        paths.append(path)
+    return paths
+
+
+def generate(output_dir, size='small', seed=0, **overrides):
+    """
+    Детерминированный синтетический набор данных: дорожная сеть-сетка (шейп-файл),
+    месячный CSV AVL-отметок нескольких маршрутов и GPX-анкеты
+
+    Один и тот же seed и размер дают побайтно одинаковые файлы
+
+    Параметры:
+        output_dir (str): Каталог набора данных
+        size (str): Размер из SIZES
+        seed (int): Начальное значение генератора случайных чисел
+        overrides: Замена отдельных параметров размера (grid, routes, uuids, ...)
+
+    Возвращает:
+        dict: Пути к файлам (shp, csv, gpx_dir) и объем данных
+    """
+    params = {**SIZES[size], **overrides}
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+
+    nodes = grid_nodes(params['grid'], rng)
+    roads = road_network(nodes, rng)
+    shp_path = os.path.join(output_dir, SHP_NAME)
+    roads.to_file(shp_path)
+
+    df = avl_tracks(nodes, rng, params['routes'], params['uuids'], params['points_per_uuid'])
+    csv_path = os.path.join(output_dir, CSV_NAME)
+    df.to_csv(csv_path, index=False)
+
+    gpx_dir = os.path.join(output_dir, GPX_DIR_NAME)
+    gpx_files = gpx_surveys(nodes, rng, gpx_dir, params['gpx_files'], params['points_per_gpx'])
+
+    return {
+        'shp': shp_path,
+        'csv': csv_path,
+        'gpx_dir': gpx_dir,
+        'params': params,
+        'links': len(roads),
+        'avl_points': len(df),
+        'routes': df.groupby(['vehicle_type', 'route']).size().index.tolist(),
+        'gpx_files': len(gpx_files),
+        'gpx_points': params['gpx_files'] * params['points_per_gpx'],
+    }
+
+
+def parse_arguments():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(
+        description='Синтетические данные для бенчмарков: сеть-сетка, AVL-отметки и GPX-анкеты'
+    )
+    parser.add_argument('output', help='Каталог набора данных')
+    parser.add_argument('--size', choices=list(SIZES), default='small', help='Размер набора данных')
+    parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    data = generate(args.output, args.size, args.seed)
+    print(f"Дорог: {data['links']}, AVL-отметок: {data['avl_points']} "
+          f"({len(data['routes'])} маршрутов), GPX-файлов: {data['gpx_files']}")
+    print(f"Набор данных сохранен в «{args.output}»")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import importlib
+import io
+import itertools
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import traceback
+import webbrowser
+
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+SCRIPT_DIRS = {
+    'transports_with_stops': os.path.join(SCRIPTS_DIR, 'transports_with_stops'),
+    'transports': os.path.join(SCRIPTS_DIR, 'transports'),
+    'ankets': os.path.join(SCRIPTS_DIR, 'ankets'),
+    'stats_ankets': os.path.join(SCRIPTS_DIR, 'stats_ankets'),
+}
+# Пути относительно каталога скрипта, как в самих скриптах
+CSV_PATH = '../../sources/geotracks_transports/december.csv'
+ROADS_SHP_PATH = '../../sources/UDS/Граф Иркутск_link.SHP'
+TILES_ARCHIVE = '../../sources/tiles/tiles.sqlite'
+STOP_TIMEOUT = 5  # с: ожидание завершения фонового процесса при закрытии
+
+
+class _QueueWriter(io.TextIOBase):
+    """stdout фонового процесса: каждая напечатанная строка уходит в интерфейс как сообщение о ходе работы"""
+
+    def __init__(self, events):
+        self.events = events
+        self.job_id = None
+        self._buffer = ''
+
+    def write(self, text):
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                self.events.put(('progress', self.job_id, line))
+        return len(text)
+
+    def flush(self):
+        if self._buffer.strip():
+            self.events.put(('progress', self.job_id, self._buffer))
+        self._buffer = ''
+
+
+class _WorkerState:
+    """
+    Данные, которые фоновый процесс держит в памяти между заданиями:
+    дорожная сеть с индексами, кэш маршрутов, CH и AVL-данные за месяц
+    """
+
+    def __init__(self):
+        import pandas as pd
+
+        import avl_store
+        from road_network import load_road_network
+        from route_cache import load_route_cache
+        from routing import Router
+
+        os.chdir(SCRIPT_DIRS['transports_with_stops'])
+        print("Загрузка дорожной сети...")
+        self.road_net = load_road_network(ROADS_SHP_PATH)
+        self.route_cache = load_route_cache(self.road_net)
+        self.router = Router(self.road_net, mode='ch')
+        self.tile_server = None
+
+        # Месячные данные: колоночное хранилище читается по секциям, CSV — один раз целиком
+        self.store_dir = os.path.abspath(avl_store.default_store_path(CSV_PATH))
+        self.month = None
+        if not avl_store.store_exists(self.store_dir):
+            self.store_dir = None
+            if os.path.exists(CSV_PATH):
+                print("Загрузка AVL-данных за месяц...")
+                self.month = pd.read_csv(CSV_PATH, low_memory=False)
+                self.month['vehicle_type'] = self.month['vehicle_type'].str.lower()
+                self.month['route'] = self.month['route'].astype(str)
+
+    def route_data(self, vehicle_type, route=None):
+        """Точки маршрута из данных в памяти (аналог extract_type_route.filter_transport_data)"""
+        import avl_store
+
+        if self.store_dir is not None:
+            return avl_store.read_route(self.store_dir, vehicle_type, route)
+        if self.month is None:
+            raise FileNotFoundError(f"Не найдены AVL-данные: {os.path.abspath(CSV_PATH)}")
+        mask = self.month['vehicle_type'] == vehicle_type.lower()
+        if route is not None:
+            mask &= self.month['route'] == str(route)
+        return self.month[mask]
+
+    def _select_route(self, vehicle_type, route=None):
+        """
+        Точки маршрута для задания; они же сохраняются как выбранный маршрут
+        (current_route.arrow), как при запуске extract_type_route.py, чтобы
+        скрипты, читающие выбранный маршрут, работали с тем же маршрутом
+        """
+        import avl_store
+
+        df = self.route_data(vehicle_type, route)
+        if df.empty:
+            raise ValueError("Данные не найдены")
+        print(f"Найдено записей: {len(df)}")
+        avl_store.write_current_route(df)
+        return df
+
+    def transport(self, vehicle_type, route=None):
+        """Остановки, треки, карта и GTFS маршрута (transports_with_stops.py)"""
+        from route_pipeline import run_route
+        from tile_store import archive_layers, tile_server_running, tile_server_url
+
+        os.chdir(SCRIPT_DIRS['transports_with_stops'])
+        df = self._select_route(vehicle_type, route)
+        # Сервер тайлов запускает и останавливает лаунчер; здесь он только проверяется,
+        # иначе второй сервер, запущенный отсюда, пережил бы лаунчер
+        if self.tile_server is None and 'roads' in archive_layers(TILES_ARCHIVE) and tile_server_running():
+            self.tile_server = tile_server_url()
+        result = run_route(df, self.road_net, output_dir='.', route_cache=self.route_cache,
+                           router=self.router, tile_server=self.tile_server)
+        self.route_cache.save()
+        return _open_map(result['map_file'])
+
+    def show_tracks(self, vehicle_type, route=None):
+        """Карта точек треков без обработки (transports_script.py)"""
+        transports_script = _script_module('transports', 'transports_script')
+        df = self._select_route(vehicle_type, route)
+        transports_script.create_tracks_map(df).save(transports_script.OUTPUT_FILE)
+        return _open_map(transports_script.OUTPUT_FILE)
+
+    def anket(self, gpx_file):
+        """Анализ одной анкеты (ankets_script.py)"""
+        _script_module('ankets', 'ankets_script').main(gpx_file)
+
+    def ankets_segments(self):
+        """Сегменты с низкой скоростью по всем анкетам на карте с УДС (show_low_segments.py)"""
+        _script_module('stats_ankets', 'show_low_segments').main()
+
+
+def _script_module(directory, name):
+    """Модуль скрипта; рабочий каталог — каталог скрипта, как при запуске из лаунчера"""
+    path = SCRIPT_DIRS[directory]
+    if path not in sys.path:
+        sys.path.append(path)
+    os.chdir(path)
+    return importlib.import_module(name)
+
+
+def _open_map(path):
+    file_url = f'file://{os.path.abspath(path)}'
+    print(f"Открываю карту в браузере: {file_url}")
+    webbrowser.open(file_url)
+    return os.path.abspath(path)
+
+
+def _worker_main(jobs, events):
+    """Цикл фонового процесса: задания по одному из очереди, ход работы и итог — в очередь событий"""
+    sys.path.append(os.path.join(SCRIPTS_DIR, 'common'))
+    writer = _QueueWriter(events)
+    sys.stdout = writer
+    try:
+        state = _WorkerState()
+    except Exception as e:
+        writer.flush()
+        events.put(('failed', None, f"{e}\n{traceback.format_exc()}"))
+        return
+    writer.flush()
+    events.put(('ready', None, None))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, kind, params = job
+        writer.job_id = job_id
+        start = time.perf_counter()
+        try:
+            result = getattr(state, kind)(**params)
+            writer.flush()
+            events.put(('done', job_id, {'result': result, 'seconds': round(time.perf_counter() - start, 1)}))
+        except Exception as e:
+            writer.flush()
+            events.put(('error', job_id, str(e) or traceback.format_exc()))
+        writer.job_id = None
+
+
+class AnalysisWorker:
+    """
+    Долгоживущий фоновый процесс для лаунчера
+
+    Дорожная сеть, индексы, CH и AVL-данные загружаются один раз при запуске,
+    поэтому повторный анализ занимает только время самого расчета. Задания
+    выполняются по очереди, их ход работы (печать скриптов) приходит событиями,
+    которые интерфейс забирает poll() без блокировки
+
+    События: (вид, номер задания, данные), вид — ready, failed, progress, done, error
+    """
+
+    JOB_KINDS = ('transport', 'show_tracks', 'anket', 'ankets_segments')
+
+    def __init__(self):
+        # spawn: отдельный чистый интерпретатор, без копии состояния Tk родителя
+        context = multiprocessing.get_context('spawn')
+        self._jobs = context.Queue()
+        self._events = context.Queue()
+        self._process = context.Process(target=_worker_main, args=(self._jobs, self._events), daemon=True)
+        self._ids = itertools.count(1)
+
+    def start(self):
+        self._process.start()
+        return self
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def submit(self, kind, **params):
+        """
+        Ставит задание в очередь
+
+        Параметры:
+            kind (str): Вид задания (JOB_KINDS)
+            **params: Параметры задания (vehicle_type, route / gpx_file)
+
+        Возвращает:
+            int: Номер задания
+        """
+        if kind not in self.JOB_KINDS:
+            raise ValueError(f"Неизвестное задание: {kind}")
+        job_id = next(self._ids)
+        self._jobs.put((job_id, kind, params))
+        return job_id
+
+    def poll(self):
+        """Все накопившиеся события без ожидания"""
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Завершает фоновый процесс (текущее задание прерывается, если не успело закончиться)"""
+        if self._process.is_alive():
+            self._jobs.put(None)
+            self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join(timeout)
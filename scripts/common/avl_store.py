@@ -0,0 +1,262 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.ipc as ipc
+
+# Схема месячного файла AVL-данных (december.csv) с явными типами столбцов
+AVL_SCHEMA = pa.schema([
+    ('accept_time', pa.timestamp('s')),
+    ('signal_time', pa.timestamp('s')),
+    ('clid', pa.string()),
+    ('uuid', pa.int64()),
+    ('vehicle_type', pa.string()),
+    ('route', pa.string()),
+    ('lat', pa.float64()),
+    ('lon', pa.float64()),
+    ('speed', pa.float64()),
+    ('direction', pa.float64()),
+    ('thread', pa.string()),
+    ('bind_lat', pa.float64()),
+    ('bind_lon', pa.float64()),
+    ('fly_time', pa.float64()),
+    ('life_time', pa.float64()),
+    ('d_acc', pa.float64()),
+])
+
+PARTITION_COLUMNS = ['vehicle_type', 'route']
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+CSV_BLOCK_SIZE = 64 << 20  # байт CSV на один пакет при потоковом чтении
+SOURCE_TIMEZONE = 'UTC'          # часовой пояс времени в AVL-данных (accept_time, signal_time)
+LOCAL_TIMEZONE = 'Asia/Irkutsk'  # местное время: часы суток, дни недели, расписание
+# Промежуточный файл выбранного маршрута (Arrow IPC) между extract_type_route.py и скриптами анализа
+CURRENT_ROUTE_PATH = '../../sources/current_route/current_route.arrow'
+LEGACY_ROUTE_CSV = '../../sources/current_route/current_route.csv'
+
+
+def local_time(times, source_timezone=SOURCE_TIMEZONE, timezone=LOCAL_TIMEZONE):
+    """
+    Время AVL-данных в местном времени (без часового пояса)
+
+    Параметры:
+        times (Series/DatetimeIndex): Время без часового пояса в source_timezone
+            (или с часовым поясом — тогда source_timezone не используется)
+        source_timezone (str): Часовой пояс исходного времени
+        timezone (str): Местный часовой пояс
+
+    Возвращает:
+        Series/DatetimeIndex: Местное время без часового пояса
+    """
+    local = pd.DatetimeIndex(times)
+    if local.tz is None:
+        local = local.tz_localize(source_timezone)
+    local = local.tz_convert(timezone).tz_localize(None)
+    if isinstance(times, pd.Series):
+        return pd.Series(local, index=times.index, name=times.name)
+    return local
+
+
+def default_store_path(csv_file):
+    """Путь к колоночному хранилищу рядом с исходным CSV (december.csv -> december_parquet)"""
+    base, _ = os.path.splitext(csv_file)
+    return f"{base}_parquet"
+
+
+def store_exists(store_dir):
+    """Проверяет, что хранилище уже построено"""
+    return os.path.isdir(store_dir) and any(
+        name.startswith('vehicle_type=') for name in os.listdir(store_dir)
+    )
+
+
+def _partitioning():
+    """Hive-секционирование каталогов: vehicle_type=<тип>/route=<маршрут>"""
+    return ds.partitioning(
+        pa.schema([(name, AVL_SCHEMA.field(name).type) for name in PARTITION_COLUMNS]),
+        flavor='hive',
+    )
+
+
+def _open_csv(csv_file, sep=',', block_size=CSV_BLOCK_SIZE, columns=None):
+    """Потоковое чтение CSV пакетами с приведением столбцов к AVL_SCHEMA (columns — только эти столбцы)"""
+    convert_options = pacsv.ConvertOptions(
+        column_types={field.name: field.type for field in AVL_SCHEMA},
+        include_columns=columns,
+        null_values=['', 'None', 'nan', 'NaN'],
+        strings_can_be_null=True,
+        timestamp_parsers=[TIMESTAMP_FORMAT],
+    )
+    return pacsv.open_csv(
+        csv_file,
+        read_options=pacsv.ReadOptions(block_size=block_size),
+        parse_options=pacsv.ParseOptions(delimiter=sep),
+        convert_options=convert_options,
+    )
+
+
+def _clean_batches(reader, columns=None):
+    """Отбрасывает пустые строки и приводит тип транспорта к нижнему регистру"""
+    for batch in reader:
+        table = pa.Table.from_batches([batch])
+        mask = pc.and_(
+            pc.is_valid(table['vehicle_type']),
+            pc.is_valid(table['route']),
+        )
+        table = table.filter(mask)
+        if table.num_rows == 0:
+            continue
+        vehicle_type = pc.utf8_lower(table['vehicle_type'])
+        table = table.set_column(table.schema.get_field_index('vehicle_type'), 'vehicle_type', vehicle_type)
+        yield from table.select(columns or AVL_SCHEMA.names).to_batches()
+
+
+def build_store(csv_file, store_dir=None, sep=','):
+    """
+    Однократно конвертирует месячный CSV в колоночное хранилище Parquet,
+    секционированное по типу транспорта и маршруту
+
+    Параметры:
+        csv_file (str): Путь к CSV файлу (december.csv)
+        store_dir (str/None): Каталог хранилища (по умолчанию рядом с CSV)
+        sep (str): Разделитель столбцов CSV
+
+    Возвращает:
+        str: Путь к построенному хранилищу
+    """
+    store_dir = store_dir or default_store_path(csv_file)
+    reader = _open_csv(csv_file, sep=sep)
+    ds.write_dataset(
+        _clean_batches(reader),
+        store_dir,
+        schema=AVL_SCHEMA,
+        format='parquet',
+        partitioning=_partitioning(),
+        existing_data_behavior='delete_matching',
+        max_rows_per_group=1 << 20,
+    )
+    return store_dir
+
+
+def open_store(store_dir):
+    """Открывает хранилище как набор данных pyarrow (без чтения самих данных)"""
+    return ds.dataset(
+        store_dir,
+        format='parquet',
+        partitioning=_partitioning(),
+    )
+
+
+def read_route(store_dir, vehicle_type, route=None, columns=None):
+    """
+    Читает из хранилища только секцию нужного типа транспорта/маршрута
+
+    Параметры:
+        store_dir (str): Каталог хранилища
+        vehicle_type (str): Тип транспорта (bus/minibus/tramway/trolleybus)
+        route (str/int/None): Номер маршрута (опционально)
+        columns (list/None): Список нужных столбцов (по умолчанию все)
+
+    Возвращает:
+        DataFrame: Отфильтрованные данные
+    """
+    dataset = open_store(store_dir)
+    condition = ds.field('vehicle_type') == vehicle_type.lower()
+    if route is not None:
+        condition = condition & (ds.field('route') == str(route))
+
+    table = dataset.to_table(columns=columns or AVL_SCHEMA.names, filter=condition)
+    return table.to_pandas()
+
+
+def iter_batches(source, columns=None, block_size=CSV_BLOCK_SIZE):
+    """
+    Потоковое чтение AVL-данных пакетами ограниченного размера
+
+    Память определяется размером пакета, а не объемом файла, поэтому так
+    можно пройти по месячным данным любого размера (и по нескольким месяцам подряд)
+
+    Параметры:
+        source (str): Колоночное хранилище (каталог) или CSV файл
+        columns (list/None): Нужные столбцы (по умолчанию все)
+        block_size (int): Байт CSV на один пакет
+
+    Возвращает:
+        generator: DataFrame каждого пакета (тип транспорта в нижнем регистре)
+    """
+    if os.path.isdir(source):
+        for batch in open_store(source).to_batches(columns=columns or AVL_SCHEMA.names):
+            if batch.num_rows:
+                yield batch.to_pandas()
+        return
+    # Тип транспорта и маршрут нужны для отбрасывания пустых строк
+    needed = list(dict.fromkeys((columns or AVL_SCHEMA.names) + PARTITION_COLUMNS))
+    reader = _open_csv(source, block_size=block_size, columns=needed)
+    for batch in _clean_batches(reader, columns or AVL_SCHEMA.names):
+        yield batch.to_pandas()
+
+
+def write_current_route(data, path=CURRENT_ROUTE_PATH):
+    """
+    Сохраняет точки выбранного маршрута в файл Arrow IPC (без сжатия, пригоден для memory map)
+
+    Время сохраняется как timestamp, поэтому следующим этапам не нужно
+    разбирать текст и вызывать pd.to_datetime
+
+    Параметры:
+        data (DataFrame/pyarrow.Table): Точки маршрута
+        path (str): Путь к файлу
+    """
+    if isinstance(data, pa.Table):
+        table = data
+    else:
+        df = data.copy()
+        for name in ('accept_time', 'signal_time'):
+            if name in df.columns and not pd.api.types.is_datetime64_any_dtype(df[name]):
+                df[name] = pd.to_datetime(df[name], errors='coerce')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Запись во временный файл и замена: читатель не увидит недописанный файл
+    tmp_path = f'{path}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def open_current_route(path=CURRENT_ROUTE_PATH):
+    """Таблица выбранного маршрута, отображенная в память без копирования (pyarrow.Table)"""
+    return ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def read_current_route(path=CURRENT_ROUTE_PATH, columns=None):
+    """
+    Точки выбранного маршрута как DataFrame
+
+    Читается файл Arrow IPC через memory map (только нужные столбцы); если его нет,
+    а есть CSV прежнего формата (current_route.csv) — CSV
+
+    Параметры:
+        path (str): Путь к файлу Arrow IPC
+        columns (list/None): Список нужных столбцов (по умолчанию все)
+
+    Возвращает:
+        DataFrame: Точки маршрута
+    """
+    if os.path.exists(path):
+        table = open_current_route(path)
+        if columns is not None:
+            table = table.select([name for name in columns if name in table.column_names])
+        return table.to_pandas()
+
+    legacy_csv = os.path.join(os.path.dirname(path), os.path.basename(LEGACY_ROUTE_CSV))
+    if not os.path.exists(legacy_csv):
+        raise FileNotFoundError(f"Не найден файл выбранного маршрута: {path}")
+    df = pd.read_csv(legacy_csv, sep=';', low_memory=False,
+                     usecols=None if columns is None else (lambda name: name in columns))
+    for name in ('accept_time', 'signal_time'):
+        if name in df.columns:
+            df[name] = pd.to_datetime(df[name], errors='coerce')
+    return df
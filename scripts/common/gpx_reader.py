@@ -0,0 +1,111 @@
+import xml.etree.ElementTree as ET
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+MISSING_TIME = np.iinfo(np.int64).min  # точка без <time>
+_TIME_CHUNK = 65536                     # строк времени, разбираемых numpy за один раз
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _local_name(tag):
+    """Имя тега без пространства имен (GPX 1.0 и 1.1 отличаются только им)"""
+    return tag.rpartition('}')[2]
+
+
+def _parse_times(strings):
+    """
+    Строки ISO 8601 -> мс Unix-времени (int64)
+
+    Обычный для треков вид 2025-04-09T00:30:02Z разбирается numpy целиком,
+    строки со смещением часового пояса — по одной через datetime
+    """
+    result = np.full(len(strings), MISSING_TIME, dtype=np.int64)
+    utc = []
+    utc_index = []
+    for i, value in enumerate(strings):
+        if value is None:
+            continue
+        if value.endswith('Z'):
+            utc.append(value[:-1])
+            utc_index.append(i)
+            continue
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        result[i] = (moment - _EPOCH) // timedelta(milliseconds=1)
+    if utc:
+        result[utc_index] = np.array(utc, dtype='datetime64[ms]').astype(np.int64)
+    return result
+
+
+def read_gpx(gpx_path):
+    """
+    Потоковое чтение точек треков GPX в массивы NumPy без построения объектов gpxpy
+
+    XML разбирается по мере чтения файла, каждая прочитанная точка <trkpt>
+    сразу удаляется из дерева, так что в памяти остаются только массивы.
+    Точки всех треков и сегментов идут подряд, как в исходном файле
+
+    Параметры:
+        gpx_path (str): Путь к GPX файлу
+
+    Возвращает:
+        dict: Массивы одинаковой длины —
+            lat, lon (float64), elevation (float64, NaN без <ele>),
+            time (int64, мс Unix-времени UTC, MISSING_TIME без <time>)
+    """
+    lat = array('d')
+    lon = array('d')
+    elevation = array('d')
+    time = array('q')
+    pending_times = []
+
+    segment = None
+    ele = None
+    when = None
+    for event, elem in ET.iterparse(gpx_path, events=('start', 'end')):
+        name = _local_name(elem.tag)
+        if event == 'start':
+            if name == 'trkseg':
+                segment = elem
+            elif name == 'trkpt':
+                ele = when = None
+            continue
+
+        if name == 'ele':
+            ele = elem.text
+        elif name == 'time':
+            when = elem.text
+        elif name == 'trkpt':
+            lat.append(float(elem.get('lat')))
+            lon.append(float(elem.get('lon')))
+            elevation.append(float(ele) if ele else np.nan)
+            pending_times.append(when.strip() if when else None)
+            if len(pending_times) == _TIME_CHUNK:
+                time.frombytes(_parse_times(pending_times).tobytes())
+                pending_times = []
+            # Разобранная точка больше не нужна: убираем ее из сегмента
+            elem.clear()
+            if segment is not None:
+                segment.remove(elem)
+        elif name == 'trkseg':
+            segment = None
+            elem.clear()
+    if pending_times:
+        time.frombytes(_parse_times(pending_times).tobytes())
+
+    return {
+        'lat': np.frombuffer(lat, dtype=np.float64),
+        'lon': np.frombuffer(lon, dtype=np.float64),
+        'elevation': np.frombuffer(elevation, dtype=np.float64),
+        'time': np.frombuffer(time, dtype=np.int64),
+    }
+
+
+def to_datetime(time_ms):
+    """мс Unix-времени -> datetime UTC (None для MISSING_TIME)"""
+    if time_ms == MISSING_TIME:
+        return None
+    return _EPOCH + timedelta(milliseconds=int(time_ms))
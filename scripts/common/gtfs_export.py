@@ -0,0 +1,443 @@
+import io
+import os
+import time
+import zipfile
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from avl_store import LOCAL_TIMEZONE, SOURCE_TIMEZONE, local_time
+from map_matching import match_track
+from stop_detection import MIN_UUIDS, aggregate_stops, detect_stops, potential_terminals
+
+AGENCY_ID = '1'
+AGENCY_NAME = 'Транспортная компания'
+AGENCY_URL = 'http://example.com'
+AGENCY_TIMEZONE = LOCAL_TIMEZONE
+# Виды транспорта GTFS (route_type): 0 — трамвай, 3 — автобус, 11 — троллейбус
+ROUTE_TYPES = {'bus': 3, 'minibus': 3, 'tramway': 0, 'trolleybus': 11}
+ROUTE_NAMES = {'bus': 'Автобус', 'minibus': 'Маршрутное такси', 'tramway': 'Трамвай', 'trolleybus': 'Троллейбус'}
+RUN_GAP_S = 1800    # с: перерыв в данных ТС дольше этого — новый рейс
+
+# Столбцы таблиц GTFS в порядке записи
+TABLE_COLUMNS = {
+    'agency.txt': ['agency_id', 'agency_name', 'agency_url', 'agency_timezone'],
+    'routes.txt': ['route_id', 'agency_id', 'route_short_name', 'route_long_name', 'route_type'],
+    'stops.txt': ['stop_id', 'stop_name', 'stop_lat', 'stop_lon', 'stop_desc'],
+    'trips.txt': ['route_id', 'service_id', 'trip_id', 'trip_headsign', 'block_id', 'shape_id'],
+    'stop_times.txt': ['trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence'],
+    'shapes.txt': ['shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence'],
+    'calendar_dates.txt': ['service_id', 'date', 'exception_type'],
+}
+
+
+def _gtfs_time(seconds):
+    """Время GTFS ЧЧ:ММ:СС от полуночи дня рейса (после полуночи — больше 24 часов)"""
+    seconds = pd.Series(np.asarray(seconds, dtype=np.int64))
+    return ((seconds // 3600).astype(str).str.zfill(2) + ':' +
+            (seconds % 3600 // 60).astype(str).str.zfill(2) + ':' +
+            (seconds % 60).astype(str).str.zfill(2))
+
+
+def _seconds(delta):
+    """Массив timedelta64 в целые секунды"""
+    return delta.astype('timedelta64[s]').astype(np.int64)
+
+
+def _stop_desc(point_count, duration):
+    """Описание остановки «Точек: K, Время: N мин M сек» для массивов числа точек и продолжительности, с"""
+    point_count = pd.Series(np.asarray(point_count, dtype=np.int64))
+    duration = pd.Series(np.asarray(duration, dtype=np.float64)).astype(np.int64)
+    return ('Точек: ' + point_count.astype(str) + ', Время: ' + (duration // 60).astype(str) + ' мин ' +
+            (duration % 60).astype(str) + ' сек').to_numpy()
+
+
+def stop_visits(points):
+    """
+    Остановки маршрута и посещения их отдельными ТС
+
+    Стоянки ищутся по каждому ТС (uuid) отдельно, близкие остановки объединяются.
+    Посещение — подряд идущие точки стоянки одного ТС у одной остановки без
+    перерыва дольше RUN_GAP_S между ними. Отрезок данных ТС (segment) — точки
+    ТС без перерыва в данных дольше RUN_GAP_S; посещение не переходит через
+    такой перерыв. Конечная — возможная конечная (stop_detection.potential_terminals),
+    которую посещает не меньше MIN_UUIDS ТС (или все ТС маршрута, если их меньше)
+
+    Параметры:
+        points (DataFrame): Точки маршрута (uuid, lat, lon, speed, signal_time — datetime)
+
+    Возвращает:
+        tuple: (DataFrame остановок с признаком is_terminal,
+            DataFrame посещений uuid, stop, arrival, departure, segment по ТС и времени)
+    """
+    points = points.sort_values(['uuid', 'signal_time'], kind='stable').reset_index(drop=True)
+    stops, potential = detect_stops(points, group_column='uuid')
+    if stops.empty:
+        return stops.assign(is_terminal=pd.Series(dtype=bool)), pd.DataFrame(
+            columns=['uuid', 'stop', 'arrival', 'departure', 'segment'])
+    if len(stops) > 1:
+        stops, labels = aggregate_stops(stops)
+    else:
+        labels = np.zeros(1, dtype=np.int64)
+    stops = stops.reset_index(drop=True)
+
+    stop = labels[potential['cluster_id'].to_numpy()]
+    uuid = potential['uuid'].to_numpy()
+    time = potential['signal_time'].to_numpy()
+    unique_uuids = pd.Series(uuid).groupby(stop).nunique().reindex(stops.index, fill_value=0)
+    min_uuids = min(MIN_UUIDS, points['uuid'].nunique())
+    stops['is_terminal'] = potential_terminals(stops) & (unique_uuids >= min_uuids)
+    # Отрезки данных ТС: новый отрезок — у нового ТС и после перерыва в исходных точках
+    all_uuid = points['uuid'].to_numpy()
+    all_time = points['signal_time'].to_numpy()
+    new_segment = np.concatenate([[True], (all_uuid[1:] != all_uuid[:-1]) |
+                                  (_seconds(all_time[1:] - all_time[:-1]) > RUN_GAP_S)])
+    segment = np.cumsum(new_segment)[potential.index.to_numpy()]
+    new_visit = np.concatenate([[True], (uuid[1:] != uuid[:-1]) | (stop[1:] != stop[:-1]) |
+                                (segment[1:] != segment[:-1]) | (_seconds(time[1:] - time[:-1]) > RUN_GAP_S)])
+    visits = pd.DataFrame({'visit': np.cumsum(new_visit), 'uuid': uuid, 'stop': stop, 'time': time,
+                           'segment': segment})
+    visits = visits.groupby('visit', sort=False).agg(
+        uuid=('uuid', 'first'),
+        stop=('stop', 'first'),
+        arrival=('time', 'min'),
+        departure=('time', 'max'),
+        segment=('segment', 'first'),
+    ).reset_index(drop=True)
+    return stops, visits
+
+
+def split_trips(visits, is_terminal):
+    """
+    Рейсы по посещениям остановок: рейс ТС идет от конечной до следующей конечной.
+    Посещение конечной завершает один рейс и начинает следующий. Смену ТС (run)
+    завершают перерыв в данных дольше RUN_GAP_S (новый отрезок segment) и
+    стоянка дольше RUN_GAP_S: в рейс до нее входит только прибытие, следующий
+    рейс начинается с отправления. Если конечные не найдены, рейс завершается
+    перед повторным посещением уже пройденной остановки
+
+    Параметры:
+        visits (DataFrame): Посещения (stop_visits) по ТС и времени
+        is_terminal (array): Признак конечной для каждой остановки
+
+    Возвращает:
+        DataFrame: Посещения рейсов uuid, stop, arrival, departure с номером рейса
+            trip (с нуля) и номером смены ТС run, только рейсы хотя бы с двумя
+            разными остановками
+    """
+    uuid = visits['uuid'].to_numpy()
+    stop = visits['stop'].to_numpy()
+    arrival = visits['arrival'].to_numpy()
+    departure = visits['departure'].to_numpy()
+    segment = visits['segment'].to_numpy()
+    terminal = np.asarray(is_terminal, dtype=bool)[stop]
+    long_dwell = _seconds(departure - arrival) > RUN_GAP_S
+
+    rows = []       # (посещение, прибытие, отправление, смена, рейс)
+    current = []
+    trip = 0
+    run = -1
+
+    def close():
+        nonlocal trip
+        if len({stop[i] for i, *_ in current}) >= 2:
+            rows.extend((i, start, end, run, trip) for i, start, end in current)
+            trip += 1
+        current.clear()
+
+    for i in range(len(visits)):
+        if i == 0 or uuid[i] != uuid[i - 1] or segment[i] != segment[i - 1]:
+            close()
+            run += 1
+        elif not terminal[i] and any(stop[j] == stop[i] for j, *_ in current):
+            # Повтор остановки без конечной между посещениями — начало нового рейса
+            close()
+        if long_dwell[i]:
+            current.append((i, arrival[i], arrival[i]))
+            close()
+            run += 1
+            current.append((i, departure[i], departure[i]))
+        elif terminal[i]:
+            current.append((i, arrival[i], departure[i]))
+            close()
+            current.append((i, arrival[i], departure[i]))
+        else:
+            current.append((i, arrival[i], departure[i]))
+    close()
+
+    if not rows:
+        return pd.DataFrame({
+            'uuid': uuid[:0], 'stop': stop[:0], 'arrival': arrival[:0], 'departure': departure[:0],
+            'run': np.zeros(0, dtype=np.int64), 'trip': np.zeros(0, dtype=np.int64),
+        })
+    index, trip_arrival, trip_departure, trip_run, trip_no = map(np.array, zip(*rows))
+    return pd.DataFrame({
+        'uuid': uuid[index],
+        'stop': stop[index],
+        'arrival': trip_arrival,
+        'departure': trip_departure,
+        'run': trip_run,
+        'trip': trip_no,
+    })
+
+
+def check_trips(trip_visits):
+    """
+    Проверка рейсов split_trips: стоянка у остановки не дольше RUN_GAP_S и
+    остановка не повторяется внутри рейса (кроме возврата кольцевого рейса
+    на начальную конечную)
+
+    Исключения:
+        ValueError: Рейсы с нарушениями
+    """
+    dwell = _seconds(trip_visits['departure'].to_numpy() - trip_visits['arrival'].to_numpy())
+    long_dwell = trip_visits.loc[dwell > RUN_GAP_S, 'trip'].unique()
+    by_trip = trip_visits.groupby('trip')['stop']
+    loop_end = (by_trip.cumcount(ascending=False) == 0) & (trip_visits['stop'] == by_trip.transform('first'))
+    repeated = trip_visits.loc[trip_visits[['trip', 'stop']].duplicated() & ~loop_end, 'trip'].unique()
+    if len(long_dwell) or len(repeated):
+        raise ValueError(f"Рейсы со стоянкой дольше {RUN_GAP_S} с: {sorted(long_dwell.tolist())}, "
+                         f"с повтором остановки: {sorted(repeated.tolist())}")
+
+
+def _trip_geometry(lat, lon, paths=None):
+    """Координаты (lon, lat) рейса: пути по дорогам между точками, при разрыве — точки трека"""
+    pieces = [np.array([[lon[0], lat[0]]])]
+    for i in range(1, len(lat)):
+        path = paths[i] if paths is not None else None
+        pieces.append(np.asarray(path) if path is not None and len(path) else np.array([[lon[i], lat[i]]]))
+    coords = np.concatenate(pieces)
+    repeated = np.zeros(len(coords), dtype=bool)
+    repeated[1:] = (coords[1:] == coords[:-1]).all(axis=1)
+    return coords[~repeated]
+
+
+def route_tables(vehicle_type, route, df, road_net=None, route_cache=None, router=None, tracks=None,
+                 source_timezone=SOURCE_TIMEZONE):
+    """
+    Таблицы GTFS одного маршрута
+
+    Рейс — движение ТС между конечными (split_trips), времена прибытия и
+    отправления — первая и последняя точки стоянки у остановки. Форма рейса
+    строится по привязанной к дорогам геометрии одного рейса на каждую
+    последовательность «первая — последняя остановка». Дни обслуживания и
+    времена расписания — по местному времени агентства (AGENCY_TIMEZONE)
+
+    Параметры:
+        vehicle_type (str): Тип транспорта
+        route (str): Номер маршрута
+        df (DataFrame): Точки маршрута (uuid, lat, lon, speed, signal_time — datetime);
+            исходные координаты — gps_lat, gps_lon, если точки уже привязаны к дорогам
+        road_net (RoadNetwork/None): Дорожная сеть для привязки форм рейсов
+            (None — формы по точкам трека)
+        route_cache (RouteCache/None): Кэш маршрутов между узлами графа
+        router (Router/None): Поиск путей между узлами
+        tracks (list/None): Уже привязанные треки ТС (route_pipeline.match_uuid_tracks)
+        source_timezone (str): Часовой пояс signal_time в точках
+
+    Возвращает:
+        dict: DataFrame по таблицам GTFS (routes.txt, stops.txt, trips.txt,
+            stop_times.txt, shapes.txt) и service_dates — множество дней рейсов
+    """
+    route_id = f'{vehicle_type}_{route}'
+    lat_column, lon_column = ('gps_lat', 'gps_lon') if 'gps_lat' in df.columns else ('lat', 'lon')
+    points = df[['uuid', 'signal_time', 'speed']].assign(lat=df[lat_column], lon=df[lon_column])
+    stops, visits = stop_visits(points)
+    trip_visits = split_trips(visits, stops['is_terminal']) if len(visits) else visits.assign(run=[], trip=[])
+    check_trips(trip_visits)
+
+    tables = {
+        'routes.txt': pd.DataFrame([{
+            'route_id': route_id,
+            'agency_id': AGENCY_ID,
+            'route_short_name': route,
+            'route_long_name': f"{ROUTE_NAMES.get(vehicle_type, vehicle_type)} {route}",
+            'route_type': ROUTE_TYPES.get(vehicle_type, 3),
+        }]),
+        'service_dates': set(),
+    }
+    stop_ids = route_id + '_stop_' + stops.index.astype(str)
+    stop_names = np.where(stops['is_terminal'], 'Конечная ', 'Остановка ') + stops.index.astype(str)
+    tables['stops.txt'] = pd.DataFrame({
+        'stop_id': stop_ids,
+        'stop_name': stop_names,
+        'stop_lat': stops['lat'].round(6).to_numpy(),
+        'stop_lon': stops['lon'].round(6).to_numpy(),
+        'stop_desc': _stop_desc(stops['point_count'], stops['duration']),
+    })
+    if trip_visits.empty:
+        for name in ('trips.txt', 'stop_times.txt', 'shapes.txt'):
+            tables[name] = pd.DataFrame(columns=TABLE_COLUMNS[name])
+        return tables
+
+    # Рейсы: день обслуживания — день первого прибытия по местному времени, форма — по паре конечных
+    trip = trip_visits['trip'].to_numpy()
+    first = trip_visits.groupby('trip').head(1).set_index('trip')
+    last = trip_visits.groupby('trip').tail(1).set_index('trip')
+    service_day = local_time(first['arrival'], source_timezone, AGENCY_TIMEZONE).dt.normalize()
+    pattern = pd.MultiIndex.from_arrays([first['stop'].to_numpy(), last['stop'].to_numpy()])
+    pattern_id = pd.Series(pattern.factorize()[0], index=first.index)
+    trip_ids = route_id + '_trip_' + first.index.astype(str)
+    shape_ids = route_id + '_shape_' + pattern_id.astype(str)
+    tables['trips.txt'] = pd.DataFrame({
+        'route_id': route_id,
+        'service_id': service_day.dt.strftime('%Y%m%d').to_numpy(),
+        'trip_id': trip_ids,
+        'trip_headsign': stop_names[last['stop'].to_numpy()],
+        'block_id': (route_id + '_' + first['uuid'].astype(str) + '_' + first['run'].astype(str)).to_numpy(),
+        'shape_id': shape_ids.to_numpy(),
+    })
+    tables['service_dates'] = set(tables['trips.txt']['service_id'])
+
+    # Время от полуночи дня рейса для каждого посещения
+    midnight = service_day.to_numpy()[trip]
+    arrival, departure = (
+        _seconds(local_time(trip_visits[name], source_timezone, AGENCY_TIMEZONE).to_numpy() - midnight)
+        for name in ('arrival', 'departure')
+    )
+    tables['stop_times.txt'] = pd.DataFrame({
+        'trip_id': trip_ids.to_numpy()[trip],
+        'arrival_time': _gtfs_time(arrival).to_numpy(),
+        'departure_time': _gtfs_time(departure).to_numpy(),
+        'stop_id': stop_ids.to_numpy()[trip_visits['stop'].to_numpy()],
+        'stop_sequence': trip_visits.groupby('trip').cumcount().to_numpy() + 1,
+    })
+
+    # Формы: рейс с наибольшим числом посещений на каждую пару конечных
+    track_by_uuid = {track['uuid']: track for track in tracks} if tracks is not None else {}
+    visit_count = trip_visits.groupby('trip').size()
+    representative = visit_count.groupby(pattern_id.to_numpy()).idxmax()
+    shapes = []
+    for shape, trip_no in representative.items():
+        uid = first.at[trip_no, 'uuid']
+        start, end = first.at[trip_no, 'arrival'], last.at[trip_no, 'departure']
+        if uid in track_by_uuid:
+            # Треки уже привязаны к дорогам (карта маршрута): берутся их пути
+            track = track_by_uuid[uid]
+            times = track['points']['signal_time']
+            window = np.flatnonzero(((times >= start) & (times <= end)).to_numpy())
+            lat = track['points'][lat_column].to_numpy()[window]
+            lon = track['points'][lon_column].to_numpy()[window]
+            paths = [track['paths'][i] for i in window]
+        else:
+            trip_points = points[(points['uuid'] == uid) & (points['signal_time'] >= start) &
+                                 (points['signal_time'] <= end)].sort_values('signal_time')
+            lat, lon = trip_points['lat'].to_numpy(), trip_points['lon'].to_numpy()
+            paths = None
+            if road_net is not None and len(lat) > 1:
+                paths = match_track(road_net, lat, lon, route_cache=route_cache, router=router)['paths']
+        coords = _trip_geometry(lat, lon, paths)
+        shapes.append(pd.DataFrame({
+            'shape_id': f'{route_id}_shape_{shape}',
+            'shape_pt_lat': coords[:, 1].round(6),
+            'shape_pt_lon': coords[:, 0].round(6),
+            'shape_pt_sequence': np.arange(1, len(coords) + 1),
+        }))
+    tables['shapes.txt'] = pd.concat(shapes, ignore_index=True)
+    return tables
+
+
+class GtfsWriter:
+    """
+    Запись GTFS-архива нескольких маршрутов потоком прямо в ZIP
+
+    Самая большая таблица, stop_times.txt, пишется в архив по мере добавления
+    маршрутов и в памяти не накапливается; остальные таблицы (маршруты,
+    остановки, рейсы, формы, дни обслуживания) на порядки меньше и
+    дописываются при закрытии. Строки форматируются векторно через to_csv,
+    без временных каталогов. Архив пишется во временный файл и заменяет
+    прежний только после успешного закрытия
+    """
+
+    def __init__(self, zip_path, agency_name=AGENCY_NAME, agency_url=AGENCY_URL, timezone=AGENCY_TIMEZONE):
+        self.zip_path = zip_path
+        self.agency = pd.DataFrame([{
+            'agency_id': AGENCY_ID,
+            'agency_name': agency_name,
+            'agency_url': agency_url,
+            'agency_timezone': timezone,
+        }])
+        os.makedirs(os.path.dirname(os.path.abspath(zip_path)), exist_ok=True)
+        self._tmp_path = f'{zip_path}.tmp'
+        self._zip = zipfile.ZipFile(self._tmp_path, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._stop_times = self._open_table('stop_times.txt')
+        self._tables = defaultdict(list)
+        self._service_dates = set()
+        self.counts = defaultdict(int)
+
+    def _open_table(self, name):
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        handle = io.TextIOWrapper(self._zip.open(info, 'w', force_zip64=True), encoding='utf-8', newline='')
+        handle.write(','.join(TABLE_COLUMNS[name]) + '\n')
+        return handle
+
+    def _write_rows(self, handle, table, name):
+        table[TABLE_COLUMNS[name]].to_csv(handle, header=False, index=False, lineterminator='\n')
+
+    def add(self, tables):
+        """Добавляет таблицы маршрута (route_tables): stop_times.txt — сразу в архив"""
+        self._write_rows(self._stop_times, tables['stop_times.txt'], 'stop_times.txt')
+        for name in ('routes.txt', 'stops.txt', 'trips.txt', 'shapes.txt'):
+            if len(tables[name]):
+                self._tables[name].append(tables[name])
+        self._service_dates.update(tables['service_dates'])
+        for name in ('routes.txt', 'stops.txt', 'trips.txt', 'stop_times.txt'):
+            self.counts[name] += len(tables[name])
+
+    def close(self):
+        """Дописывает остальные таблицы и сохраняет архив"""
+        self._stop_times.close()
+        dates = sorted(self._service_dates)
+        self._tables['calendar_dates.txt'] = [pd.DataFrame({
+            'service_id': dates,
+            'date': dates,
+            'exception_type': 1,  # рейсы выполнялись в этот день
+        })]
+        self._tables['agency.txt'] = [self.agency]
+        for name in ('agency.txt', 'routes.txt', 'stops.txt', 'trips.txt', 'shapes.txt', 'calendar_dates.txt'):
+            with self._open_table(name) as handle:
+                for table in self._tables[name]:
+                    self._write_rows(handle, table, name)
+        self._zip.close()
+        os.replace(self._tmp_path, self.zip_path)
+
+    def abort(self):
+        """Закрывает и удаляет недописанный архив; прежний архив не меняется"""
+        try:
+            self._stop_times.close()
+            self._zip.close()
+        finally:
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def write_route_gtfs(df, gtfs_zip, road_net=None, route_cache=None, router=None, tracks=None,
+                     vehicle_type=None, route=None):
+    """
+    GTFS-архив одного маршрута (transports_with_stops.py, batch_pipeline.py)
+
+    Тип транспорта и номер маршрута по умолчанию берутся из столбцов
+    vehicle_type и route точек
+
+    Возвращает:
+        dict: Число строк по таблицам
+    """
+    if vehicle_type is None:
+        vehicle_type = str(df['vehicle_type'].iloc[0]).lower() if 'vehicle_type' in df.columns and len(df) else 'bus'
+    if route is None:
+        route = str(df['route'].iloc[0]) if 'route' in df.columns and len(df) else '1'
+    with GtfsWriter(gtfs_zip) as writer:
+        writer.add(route_tables(vehicle_type, route, df, road_net, route_cache, router, tracks))
+    return dict(writer.counts)
@@ -0,0 +1,387 @@
+import json
+
+import numpy as np
+import pandas as pd
+from folium.map import Layer
+from jinja2 import Template
+
+COORD_SCALE = 1e6      # координаты передаются целыми миллионными долями градуса
+VALUE_PRECISION = 3    # знаков после запятой у чисел во всплывающих окнах
+
+# Общие функции JS: разбор компактного массива, раскраска и построение всплывающих окон по запросу
+_JS_HELPERS = """
+    function decodeDelta(encoded) {
+        var out = new Float64Array(encoded.delta.length), acc = 0;
+        for (var i = 0; i < out.length; i++) {
+            acc += encoded.delta[i];
+            out[i] = acc / encoded.scale;
+        }
+        return out;
+    }
+    function columnValue(column, i) {
+        if (Array.isArray(column)) { return column[i]; }
+        return column.values[column.codes[i]];
+    }
+    function makeColor(spec) {
+        if (spec.constant !== undefined) { return function () { return spec.constant; }; }
+        if (spec.breaks === undefined) {
+            return function (i) { return spec.palette[spec.codes[i]]; };
+        }
+        return function (i) {
+            var v = spec.values[i], k = 0;
+            if (v === null) { return spec.missing; }
+            while (k < spec.breaks.length && v >= spec.breaks[k]) { k++; }
+            return spec.palette[k];
+        };
+    }
+    function makeHtml(fields) {
+        if (fields === null) { return null; }
+        return function (i) {
+            var rows = [];
+            for (var k = 0; k < fields.names.length; k++) {
+                var v = columnValue(fields.columns[k], i);
+                if (v !== null) { rows.push(fields.names[k] + ': ' + v); }
+            }
+            return rows.join('<br>');
+        };
+    }
+    function bindLazy(layer, popupHtml, tooltipHtml) {
+        if (popupHtml) {
+            layer.on('click', function (e) {
+                L.popup().setLatLng(e.latlng).setContent(popupHtml(e.layer._rowIndex)).openOn(layer._map);
+            });
+        }
+        if (tooltipHtml) {
+            layer.on('mouseover', function (e) {
+                if (!e.layer.getTooltip()) { e.layer.bindTooltip(tooltipHtml(e.layer._rowIndex), {sticky: true}); }
+                e.layer.openTooltip(e.latlng);
+            });
+        }
+    }
+"""
+
+
+def _delta_encode(values):
+    """Координаты -> целые разности соседних значений (короткие числа в JSON)"""
+    ints = np.round(np.asarray(values, dtype=np.float64) * COORD_SCALE).astype(np.int64)
+    return {'scale': COORD_SCALE, 'delta': np.diff(ints, prepend=0).tolist()}
+
+
+def _encode_column(values, precision=VALUE_PRECISION):
+    """Столбец для всплывающих окон: числа списком, остальное — словарь значений и коды"""
+    series = pd.Series(values).reset_index(drop=True)
+    if pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series.tolist()
+    if pd.api.types.is_float_dtype(series):
+        rounded = series.round(precision)
+        return [None if np.isnan(v) else v for v in rounded.tolist()]
+    codes, uniques = pd.factorize(series.astype(str))
+    return {'codes': codes.tolist(), 'values': uniques.tolist()}
+
+
+def _encode_fields(fields, precision=VALUE_PRECISION):
+    """DataFrame/словарь столбцов -> {'names': [...], 'columns': [...]} или None"""
+    if fields is None:
+        return None
+    fields = pd.DataFrame(fields)
+    return {
+        'names': [str(name) for name in fields.columns],
+        'columns': [_encode_column(fields[name], precision) for name in fields.columns],
+    }
+
+
+def _encode_color(color, count, palette=None, breaks=None, missing='gray'):
+    """
+    Правило раскраски, применяемое в браузере
+
+    Параметры:
+        color (str/array): Один цвет или значения для раскраски
+        count (int): Число объектов слоя
+        palette (dict/list/None): Для категорий — словарь значение -> цвет;
+            для интервалов — список из len(breaks) + 1 цветов
+        breaks (list/None): Пороги интервалов (по возрастанию)
+        missing (str): Цвет для отсутствующих значений
+    """
+    if isinstance(color, str):
+        return {'constant': color}
+    values = pd.Series(color).reset_index(drop=True)
+    if len(values) != count:
+        raise ValueError(f"Число значений цвета ({len(values)}) не совпадает с числом объектов ({count})")
+    if breaks is not None:
+        numbers = values.astype(float)
+        return {
+            'values': [None if np.isnan(v) else v for v in numbers.tolist()],
+            'breaks': [float(b) for b in breaks],
+            'palette': list(palette),
+            'missing': missing,
+        }
+    codes, uniques = pd.factorize(values)
+    colors = [palette.get(value, missing) for value in uniques] + [missing]
+    codes[codes < 0] = len(uniques)
+    return {'codes': codes.tolist(), 'palette': colors}
+
+
+def _to_json(payload):
+    """JSON для вставки внутрь <script>"""
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+
+
+class PointLayer(Layer):
+    """
+    Слой точек одним компактным массивом вместо отдельного маркера folium на точку
+
+    Координаты передаются разностями целых значений, цвета и всплывающие окна
+    вычисляются в браузере, точки рисуются на canvas. Размер HTML и время
+    генерации растут почти линейно с небольшой константой
+
+    Параметры:
+        lat (array): Широты точек
+        lon (array): Долготы точек
+        name (str/None): Название слоя в панели управления
+        color (str/array): Цвет точек или значения для раскраски (см. palette, breaks)
+        palette (dict/list/None): Категории -> цвета (например, uuid) или цвета интервалов
+        breaks (list/None): Пороги интервалов для числовых значений (например, скорость)
+        popup (DataFrame/dict/None): Столбцы всплывающего окна по клику
+        tooltip (DataFrame/dict/None): Столбцы подсказки при наведении
+        radius (float): Радиус точки, пикселей
+        fill_opacity (float): Непрозрачность заливки
+        precision (int): Знаков после запятой у чисел во всплывающих окнах
+        overlay, control, show (bool): Параметры слоя folium
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.featureGroup();
+        (function () {
+            {{ this.helpers }}
+            var data = {{ this.payload }};
+            var layer = {{ this.get_name() }};
+            var lat = decodeDelta(data.lat), lon = decodeDelta(data.lon);
+            var color = makeColor(data.color);
+            var renderer = L.canvas({padding: 0.5});
+            for (var i = 0; i < lat.length; i++) {
+                var c = color(i);
+                var marker = L.circleMarker([lat[i], lon[i]], {
+                    renderer: renderer, radius: data.radius, weight: 1,
+                    color: c, fillColor: c, fillOpacity: data.fill_opacity
+                });
+                marker._rowIndex = i;
+                layer.addLayer(marker);
+            }
+            bindLazy(layer, makeHtml(data.popup), makeHtml(data.tooltip));
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, lat, lon, name=None, color='blue', palette=None, breaks=None, popup=None,
+                 tooltip=None, radius=3, fill_opacity=0.7, precision=VALUE_PRECISION,
+                 overlay=True, control=True, show=True):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = 'PointLayer'
+        count = len(lat)
+        self.helpers = _JS_HELPERS
+        self.payload = _to_json({
+            'lat': _delta_encode(lat),
+            'lon': _delta_encode(lon),
+            'color': _encode_color(color, count, palette, breaks),
+            'popup': _encode_fields(popup, precision),
+            'tooltip': _encode_fields(tooltip, precision),
+            'radius': radius,
+            'fill_opacity': fill_opacity,
+        })
+
+
+class LineLayer(Layer):
+    """
+    Слой линий (например, участков трека между точками) одним компактным массивом
+
+    Вершины всех линий хранятся в общем массиве со смещениями начала каждой линии;
+    цвета и всплывающие окна вычисляются в браузере, линии рисуются на canvas
+
+    Параметры:
+        lines (list): Координаты линий — массивы (n, 2) в порядке (lon, lat)
+        name (str/None): Название слоя в панели управления
+        color, palette, breaks: Раскраска линий (как у PointLayer)
+        popup (DataFrame/dict/None): Столбцы всплывающего окна по клику
+        tooltip (DataFrame/dict/None): Столбцы подсказки при наведении
+        weight (float): Толщина линии, пикселей
+        opacity (float): Непрозрачность линии
+        precision (int): Знаков после запятой у чисел во всплывающих окнах
+        overlay, control, show (bool): Параметры слоя folium
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.featureGroup();
+        (function () {
+            {{ this.helpers }}
+            var data = {{ this.payload }};
+            var layer = {{ this.get_name() }};
+            var lat = decodeDelta(data.lat), lon = decodeDelta(data.lon);
+            var color = makeColor(data.color);
+            var renderer = L.canvas({padding: 0.5});
+            for (var i = 0; i + 1 < data.offsets.length; i++) {
+                var latlngs = [];
+                for (var k = data.offsets[i]; k < data.offsets[i + 1]; k++) {
+                    latlngs.push([lat[k], lon[k]]);
+                }
+                var line = L.polyline(latlngs, {
+                    renderer: renderer, color: color(i), weight: data.weight, opacity: data.opacity
+                });
+                line._rowIndex = i;
+                layer.addLayer(line);
+            }
+            bindLazy(layer, makeHtml(data.popup), makeHtml(data.tooltip));
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, lines, name=None, color='blue', palette=None, breaks=None, popup=None,
+                 tooltip=None, weight=3, opacity=0.8, precision=VALUE_PRECISION,
+                 overlay=True, control=True, show=True):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = 'LineLayer'
+        lines = [np.asarray(line, dtype=np.float64).reshape(-1, 2) for line in lines]
+        coords = np.concatenate(lines) if lines else np.empty((0, 2))
+        offsets = np.concatenate([[0], np.cumsum([len(line) for line in lines])]).astype(np.int64)
+        self.helpers = _JS_HELPERS
+        self.payload = _to_json({
+            'lat': _delta_encode(coords[:, 1]),
+            'lon': _delta_encode(coords[:, 0]),
+            'offsets': offsets.tolist(),
+            'color': _encode_color(color, len(lines), palette, breaks),
+            'popup': _encode_fields(popup, precision),
+            'tooltip': _encode_fields(tooltip, precision),
+            'weight': weight,
+            'opacity': opacity,
+        })
+
+
+class TiledGeoJson(Layer):
+    """
+    Слой векторных тайлов с локального сервера (tiles/tile_server.py)
+
+    Браузер запрашивает только видимые тайлы текущего масштаба и удаляет
+    ушедшие с экрана, поэтому размер HTML не зависит от объема данных.
+    Тайлы заранее нарезаны tiles/build_tiles.py с упрощением под масштаб
+
+    Параметры:
+        url_base (str): Адрес сервера тайлов (tile_store.ensure_tile_server)
+        layer (str): Имя слоя в архиве тайлов
+        name (str/None): Название слоя в панели управления
+        color (str): Цвет объектов, если не задан color_property
+        color_property (str/None): Свойство объекта для раскраски
+        palette (dict/list/None): Категории -> цвета или цвета интервалов (как у PointLayer)
+        breaks (list/None): Пороги интервалов для числового color_property
+        value_range (tuple/None): (min, max) — показывать только объекты со значением
+            color_property в полуинтервале [min, max)
+        popup (dict/list/None): Свойства во всплывающем окне: список имен или словарь имя -> подпись
+        min_zoom (int): Масштаб, с которого слой отображается
+        max_native_zoom (int): Наибольший масштаб в архиве (дальше тайлы берутся с него)
+        layer_info (dict/None): Описание слоя в архиве (tile_store.archive_layers):
+            min_zoom и max_native_zoom берутся из его min_zoom и max_zoom
+        weight (float): Толщина линии, пикселей
+        opacity (float): Непрозрачность линии
+        overlay, control, show (bool): Параметры слоя folium
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function () {
+            var opts = {{ this.payload }};
+            var renderer = L.canvas({padding: 0.5});
+            function featureColor(props) {
+                if (opts.property === null) { return opts.color; }
+                var v = props[opts.property];
+                if (v === undefined || v === null) { return opts.missing; }
+                if (opts.breaks === null) {
+                    var c = opts.palette[v];
+                    return c === undefined ? opts.missing : c;
+                }
+                var k = 0;
+                while (k < opts.breaks.length && v >= opts.breaks[k]) { k++; }
+                return opts.palette[k];
+            }
+            function featureVisible(feature) {
+                if (opts.range === null) { return true; }
+                var v = feature.properties[opts.property];
+                return v !== undefined && v !== null && v >= opts.range[0] && v < opts.range[1];
+            }
+            function popupHtml(layer) {
+                var props = layer.feature.properties, rows = [];
+                for (var k = 0; k < opts.popup.length; k++) {
+                    var v = props[opts.popup[k][0]];
+                    if (v !== undefined && v !== null) { rows.push(opts.popup[k][1] + ': ' + v); }
+                }
+                return rows.join('<br>');
+            }
+            var VectorTiles = L.GridLayer.extend({
+                createTile: function (coords, done) {
+                    var tile = document.createElement('div');
+                    var key = this._tileCoordsToKey(coords);
+                    var self = this;
+                    var url = opts.url + '/' + opts.layer + '/' + coords.z + '/' + coords.x + '/' + coords.y + '.geojson';
+                    fetch(url).then(function (response) { return response.json(); }).then(function (data) {
+                        // Тайл мог уйти с экрана, пока шел запрос
+                        if (self._map && self._tiles[key] && self._tiles[key].el === tile && data.features.length) {
+                            var features = L.geoJSON(data, {
+                                renderer: renderer,
+                                filter: featureVisible,
+                                style: function (feature) {
+                                    return {color: featureColor(feature.properties), weight: opts.weight, opacity: opts.opacity};
+                                }
+                            });
+                            if (opts.popup.length) { features.bindPopup(popupHtml); }
+                            self._features[key] = features.addTo(self._map);
+                        }
+                        done(null, tile);
+                    }).catch(function (error) { done(error, tile); });
+                    return tile;
+                }
+            });
+            var layer = new VectorTiles({
+                minZoom: opts.min_zoom, maxNativeZoom: opts.max_native_zoom, updateWhenZooming: false
+            });
+            layer._features = {};
+            layer.on('tileunload', function (e) {
+                var key = layer._tileCoordsToKey(e.coords);
+                if (layer._features[key]) {
+                    layer._features[key].remove();
+                    delete layer._features[key];
+                }
+            });
+            return layer;
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, url_base, layer, name=None, color='blue', color_property=None, palette=None,
+                 breaks=None, value_range=None, popup=None, min_zoom=10, max_native_zoom=16, layer_info=None,
+                 weight=3, opacity=0.8, missing='gray', overlay=True, control=True, show=True):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = 'TiledGeoJson'
+        if value_range is not None and color_property is None:
+            raise ValueError("value_range задается для свойства color_property")
+        if layer_info:
+            min_zoom, max_native_zoom = layer_info['min_zoom'], layer_info['max_zoom']
+        if isinstance(popup, dict):
+            popup_fields = [[str(key), str(label)] for key, label in popup.items()]
+        else:
+            popup_fields = [[str(key), str(key)] for key in (popup or [])]
+        if breaks is not None:
+            palette = list(palette)
+        self.payload = _to_json({
+            'url': url_base.rstrip('/'),
+            'layer': layer,
+            'color': color,
+            'property': color_property,
+            'palette': palette,
+            'breaks': None if breaks is None else [float(b) for b in breaks],
+            'range': None if value_range is None else [float(v) for v in value_range],
+            'missing': missing,
+            'popup': popup_fields,
+            'min_zoom': min_zoom,
+            'max_native_zoom': max_native_zoom,
+            'weight': weight,
+            'opacity': opacity,
+        })
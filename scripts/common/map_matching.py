@@ -0,0 +1,331 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.sparse.csgraph import dijkstra
+from shapely.ops import substring
+
+from road_network import from_metric, haversine_m, to_metric
+
+# Параметры скрытой марковской модели (Newson & Krumm, 2009)
+CANDIDATE_RADIUS_M = 50      # радиус поиска дорог-кандидатов вокруг GPS-точки
+MAX_CANDIDATES = 5           # не больше стольких ближайших дорог на точку
+GPS_SIGMA_M = 20             # СКО ошибки GPS (вероятность наблюдения)
+TRANSITION_BETA_M = 100      # масштаб штрафа за расхождение пути по сети и по прямой
+ROUTE_DISTANCE_FACTOR = 3    # поиск пути ограничен этим множителем прямого расстояния
+
+
+def _find_candidates(road_net, lat, lon, radius_m, max_candidates):
+    """
+    Дороги-кандидаты для всех точек трека одним запросом к STR-дереву
+
+    Возвращает:
+        DataFrame: point, link, distance_m, fraction, offset_m — по строке на кандидата
+    """
+    x, y = to_metric(lon, lat)
+    points = shapely.points(x, y)
+    point_idx, link_idx = road_net.metric_tree.query(points, predicate='dwithin', distance=radius_m)
+
+    lines = road_net.metric_geoms[link_idx]
+    candidates = pd.DataFrame({
+        'point': point_idx,
+        'link': link_idx,
+        'distance_m': shapely.distance(lines, points[point_idx]),
+        'fraction': shapely.line_locate_point(lines, points[point_idx], normalized=True),
+    })
+    candidates = candidates.sort_values(['point', 'distance_m'], kind='stable')
+    candidates = candidates[candidates.groupby('point').cumcount() < max_candidates]
+    candidates['offset_m'] = candidates['fraction'].to_numpy() * np.asarray(road_net.link_length_m)[candidates['link'].to_numpy()]
+    return candidates.reset_index(drop=True)
+
+
+def _node_distances(road_net, sources, targets, limit, route_cache=None):
+    """Матрица расстояний по сети sources x targets (из кэша или одним вызовом Дейкстры)"""
+    if route_cache is not None:
+        dist = route_cache.lookup_distances(sources, targets, limit)
+        if dist is not None:
+            return dist
+    dist = dijkstra(road_net.csgraph, directed=True, indices=sources, limit=limit)[:, targets]
+    if route_cache is not None:
+        route_cache.store_distances(sources, targets, dist, limit)
+    return dist
+
+
+def _route_distances(road_net, prev, curr, limit, route_cache=None):
+    """
+    Расстояния по сети между кандидатами двух соседних точек
+
+    Путь из позиции на цепочке дорог идет через один из ее концевых узлов;
+    поиск от всех концевых узлов предыдущей точки — один вызов Дейкстры
+
+    Возвращает:
+        tuple: (матрица расстояний, индексы концов (i, j), через которые идет путь)
+    """
+    edge_nodes = np.asarray(road_net.edge_nodes)
+    prev_nodes = edge_nodes[prev['edge']]              # (n_prev, 2)
+    curr_nodes = edge_nodes[curr['edge']]              # (n_curr, 2)
+    prev_to_end = np.column_stack([prev['position_m'], prev['edge_length_m'] - prev['position_m']])
+    curr_from_end = np.column_stack([curr['position_m'], curr['edge_length_m'] - curr['position_m']])
+
+    sources, source_pos = np.unique(prev_nodes, return_inverse=True)
+    targets, target_pos = np.unique(curr_nodes, return_inverse=True)
+    dist = _node_distances(road_net, sources, targets, limit, route_cache)
+
+    # total[i, a, j, b]: кандидат i -> конец a его цепочки -> конец b цепочки кандидата j -> кандидат j
+    node_dist = dist[:, target_pos.reshape(curr_nodes.shape)][source_pos.reshape(prev_nodes.shape)]
+    total = prev_to_end[:, :, None, None] + node_dist + curr_from_end[None, None, :, :]
+    flat = total.transpose(0, 2, 1, 3).reshape(len(prev['edge']), len(curr['edge']), 4)
+    best_end = flat.argmin(axis=2)
+    route = np.take_along_axis(flat, best_end[:, :, None], axis=2)[:, :, 0]
+
+    # Обе точки на одной цепочке: движение вдоль нее без выхода на узлы
+    same_edge = prev['edge'][:, None] == curr['edge'][None, :]
+    along = np.abs(prev['position_m'][:, None] - curr['position_m'][None, :])
+    use_along = same_edge & (along <= route)
+    route = np.where(use_along, along, route)
+    best_end = np.where(use_along, -1, best_end)
+    return route, best_end
+
+
+def _node_path(road_net, source, target, limit, route_cache=None, router=None):
+    """Кратчайший путь между двумя узлами графа (список узлов) или None"""
+    if source == target:
+        return [source]
+    if route_cache is not None:
+        path = route_cache.lookup_path(source, target)
+        if path is not None:
+            return path
+    if router is not None:
+        try:
+            path = router.shortest_path(source, target)
+        except nx.NetworkXNoPath:
+            return None
+        length = float(np.sum(road_net.path_lengths(path)))
+    else:
+        dist, pred = dijkstra(road_net.csgraph, directed=True, indices=source,
+                              limit=limit, return_predecessors=True)
+        if not np.isfinite(dist[target]):
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(int(pred[path[-1]]))
+        path = path[::-1]
+        length = dist[target]
+    if route_cache is not None:
+        route_cache.store_path(source, target, path, length)
+    return path
+
+
+def _metric_to_lonlat(coords):
+    """Координаты METRIC_CRS (n, 2) в (lon, lat)"""
+    lon, lat = from_metric(coords[:, 0], coords[:, 1])
+    return np.column_stack([lon, lat])
+
+
+def _link_piece(road_net, link, start_fraction, end_fraction):
+    """
+    Координаты (lon, lat) участка дороги между двумя долями ее длины
+
+    Доли — доли метрической длины (line_locate_point по metric_geoms), поэтому
+    часть дороги вырезается из метрической геометрии; дорога целиком берется
+    из road_geoms без пересчета координат
+    """
+    low, high = min(start_fraction, end_fraction), max(start_fraction, end_fraction)
+    if low == 0 and high == 1:
+        coords = shapely.get_coordinates(road_net.road_geoms[link])
+    else:
+        piece = substring(road_net.metric_geoms[link], low, high, normalized=True)
+        coords = _metric_to_lonlat(shapely.get_coordinates(piece))
+    return coords if start_fraction <= end_fraction else coords[::-1]
+
+
+def _chain_end(road_net, edge, end):
+    """Позиция (дорога, доля ее длины) в начале (end=0) или в конце (end=1) цепочки"""
+    links, flipped = road_net.edge_link_sequence(edge)
+    k = 0 if end == 0 else len(links) - 1
+    return {'link': int(links[k]), 'fraction': float(bool(end) != bool(flipped[k]))}
+
+
+def _chain_walk(road_net, edge, start, end):
+    """
+    Геометрия и дороги участка цепочки между двумя позициями на ней
+
+    Возвращает:
+        tuple: (координаты (lon, lat), список индексов дорог в порядке движения)
+    """
+    links, flipped = road_net.edge_link_sequence(edge)
+    links = links.tolist()
+    k_start, k_end = links.index(int(start['link'])), links.index(int(end['link']))
+    if k_start == k_end:
+        return _link_piece(road_net, links[k_start], start['fraction'], end['fraction']), [links[k_start]]
+
+    # Вдоль цепочки каждая дорога проходится от входного конца к выходному
+    forward = k_start < k_end
+    step = 1 if forward else -1
+    pieces = [_link_piece(road_net, links[k_start], start['fraction'], float(forward != flipped[k_start]))]
+    for k in range(k_start + step, k_end, step):
+        pieces.append(_link_piece(road_net, links[k], float(forward == flipped[k]), float(forward != flipped[k])))
+    pieces.append(_link_piece(road_net, links[k_end], float(forward == flipped[k_end]), end['fraction']))
+    return np.concatenate(pieces), [links[k] for k in range(k_start, k_end + step, step)]
+
+
+def _transition_geometry(road_net, prev, curr, end, limit, route_cache=None, router=None):
+    """
+    Геометрия и последовательность дорог перехода между выбранными кандидатами
+
+    Возвращает:
+        tuple: (координаты пути (lon, lat), список индексов дорог) или (None, None)
+    """
+    if end < 0:
+        coords, links = _chain_walk(road_net, prev['edge'], prev, curr)
+        pieces, link_pieces = [coords], [links]
+    else:
+        prev_end, curr_end = divmod(int(end), 2)
+        source = int(road_net.edge_nodes[prev['edge']][prev_end])
+        target = int(road_net.edge_nodes[curr['edge']][curr_end])
+        node_path = _node_path(road_net, source, target, limit, route_cache, router)
+        if node_path is None:
+            return None, None
+
+        head, head_links = _chain_walk(road_net, prev['edge'], prev, _chain_end(road_net, prev['edge'], prev_end))
+        tail, tail_links = _chain_walk(road_net, curr['edge'], _chain_end(road_net, curr['edge'], curr_end), curr)
+        pieces = [head, road_net.path_coords(node_path), tail]
+        link_pieces = [head_links, road_net.path_links(node_path), tail_links]
+
+    coords = np.concatenate(pieces)
+    # Концы участков дорог совпадают между собой и с узлами пути — убираем повторы
+    repeated = np.zeros(len(coords), dtype=bool)
+    repeated[1:] = (coords[1:] == coords[:-1]).all(axis=1)
+    coords = coords[~repeated]
+
+    links = []
+    for link in (link for piece in link_pieces for link in piece):
+        if not links or links[-1] != link:
+            links.append(link)
+    return coords, links
+
+
+def match_track(road_net, lat, lon, radius_m=CANDIDATE_RADIUS_M, max_candidates=MAX_CANDIDATES,
+                sigma_m=GPS_SIGMA_M, beta_m=TRANSITION_BETA_M, route_cache=None, router=None, path_mask=None):
+    """
+    Привязка трека одного транспортного средства к дорожной сети (HMM + Витерби)
+
+    Параметры:
+        road_net (RoadNetwork): Дорожная сеть (road_network.load_road_network)
+        lat (array): Широты точек трека, упорядоченных по времени
+        lon (array): Долготы точек трека
+        radius_m (float): Радиус поиска дорог-кандидатов, м
+        max_candidates (int): Максимум кандидатов на точку
+        sigma_m (float): СКО ошибки GPS, м
+        beta_m (float): Параметр вероятности перехода, м
+        route_cache (RouteCache/None): Кэш маршрутов между узлами графа
+        router (Router/None): Маршрутизатор для восстановления путей (по умолчанию — Дейкстра scipy)
+        path_mask (array/None): Точки i, для которых нужен путь от точки i-1 (bool, длина трека);
+            привязка точек от этого не зависит, пути остальных переходов не восстанавливаются.
+            По умолчанию — все переходы
+
+    Возвращает:
+        dict: 'points' — DataFrame по точкам трека (lat, lon привязанной точки,
+              link_id, offset_m, matched); 'paths' — список координат (lon, lat)
+              пути от точки i-1 к точке i (None для i=0, при разрыве и вне path_mask);
+              'links' — список последовательностей дорог для тех же переходов
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    n = len(lat)
+    points = pd.DataFrame({
+        'lat': np.full(n, np.nan),
+        'lon': np.full(n, np.nan),
+        'link_id': np.full(n, -1, dtype=np.int64),
+        'offset_m': np.full(n, np.nan),
+        'matched': np.zeros(n, dtype=bool),
+    })
+    paths = [None] * n
+    links = [None] * n
+    if n == 0:
+        return {'points': points, 'paths': paths, 'links': links}
+
+    candidates = _find_candidates(road_net, lat, lon, radius_m, max_candidates)
+    # Положение кандидата на цепочке дорог (ребре графа), м от ее начала
+    link = candidates['link'].to_numpy()
+    offset_m = candidates['offset_m'].to_numpy()
+    candidates['edge'] = np.asarray(road_net.link_edge)[link]
+    candidates['edge_length_m'] = np.asarray(road_net.edge_length_m)[candidates['edge'].to_numpy()]
+    candidates['position_m'] = np.asarray(road_net.link_edge_start_m)[link] + np.where(
+        np.asarray(road_net.link_reversed)[link],
+        np.asarray(road_net.link_length_m)[link] - offset_m,
+        offset_m,
+    )
+    emission = -0.5 * (candidates['distance_m'].to_numpy() / sigma_m) ** 2
+    by_point = {
+        point: {name: group[name].to_numpy()
+                for name in ('link', 'fraction', 'offset_m', 'edge', 'position_m', 'edge_length_m')}
+        for point, group in candidates.groupby('point')
+    }
+    emission_by_point = {point: emission[idx] for point, idx in candidates.groupby('point').indices.items()}
+    observed = sorted(by_point)
+
+    # Прямой проход Витерби: score — лог-вероятность лучшей цепочки до кандидата
+    chain = []          # (точка, score, обратные указатели, концы путей, лимит поиска)
+    score = None
+    prev_point = None
+    for point in observed:
+        curr = by_point[point]
+        back = best_end = limit = None
+        if prev_point is not None and prev_point == point - 1:
+            prev = by_point[prev_point]
+            gc = haversine_m(lon[prev_point], lat[prev_point], lon[point], lat[point])
+            limit = ROUTE_DISTANCE_FACTOR * gc + 2 * radius_m
+            route, best_end = _route_distances(road_net, prev, curr, limit, route_cache)
+            total = score[:, None] - np.abs(route - gc) / beta_m
+            back = total.argmax(axis=0)
+            best = total[back, np.arange(len(back))]
+            if np.isfinite(best).any():
+                score = best + emission_by_point[point]
+            else:
+                back = None  # нет пути по сети: разрыв трека
+        if back is None:
+            # Начало трека, пропуск точки без кандидатов или разрыв — цепочка начинается заново
+            score = emission_by_point[point]
+        chain.append((point, score, back, best_end, limit))
+        prev_point = point
+
+    # Обратный проход: выбор кандидатов и восстановление путей
+    chosen = {}
+    choice = None
+    for point, point_score, back, best_end, limit in reversed(chain):
+        if choice is None:
+            choice = int(np.argmax(point_score))
+        chosen[point] = choice
+        if back is None:
+            choice = None
+            continue
+        prev_choice = int(back[choice])
+        if path_mask is not None and not path_mask[point]:
+            choice = prev_choice
+            continue
+        prev = {name: values[prev_choice] for name, values in by_point[point - 1].items()}
+        curr = {name: values[choice] for name, values in by_point[point].items()}
+        paths[point], links[point] = _transition_geometry(
+            road_net, prev, curr, int(best_end[prev_choice, choice]), limit, route_cache, router
+        )
+        choice = prev_choice
+
+    if not chosen:
+        return {'points': points, 'paths': paths, 'links': links}
+
+    matched = np.array(sorted(chosen), dtype=np.int64)
+    picked = [chosen[point] for point in matched]
+    link_id = np.array([by_point[p]['link'][c] for p, c in zip(matched, picked)], dtype=np.int64)
+    fraction = np.array([by_point[p]['fraction'][c] for p, c in zip(matched, picked)])
+    offset_m = np.array([by_point[p]['offset_m'][c] for p, c in zip(matched, picked)])
+    # Доли — по метрической геометрии, и точка на дороге берется из нее же
+    snapped = _metric_to_lonlat(shapely.get_coordinates(
+        shapely.line_interpolate_point(road_net.metric_geoms[link_id], fraction, normalized=True)
+    ))
+    points.loc[matched, 'lon'] = snapped[:, 0]
+    points.loc[matched, 'lat'] = snapped[:, 1]
+    points.loc[matched, 'link_id'] = link_id
+    points.loc[matched, 'offset_m'] = offset_m
+    points.loc[matched, 'matched'] = True
+    return {'points': points, 'paths': paths, 'links': links}
@@ -0,0 +1,86 @@
+import numpy as np
+
+BIN_WIDTH_KMH = 0.1   # ширина интервала гистограммы скоростей, км/ч
+UPPER_KMH = 300.0     # скорости выше попадают в последний интервал
+
+
+class SpeedSketch:
+    """
+    Объединяемый приближенный эскиз распределения скоростей для квантилей
+
+    Гистограмма с интервалами фиксированной ширины: в каждом интервале хранятся
+    число значений и их сумма. Память постоянна (несколько десятков КБ) и не
+    зависит от объема данных; эскизы, построенные по разным частям данных
+    (пакетам, месяцам, процессам), складываются без потери точности.
+    Порядковая статистика оценивается средним значением своего интервала,
+    поэтому ошибка квантиля не больше ширины интервала, а если в интервал
+    попадает одно значение (скорости AVL кратны 1 км/ч), квантиль точный
+    """
+
+    def __init__(self, bin_width=BIN_WIDTH_KMH, upper=UPPER_KMH):
+        self.bin_width = bin_width
+        self.upper = upper
+        n_bins = int(np.ceil(upper / bin_width)) + 1
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.sums = np.zeros(n_bins, dtype=np.float64)
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def update(self, values):
+        """Добавляет значения (NaN пропускаются)"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        n_bins = len(self.counts)
+        idx = np.clip(np.floor(values / self.bin_width), 0, n_bins - 1).astype(np.int64)
+        self.counts += np.bincount(idx, minlength=n_bins)
+        self.sums += np.bincount(idx, weights=values, minlength=n_bins)
+        return self
+
+    def merge(self, other):
+        """Добавляет к эскизу другой эскиз с теми же параметрами"""
+        if other.bin_width != self.bin_width or other.upper != self.upper:
+            raise ValueError("Эскизы с разными интервалами нельзя объединить")
+        self.counts += other.counts
+        self.sums += other.sums
+        return self
+
+    def _order_values(self, ranks):
+        """Оценки порядковых статистик с номерами ranks (с нуля)"""
+        bins = np.searchsorted(np.cumsum(self.counts), ranks, side='right')
+        return self.sums[bins] / self.counts[bins]
+
+    def quantile(self, q):
+        """
+        Квантиль с линейной интерполяцией между порядковыми статистиками (как pandas.Series.quantile)
+
+        Параметры:
+            q (float/array): Уровни квантилей от 0 до 1
+
+        Возвращает:
+            float/np.ndarray: Значения квантилей (NaN для пустого эскиза)
+        """
+        q = np.asarray(q, dtype=np.float64)
+        n = self.count
+        if n == 0:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        position = q * (n - 1)
+        lower = np.floor(position)
+        values_lower = self._order_values(lower)
+        values_upper = self._order_values(np.ceil(position))
+        result = values_lower + (values_upper - values_lower) * (position - lower)
+        return result if q.ndim else float(result)
+
+    def iqr_bounds(self, multiplier):
+        """
+        Границы IQR-фильтра выбросов
+
+        Возвращает:
+            tuple: (Q1 - k·IQR, Q3 + k·IQR)
+        """
+        q1, q3 = self.quantile([0.25, 0.75])
+        iqr = q3 - q1
+        return q1 - multiplier * iqr, q3 + multiplier * iqr
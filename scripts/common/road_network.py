@@ -0,0 +1,465 @@
+import hashlib
+import json
+import os
+import pickle
+
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+import scipy.sparse
+import scipy.spatial
+import shapely
+from pyproj import Transformer
+from shapely.strtree import STRtree
+
+# Версия формата кэша: при изменении структуры массивов кэш перестраивается
+CACHE_VERSION = 3
+CACHE_DIR_NAME = '.road_network_cache'
+SHAPEFILE_PARTS = ('.SHP', '.SHX', '.DBF', '.PRJ', '.CPG')
+EARTH_RADIUS_M = 6371008.8
+METRIC_CRS = 'EPSG:32648'  # UTM 48N: метрическая проекция для Иркутска
+
+# Граф строится на уровне дорог: узлы — перекрестки (концы дорог, где сходится
+# не две дороги), ребро — цепочка дорог между перекрестками. Промежуточные
+# вершины в граф не входят и хранятся только в общем массиве link_coords
+ARRAY_NAMES = (
+    'node_coords',        # (N, 2) координаты узлов графа (lon, lat)
+    'indptr',             # (N + 1,) CSR: начало списка смежности узла
+    'indices',            # (E,) CSR: соседний узел
+    'edge_weight',        # (E,) CSR: длина ребра, м
+    'edge_id',            # (E,) CSR: индекс цепочки дорог, которой соответствует ребро
+    'edge_nodes',         # (C, 2) узлы в начале и в конце цепочки
+    'edge_length_m',      # (C,) длина цепочки, м
+    'edge_link_offsets',  # (C + 1,) начало дорог цепочки i в edge_links
+    'edge_links',         # (L,) дороги цепочек в порядке следования
+    'link_coords',        # (V, 2) общий массив вершин всех дорог (lon, lat)
+    'link_offsets',       # (L + 1,) начало вершин дороги i в link_coords
+    'link_no',            # (L,) номер дороги NO из шейп-файла
+    'link_length_m',      # (L,) длина дороги, м
+    'link_edge',          # (L,) цепочка, в которую входит дорога
+    'link_edge_start_m',  # (L,) расстояние от начала цепочки до начала дороги в ней, м
+    'link_reversed',      # (L,) дорога проходится в цепочке от конца к началу
+)
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    """Векторизованное расстояние по большому кругу в метрах"""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+_TO_METRIC = Transformer.from_crs('EPSG:4326', METRIC_CRS, always_xy=True)
+
+
+def to_metric(lon, lat):
+    """Перевод координат (lon, lat) в метры проекции METRIC_CRS"""
+    return _TO_METRIC.transform(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+
+
+_FROM_METRIC = Transformer.from_crs(METRIC_CRS, 'EPSG:4326', always_xy=True)
+
+
+def from_metric(x, y):
+    """Перевод метров проекции METRIC_CRS в координаты (lon, lat)"""
+    return _FROM_METRIC.transform(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+
+
+def shapefile_hash(shp_path):
+    """SHA-256 содержимого шейп-файла и его сопутствующих файлов (.SHX, .DBF, ...)"""
+    base, _ = os.path.splitext(shp_path)
+    digest = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+    for ext in SHAPEFILE_PARTS:
+        for path in (base + ext, base + ext.lower()):
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+                break
+    return digest.hexdigest()
+
+
+class RoadNetwork:
+    """
+    Предобработанная дорожная сеть: граф перекрестков в виде CSR-массивов,
+    цепочки дорог, соответствующие ребрам, геометрии дорог (общий массив вершин
+    + смещения) и пространственные индексы
+    """
+
+    def __init__(self, arrays, cache_dir=None, kdtree=None, content_hash=None):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.cache_dir = cache_dir
+        self.content_hash = content_hash
+        self._kdtree = kdtree
+        self._road_geoms = None
+        self._road_tree = None
+        self._roads = None
+        self._metric_geoms = None
+        self._metric_tree = None
+        self._csgraph = None
+
+    @property
+    def n_nodes(self):
+        return len(self.node_coords)
+
+    @property
+    def n_links(self):
+        return len(self.link_no)
+
+    @property
+    def road_geoms(self):
+        """Массив LineString дорог (EPSG:4326), собирается из общего массива вершин"""
+        if self._road_geoms is None:
+            counts = np.diff(self.link_offsets)
+            self._road_geoms = shapely.linestrings(
+                np.asarray(self.link_coords),
+                indices=np.repeat(np.arange(self.n_links), counts),
+            )
+        return self._road_geoms
+
+    @property
+    def road_tree(self):
+        """STR-дерево по геометриям дорог"""
+        if self._road_tree is None:
+            self._road_tree = STRtree(self.road_geoms)
+        return self._road_tree
+
+    @property
+    def metric_geoms(self):
+        """Геометрии дорог в метрической проекции METRIC_CRS"""
+        if self._metric_geoms is None:
+            x, y = to_metric(self.link_coords[:, 0], self.link_coords[:, 1])
+            counts = np.diff(self.link_offsets)
+            self._metric_geoms = shapely.linestrings(
+                np.column_stack([x, y]),
+                indices=np.repeat(np.arange(self.n_links), counts),
+            )
+        return self._metric_geoms
+
+    @property
+    def metric_tree(self):
+        """STR-дерево по метрическим геометриям дорог (поиск в радиусе, м)"""
+        if self._metric_tree is None:
+            self._metric_tree = STRtree(self.metric_geoms)
+        return self._metric_tree
+
+    @property
+    def csgraph(self):
+        """Разреженная матрица смежности для scipy.sparse.csgraph (веса в метрах)"""
+        if self._csgraph is None:
+            self._csgraph = scipy.sparse.csr_matrix(
+                (np.asarray(self.edge_weight), np.asarray(self.indices), np.asarray(self.indptr)),
+                shape=(self.n_nodes, self.n_nodes),
+            )
+        return self._csgraph
+
+    @property
+    def kdtree(self):
+        """KD-дерево по координатам узлов графа (lon, lat)"""
+        if self._kdtree is None:
+            self._kdtree = scipy.spatial.KDTree(np.asarray(self.node_coords))
+        return self._kdtree
+
+    @property
+    def roads(self):
+        """GeoDataFrame дорог со всеми атрибутами (для отображения на карте)"""
+        if self._roads is None:
+            self._roads = gpd.read_parquet(os.path.join(self.cache_dir, 'roads.parquet'))
+        return self._roads
+
+    def node_key(self, node):
+        """Ключ узла в терминах прежнего NetworkX-графа: кортеж (lon, lat)"""
+        lon, lat = self.node_coords[node]
+        return float(lon), float(lat)
+
+    def nearest_node(self, lat, lon):
+        """Индекс ближайшего к точке узла графа"""
+        _, idx = self.kdtree.query((lon, lat))
+        return int(idx)
+
+    def link_geometry(self, link):
+        """Координаты вершин дороги (lon, lat) — срез общего массива без копирования"""
+        return self.link_coords[self.link_offsets[link]:self.link_offsets[link + 1]]
+
+    def _edge_index(self, u, v):
+        """Позиция ребра u -> v в CSR-массивах"""
+        start, end = self.indptr[u], self.indptr[u + 1]
+        return start + int(np.flatnonzero(np.asarray(self.indices[start:end]) == v)[0])
+
+    def _path_edges(self, node_path):
+        """Цепочки дорог вдоль пути и направление их прохождения (True — от конца к началу)"""
+        edges = []
+        for u, v in zip(node_path[:-1], node_path[1:]):
+            edge = int(self.edge_id[self._edge_index(u, v)])
+            edges.append((edge, int(self.edge_nodes[edge, 0]) != int(u)))
+        return edges
+
+    def edge_link_sequence(self, edge, reverse=False):
+        """Дороги цепочки и признак их прохождения от конца к началу"""
+        links = np.asarray(self.edge_links[self.edge_link_offsets[edge]:self.edge_link_offsets[edge + 1]])
+        flipped = np.asarray(self.link_reversed)[links]
+        if reverse:
+            return links[::-1], ~flipped[::-1]
+        return links, flipped
+
+    def edge_coords(self, edge, reverse=False):
+        """Координаты (lon, lat) цепочки дорог — собираются из общего массива вершин"""
+        pieces = []
+        for link, flipped in zip(*self.edge_link_sequence(edge, reverse)):
+            coords = self.link_geometry(link)
+            if flipped:
+                coords = coords[::-1]
+            pieces.append(coords if not pieces else coords[1:])
+        return np.concatenate(pieces)
+
+    def path_coords(self, node_path):
+        """Координаты (lon, lat) вдоль пути, заданного последовательностью узлов, со всеми вершинами дорог"""
+        if len(node_path) < 2:
+            return np.asarray(self.node_coords)[np.asarray(node_path, dtype=np.int64)]
+        pieces = []
+        for edge, reverse in self._path_edges(node_path):
+            coords = self.edge_coords(edge, reverse)
+            pieces.append(coords if not pieces else coords[1:])
+        return np.concatenate(pieces)
+
+    def path_lengths(self, node_path):
+        """Длины ребер пути, м"""
+        return [float(self.edge_weight[self._edge_index(u, v)])
+                for u, v in zip(node_path[:-1], node_path[1:])]
+
+    def path_links(self, node_path):
+        """Последовательность дорог (индексы link), по которым проходит путь"""
+        links = []
+        for edge, reverse in self._path_edges(node_path):
+            for link in self.edge_link_sequence(edge, reverse)[0].tolist():
+                if not links or links[-1] != link:
+                    links.append(link)
+        return links
+
+    def to_networkx(self):
+        """Неориентированный NetworkX-граф с узлами (lon, lat) и весом в метрах"""
+        sources = np.repeat(np.arange(self.n_nodes), np.diff(self.indptr))
+        keys = [tuple(c) for c in np.asarray(self.node_coords).tolist()]
+        G = nx.Graph()
+        G.add_nodes_from(keys)
+        G.add_weighted_edges_from(
+            (keys[u], keys[v], w)
+            for u, v, w in zip(sources.tolist(), np.asarray(self.indices).tolist(),
+                               np.asarray(self.edge_weight).tolist())
+            if u < v
+        )
+        return G
+
+
+def _walk_chains(link_from, link_to, junction):
+    """
+    Разбивает дороги на цепочки между перекрестками
+
+    Параметры:
+        link_from (list): Точка-начало каждой дороги
+        link_to (list): Точка-конец каждой дороги
+        junction (ndarray): Признак перекрестка для каждой точки; дополняется
+            опорными точками замкнутых колец без перекрестков
+
+    Возвращает:
+        list: (начальная точка, конечная точка, дороги, признаки прохождения от конца к началу)
+    """
+    incident = [[] for _ in range(len(junction))]
+    for link, (a, b) in enumerate(zip(link_from, link_to)):
+        incident[a].append(link)
+        incident[b].append(link)
+    visited = [False] * len(link_from)
+
+    def walk(start, link):
+        point, links, flipped = start, [], []
+        while True:
+            forward = link_from[link] == point
+            visited[link] = True
+            links.append(link)
+            flipped.append(not forward)
+            point = link_to[link] if forward else link_from[link]
+            if junction[point]:
+                return start, point, links, flipped
+            # Промежуточная точка: ровно две дороги, идем по второй
+            a, b = incident[point]
+            link = b if a == link else a
+            if visited[link]:
+                junction[point] = True
+                return start, point, links, flipped
+
+    chains = []
+    for point in np.flatnonzero(junction).tolist():
+        for link in incident[point]:
+            if not visited[link]:
+                chains.append(walk(point, link))
+    # Оставшиеся дороги образуют кольца без перекрестков: начало кольца становится узлом
+    for link in range(len(link_from)):
+        if not visited[link]:
+            junction[link_from[link]] = True
+            chains.append(walk(link_from[link], link))
+    return chains
+
+
+def _build_arrays(roads):
+    """
+    Строит компактный граф дорожной сети: узлы — перекрестки, ребра — цепочки дорог
+    между ними (дороги, сходящиеся по две в промежуточных точках, сжимаются в одно ребро)
+    """
+    n_links = len(roads)
+    coords, vertex_link = shapely.get_coordinates(roads.geometry.values, return_index=True)
+    link_offsets = np.concatenate([[0], np.cumsum(np.bincount(vertex_link, minlength=n_links))])
+    same_link = vertex_link[:-1] == vertex_link[1:]
+    segment = haversine_m(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    link_length_m = np.bincount(vertex_link[:-1][same_link], weights=segment[same_link], minlength=n_links)
+
+    # Концы дорог с одинаковыми координатами — одна точка; степень точки — число концов дорог в ней
+    ends = np.concatenate([coords[link_offsets[:-1]], coords[link_offsets[1:] - 1]])
+    point_coords, end_point = np.unique(ends, axis=0, return_inverse=True)
+    end_point = end_point.ravel()
+    junction = np.bincount(end_point, minlength=len(point_coords)) != 2
+    chains = _walk_chains(end_point[:n_links].tolist(), end_point[n_links:].tolist(), junction)
+
+    # Узлы графа — перекрестки и опорные точки колец
+    point_node = np.full(len(point_coords), -1, dtype=np.int64)
+    point_node[junction] = np.arange(int(junction.sum()))
+    node_coords = point_coords[junction]
+
+    edge_nodes = point_node[np.array([[start, end] for start, end, _, _ in chains], dtype=np.int64).reshape(-1, 2)]
+    counts = np.array([len(links) for _, _, links, _ in chains], dtype=np.int64)
+    edge_links = np.array([link for _, _, links, _ in chains for link in links], dtype=np.int64)
+    flipped = np.array([flag for _, _, _, flags in chains for flag in flags], dtype=bool)
+    edge_link_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    chain = np.repeat(np.arange(len(chains)), counts)
+    lengths = link_length_m[edge_links]
+    passed = np.cumsum(lengths) - lengths
+    edge_length_m = np.bincount(chain, weights=lengths, minlength=len(chains))
+    link_edge = np.empty(n_links, dtype=np.int64)
+    link_edge_start_m = np.empty(n_links)
+    link_reversed = np.empty(n_links, dtype=bool)
+    link_edge[edge_links] = chain
+    link_edge_start_m[edge_links] = passed - passed[edge_link_offsets[:-1]][chain]
+    link_reversed[edge_links] = flipped
+
+    # Неориентированный граф: каждое ребро в обе стороны; из параллельных цепочек
+    # между одной парой узлов остается кратчайшая, петли отбрасываются
+    keep = edge_nodes[:, 0] != edge_nodes[:, 1]
+    u, v = edge_nodes[keep, 0], edge_nodes[keep, 1]
+    edge, weight = np.flatnonzero(keep), edge_length_m[keep]
+    src = np.concatenate([u, v])
+    dst = np.concatenate([v, u])
+    edge = np.concatenate([edge, edge])
+    weight = np.concatenate([weight, weight])
+    order = np.lexsort((weight, dst, src))
+    src, dst, edge, weight = src[order], dst[order], edge[order], weight[order]
+    first = np.ones(len(src), dtype=bool)
+    first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+    src, dst, edge, weight = src[first], dst[first], edge[first], weight[first]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=len(node_coords)))])
+
+    if 'NO' in roads.columns:
+        link_no = roads['NO'].to_numpy(dtype=np.int64)
+    else:
+        link_no = np.arange(n_links, dtype=np.int64)
+
+    return {
+        'node_coords': node_coords,
+        'indptr': indptr.astype(np.int64),
+        'indices': dst.astype(np.int64),
+        'edge_weight': weight,
+        'edge_id': edge.astype(np.int64),
+        'edge_nodes': edge_nodes,
+        'edge_length_m': edge_length_m,
+        'edge_link_offsets': edge_link_offsets.astype(np.int64),
+        'edge_links': edge_links,
+        'link_coords': coords,
+        'link_offsets': link_offsets.astype(np.int64),
+        'link_no': link_no,
+        'link_length_m': link_length_m,
+        'link_edge': link_edge,
+        'link_edge_start_m': link_edge_start_m,
+        'link_reversed': link_reversed,
+    }
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_road_network(shp_path, cache_dir):
+    """
+    Загружает шейп-файл, строит граф и индексы и сохраняет их в кэш
+
+    Параметры:
+        shp_path (str): Путь к шейп-файлу дорожной сети
+        cache_dir (str): Каталог кэша
+
+    Возвращает:
+        RoadNetwork: Дорожная сеть
+    """
+    content_hash = shapefile_hash(shp_path)
+    roads = gpd.read_file(shp_path).to_crs(epsg=4326)
+    roads = roads[roads.geometry.geom_type == 'LineString'].reset_index(drop=True)
+    arrays = _build_arrays(roads)
+    kdtree = scipy.spatial.KDTree(arrays['node_coords'])
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # meta.json пишется последним: незавершенная запись не будет принята за валидный кэш
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(cache_dir, f'{name}.npy'), arrays[name])
+    with open(os.path.join(cache_dir, 'kdtree.pkl'), 'wb') as f:
+        pickle.dump(kdtree, f, protocol=pickle.HIGHEST_PROTOCOL)
+    roads.to_parquet(os.path.join(cache_dir, 'roads.parquet'))
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': CACHE_VERSION,
+            'shapefile': os.path.basename(shp_path),
+            'hash': content_hash,
+            'n_nodes': len(arrays['node_coords']),
+            'n_edges': len(arrays['indices']) // 2,
+            'n_chains': len(arrays['edge_nodes']),
+            'n_links': len(roads),
+        }, f, ensure_ascii=False, indent=2)
+
+    network = RoadNetwork(arrays, cache_dir=cache_dir, kdtree=kdtree, content_hash=content_hash)
+    network._roads = roads
+    return network
+
+
+def load_road_network(shp_path, cache_dir=None, rebuild=False):
+    """
+    Возвращает дорожную сеть из кэша (массивы отображаются в память без копирования)
+    или строит ее заново, если кэша нет или шейп-файл изменился
+
+    Параметры:
+        shp_path (str): Путь к шейп-файлу дорожной сети
+        cache_dir (str/None): Каталог кэша (по умолчанию рядом с шейп-файлом)
+        rebuild (bool): Принудительно перестроить кэш
+
+    Возвращает:
+        RoadNetwork: Дорожная сеть
+    """
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(shp_path)), CACHE_DIR_NAME)
+    meta = _read_meta(cache_dir)
+    content_hash = shapefile_hash(shp_path)
+    if (rebuild or meta is None or meta.get('version') != CACHE_VERSION
+            or meta.get('hash') != content_hash):
+        print("Построение кэша дорожной сети...")
+        return build_road_network(shp_path, cache_dir)
+
+    arrays = {
+        name: np.load(os.path.join(cache_dir, f'{name}.npy'), mmap_mode='r')
+        for name in ARRAY_NAMES
+    }
+    with open(os.path.join(cache_dir, 'kdtree.pkl'), 'rb') as f:
+        kdtree = pickle.load(f)
+    return RoadNetwork(arrays, cache_dir=cache_dir, kdtree=kdtree, content_hash=content_hash)
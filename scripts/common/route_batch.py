@@ -0,0 +1,132 @@
+import argparse
+import json
+import sys
+
+import avl_store
+from road_network import load_road_network
+from route_cache import load_route_cache
+from routing import Router
+
+CSV_PATH = '../../sources/geotracks_transports/december.csv'
+ROUTES_JSON = '../../sources/other/routes.json'
+ROADS_SHP_PATH = '../../sources/UDS/Граф Иркутск_link.SHP'
+VEHICLE_TYPES = ('bus', 'minibus', 'tramway', 'trolleybus')
+
+# Состояние процесса-исполнителя: дорожная сеть, кэш маршрутов и CH загружаются один раз
+worker = {}
+
+
+def load_route_list(routes_json=ROUTES_JSON, vehicle_types=VEHICLE_TYPES):
+    """
+    Пары (тип транспорта, маршрут) из routes.json
+
+    Параметры:
+        routes_json (str): Путь к routes.json ({тип транспорта: [маршруты]})
+        vehicle_types (tuple): Нужные типы транспорта
+
+    Возвращает:
+        list: Пары (тип транспорта, маршрут), маршрут — строка
+    """
+    with open(routes_json, 'r', encoding='utf-8') as f:
+        routes = json.load(f)
+    return [
+        (vehicle_type, str(route))
+        for vehicle_type, route_list in routes.items() if vehicle_type in vehicle_types
+        for route in route_list
+    ]
+
+
+def parse_route_specs(specs):
+    """
+    Маршруты из аргументов командной строки вида <тип>:<маршрут> (например, bus:10)
+
+    Возвращает:
+        list: Пары (тип транспорта, маршрут)
+    """
+    routes = []
+    for spec in specs:
+        vehicle_type, sep, route = spec.partition(':')
+        if not sep or vehicle_type not in VEHICLE_TYPES or not route:
+            raise argparse.ArgumentTypeError(
+                f"Неверный маршрут '{spec}': ожидается <тип>:<маршрут>, тип — один из {', '.join(VEHICLE_TYPES)}"
+            )
+        routes.append((vehicle_type, route))
+    return routes
+
+
+def select_routes(specs, vehicle_types=VEHICLE_TYPES):
+    """
+    Маршруты из аргументов командной строки: all — все из routes.json нужных типов,
+    иначе — parse_route_specs; при неверном маршруте скрипт завершается с кодом 2
+
+    Возвращает:
+        list: Пары (тип транспорта, маршрут)
+    """
+    if list(specs) == ['all']:
+        return load_route_list(ROUTES_JSON, vehicle_types)
+    try:
+        return parse_route_specs(specs)
+    except argparse.ArgumentTypeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+
+
+def ensure_store(csv_file):
+    """
+    Каталог колоночного хранилища месячного CSV; строится, если его еще нет
+
+    Через хранилище каждый процесс читает только секцию своего маршрута, а не весь CSV
+
+    Возвращает:
+        str: Каталог хранилища
+    """
+    store_dir = avl_store.default_store_path(csv_file)
+    if not avl_store.store_exists(store_dir):
+        print("Колоночное хранилище не найдено, строим его из CSV...")
+        avl_store.build_store(csv_file, store_dir)
+    return store_dir
+
+
+def prepare_routing(roads_shp=ROADS_SHP_PATH):
+    """
+    Дорожная сеть для основного процесса перед запуском пула
+
+    Кэши дорожной сети и CH строятся здесь один раз, а не в каждом процессе одновременно
+
+    Возвращает:
+        RoadNetwork: Дорожная сеть
+    """
+    road_net = load_road_network(roads_shp)
+    Router(road_net, mode='ch')
+    return road_net
+
+
+def init_worker(roads_shp=ROADS_SHP_PATH, extra=None):
+    """
+    Инициализатор процесса-исполнителя (initializer у ProcessPoolExecutor): дорожная
+    сеть, кэш маршрутов и CH загружаются в worker один раз на процесс
+
+    Параметры:
+        roads_shp (str/None): Шейп-файл дорожной сети; None — без дорожной сети
+        extra (dict/None): Дополнительные значения состояния (например, tile_server)
+    """
+    worker.update(extra or {})
+    if roads_shp is None:
+        return
+    road_net = load_road_network(roads_shp)
+    worker.update(
+        road_net=road_net,
+        route_cache=load_route_cache(road_net),
+        router=Router(road_net, mode='ch'),
+    )
+
+
+def take_cache_entries():
+    """
+    Новые записи кэша маршрутов процесса-исполнителя: их сливает и сохраняет
+    основной процесс, иначе параллельные сохранения затирают записи друг друга
+
+    Возвращает:
+        list: Записи RouteCache.take_new_entries (пустой, если дорожная сеть не загружена)
+    """
+    return worker['route_cache'].take_new_entries() if 'route_cache' in worker else []
@@ -0,0 +1,163 @@
+import os
+import pickle
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAXSIZE = 1_000_000  # пар узлов в памяти
+ROUTE_CACHE_FILE = 'route_cache.pkl'
+
+
+class RouteCache:
+    """
+    LRU-кэш маршрутов между узлами графа с ключом (start_node, end_node)
+
+    Хранит расстояние по сети, путь (если уже восстанавливался) и лимит поиска,
+    с которым было получено бесконечное расстояние. Счетчики hits/misses считают
+    запросы маршрутизации, которые удалось (или не удалось) закрыть из кэша.
+    Процессы-исполнители не сохраняют кэш сами: новые записи (take_new_entries)
+    передаются основному процессу, который сливает их (merge) и сохраняет кэш один раз
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, network_hash=None, path=None):
+        self.maxsize = maxsize
+        self.network_hash = network_hash
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (u, v) -> [distance, path, limit]
+        self._new = set()              # ключи, добавленные или измененные после take_new_entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key, distance, path=None, limit=np.inf):
+        self._new.add(key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if np.isfinite(distance) or limit > entry[2]:
+                entry[0], entry[2] = distance, limit
+            if path is not None:
+                entry[1] = path
+            return
+        self._entries[key] = [distance, path, limit]
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def lookup_distances(self, sources, targets, limit):
+        """
+        Матрица расстояний sources x targets, если все пары есть в кэше, иначе None
+
+        Бесконечное расстояние принимается, только если оно было получено
+        с лимитом поиска не меньше текущего
+        """
+        dist = np.empty((len(sources), len(targets)))
+        for i, u in enumerate(sources):
+            for j, v in enumerate(targets):
+                entry = self._get((int(u), int(v)))
+                if entry is None or (not np.isfinite(entry[0]) and entry[2] < limit):
+                    self.misses += 1
+                    return None
+                dist[i, j] = entry[0]
+        self.hits += 1
+        return dist
+
+    def store_distances(self, sources, targets, dist, limit):
+        """Сохраняет матрицу расстояний, полученную поиском с лимитом limit"""
+        for i, u in enumerate(sources):
+            for j, v in enumerate(targets):
+                self._put((int(u), int(v)), float(dist[i, j]), limit=limit)
+
+    def lookup_path(self, source, target):
+        """Путь (список узлов) между узлами или None, если его нет в кэше"""
+        entry = self._get((int(source), int(target)))
+        if entry is None or entry[1] is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def store_path(self, source, target, path, distance):
+        self._put((int(source), int(target)), float(distance), path=list(path))
+
+    def take_new_entries(self):
+        """
+        Записи, добавленные или измененные после загрузки или прошлого вызова
+
+        Возвращает:
+            list: Пары (ключ, [расстояние, путь, лимит]) для merge в основном процессе
+        """
+        entries = [(key, self._entries[key]) for key in self._new if key in self._entries]
+        self._new.clear()
+        return entries
+
+    def merge(self, entries):
+        """Добавляет записи другого кэша (take_new_entries процесса-исполнителя)"""
+        for (u, v), (distance, path, limit) in entries:
+            self._put((u, v), distance, path=path, limit=limit)
+
+    def stats(self):
+        """Счетчики попаданий/промахов и размер кэша"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._entries),
+        }
+
+    def save(self, path=None):
+        """Сохраняет кэш на диск для следующих запусков"""
+        path = path or self.path
+        # Запись во временный файл и замена: параллельные процессы не читают недописанный кэш
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({
+                'network_hash': self.network_hash,
+                'entries': list(self._entries.items()),
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, network_hash=None, maxsize=DEFAULT_MAXSIZE):
+        """
+        Загружает кэш с диска; если файла нет или он построен для другой
+        дорожной сети, возвращает пустой кэш
+
+        Параметры:
+            path (str): Путь к файлу кэша
+            network_hash (str/None): Хэш дорожной сети (RoadNetwork.content_hash)
+            maxsize (int): Максимальное число пар узлов в кэше
+
+        Возвращает:
+            RouteCache: Кэш маршрутов
+        """
+        cache = cls(maxsize=maxsize, network_hash=network_hash, path=path)
+        if not os.path.exists(path):
+            return cache
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return cache
+        if data.get('network_hash') != network_hash:
+            return cache
+        for key, entry in data['entries'][-maxsize:]:
+            cache._entries[key] = entry
+        return cache
+
+
+def load_route_cache(road_net, maxsize=DEFAULT_MAXSIZE):
+    """Кэш маршрутов, сохраненный рядом с кэшем дорожной сети"""
+    return RouteCache.load(
+        os.path.join(road_net.cache_dir, ROUTE_CACHE_FILE),
+        network_hash=road_net.content_hash,
+        maxsize=maxsize,
+    )
@@ -0,0 +1,611 @@
+import json
+import os
+import time
+from collections import defaultdict
+
+import folium
+import numpy as np
+import pandas as pd
+from shapely.geometry import LineString, mapping
+
+from avl_store import SOURCE_TIMEZONE, local_time
+from gtfs_export import write_route_gtfs
+from map_layers import LineLayer, PointLayer, TiledGeoJson
+from map_matching import match_track
+from snapping import snap_points
+from speed_cube import TIMEZONE, day_type_index
+from stop_detection import MIN_UUIDS, STOP_SPEED_THRESHOLD, aggregate_stops, detect_stops, potential_terminals
+from tile_store import server_layers
+from track_stats import geodesic_m
+
+MAP_FILE = 'transport_tracks_with_stops.html'
+GTFS_FILE = 'transport_gtfs.zip'
+STOPS_FILE = 'stops.csv'
+SEGMENTS_FILE = 'segments_yellow_red_on_roads.geojson'
+REQUIRED_COLUMNS = ['lat', 'lon', 'speed', 'signal_time']
+MAX_SEGMENT_DISTANCE_M = 500  # м: макс. «пробег» между соседними точками для сегментов скорости
+IQR_MULTIPLIER = 1.5          # для IQR-фильтра выбросов по скорости
+
+
+def _quiet(*args, **kwargs):
+    pass
+
+
+def prepare_track(df):
+    """
+    Очистка и сортировка точек маршрута
+
+    Параметры:
+        df (DataFrame): Точки маршрута (lat, lon, speed, signal_time, uuid)
+
+    Возвращает:
+        DataFrame: Точки без пропусков, signal_time — datetime, по возрастанию времени
+    """
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"В данных нет столбцов: {', '.join(missing)}")
+    df = df.dropna(subset=REQUIRED_COLUMNS)
+    if len(df) and isinstance(df['signal_time'].iloc[0], str):
+        df = df.assign(signal_time=pd.to_datetime(df['signal_time']))
+    return df.sort_values('signal_time')
+
+
+def snap_track(road_net, df):
+    """
+    Привязка точек к сети дорог одним векторизованным проходом
+
+    Координаты lat, lon заменяются привязанными, исходные GPS-координаты
+    сохраняются в gps_lat, gps_lon (нужны для map matching треков по uuid)
+    """
+    df = df.copy()
+    df['gps_lat'] = df['lat']
+    df['gps_lon'] = df['lon']
+    snapped = snap_points(road_net, df['lat'].to_numpy(), df['lon'].to_numpy())
+    df['lat'] = snapped['lat'].to_numpy()
+    df['lon'] = snapped['lon'].to_numpy()
+    df['link_id'] = snapped['link_id'].to_numpy()
+    return df
+
+
+def find_route_stops(df, log=print):
+    """
+    Остановки маршрута: стоянки, их объединение и признаки начальной/конечных остановок
+
+    Параметры:
+        df (DataFrame): Точки маршрута (prepare_track)
+        log (callable): Функция вывода сообщений о ходе работы
+
+    Возвращает:
+        DataFrame: Остановки (stop_id, stop_name, lat, lon, signal_time, duration,
+            point_count, is_first, is_last, is_terminal при объединении)
+    """
+    # Точки стоянок кластеризуются в метрической проекции (пороги в метрах)
+    stops, potential_stops = detect_stops(df)
+    if len(potential_stops) == 0:
+        log("Не найдено точек с достаточной продолжительностью остановки")
+        return stops
+    log(f"Найдено {len(stops)} остановок перед агрегацией")
+    if len(stops) < 2:
+        return stops
+
+    # Второй уровень кластеризации: объединяем близкие остановки
+    log("Выполняем дополнительную агрегацию остановок...")
+    stops, stop_labels = aggregate_stops(stops)
+
+    # Конечные: стоянка намного дольше медианы и достаточно точек
+    stops['is_potential_terminal'] = potential_terminals(stops)
+    stops['is_terminal'] = stops['is_potential_terminal']
+    stops.loc[stops['is_first'] | stops['is_last'], 'is_terminal'] = True
+
+    stops['stop_id'] = 'stop_' + stops.index.astype(str)
+    stops['stop_name'] = 'Остановка ' + stops.index.astype(str)
+    stops.loc[stops['is_first'], 'stop_name'] = 'Начальная остановка'
+    stops.loc[stops['is_last'], 'stop_name'] = 'Конечная остановка'
+
+    # Число разных ТС (uuid) на остановке: точки привязываются к объединенной
+    # остановке через номер исходной
+    if 'uuid' in potential_stops.columns:
+        stop_cluster = stop_labels[potential_stops['cluster_id'].to_numpy()]
+        unique_uuids = potential_stops.groupby(stop_cluster)['uuid'].nunique()
+        stops['unique_uuids'] = stops['stop_cluster'].map(unique_uuids)
+        stops['is_potential_terminal'] &= stops['unique_uuids'] >= MIN_UUIDS
+
+    log(f"После агрегации осталось {len(stops)} остановок")
+    return stops
+
+
+def match_uuid_tracks(road_net, df, route_cache=None, router=None):
+    """
+    Привязка трека каждого ТС (uuid) к сети за один проход (HMM + Витерби)
+
+    Возвращает:
+        list: Словари {uuid, points, paths, missing_paths} — points: точки трека
+            по времени, paths: пути по дорогам к каждой точке (None — пути нет)
+    """
+    tracks = []
+    for uid, sub_df in df.groupby('uuid', sort=False):
+        sub_df = sub_df.sort_values('signal_time')
+        lat_column, lon_column = ('gps_lat', 'gps_lon') if 'gps_lat' in sub_df.columns else ('lat', 'lon')
+        match = match_track(road_net, sub_df[lat_column].to_numpy(), sub_df[lon_column].to_numpy(),
+                            route_cache=route_cache, router=router)
+        found = sum(path is not None for path in match['paths'][1:])
+        tracks.append({
+            'uuid': uid,
+            'points': sub_df,
+            'paths': match['paths'],
+            'missing_paths': int(len(sub_df) - 1 - found),
+        })
+    return tracks
+
+
+def speed_color_kmh(speed_kmh, avg_speed_kmh, mid_speed_kmh):
+    """Цвет участка по скорости: green ≥ средней, yellow ≥ половины средней, иначе red"""
+    if speed_kmh >= avg_speed_kmh:
+        return 'green'
+    elif speed_kmh >= mid_speed_kmh:
+        return 'yellow'
+    return 'red'
+
+
+def speed_colors_kmh(speed_kmh, avg_speed_kmh, mid_speed_kmh):
+    """Цвета участков для массива скоростей (векторный вариант speed_color_kmh)"""
+    speed_kmh = np.asarray(speed_kmh, dtype=np.float64)
+    return np.select([speed_kmh >= avg_speed_kmh, speed_kmh >= mid_speed_kmh], ['green', 'yellow'], 'red')
+
+
+def low_speed_pairs(points, avg_speed_kmh, mid_speed_kmh, max_distance_m=MAX_SEGMENT_DISTANCE_M,
+                    lat_column='lat', lon_column='lon', by=None):
+    """
+    Пары соседних точек, участки между которыми идут в GeoJSON: прямой разрыв
+    не больше max_distance_m и скорость в конечной точке ниже средней (желтые и красные)
+
+    Расстояния, цвета и фильтры считаются масками по всем точкам сразу, до поиска путей
+
+    Параметры:
+        points (DataFrame): Точки по времени (внутри каждого ТС, если задан by), speed в м/с
+        avg_speed_kmh, mid_speed_kmh (float): Пороги раскраски, км/ч
+        max_distance_m (float): Наибольший прямой разрыв между точками пары, м
+        lat_column, lon_column (str): Столбцы исходных координат точек
+        by (str/None): Столбец ТС: пары не переходят границу между треками разных ТС
+
+    Возвращает:
+        tuple: (маска конечных точек пар — np.ndarray bool, цвета участков по конечным точкам)
+    """
+    colors = speed_colors_kmh(points['speed'].to_numpy(dtype=np.float64) * 3.6, avg_speed_kmh, mid_speed_kmh)
+    return pair_mask(points, max_distance_m, lat_column, lon_column, by) & (colors != 'green'), colors
+
+
+def pair_mask(points, max_distance_m=MAX_SEGMENT_DISTANCE_M, lat_column='lat', lon_column='lon', by=None):
+    """
+    Конечные точки пар соседних точек с прямым разрывом не больше max_distance_m
+
+    Параметры:
+        points (DataFrame): Точки по времени (внутри каждого ТС, если задан by)
+        max_distance_m (float): Наибольший прямой разрыв между точками пары, м
+        lat_column, lon_column (str): Столбцы исходных координат точек
+        by (str/None): Столбец ТС: пары не переходят границу между треками разных ТС
+
+    Возвращает:
+        np.ndarray: Маска bool по точкам (False — первая точка трека или большой разрыв)
+    """
+    lat = points[lat_column].to_numpy(dtype=np.float64)
+    lon = points[lon_column].to_numpy(dtype=np.float64)
+    if by is None:
+        prev_lat = np.concatenate([[np.nan], lat[:-1]])
+        prev_lon = np.concatenate([[np.nan], lon[:-1]])
+    else:
+        shifted = points.groupby(by, sort=False)[[lat_column, lon_column]].shift(1)
+        prev_lat = shifted[lat_column].to_numpy(dtype=np.float64)
+        prev_lon = shifted[lon_column].to_numpy(dtype=np.float64)
+    has_prev = ~np.isnan(prev_lat) & ~np.isnan(prev_lon)
+
+    # прямой разрыв между точками пары (геодезическое расстояние, как у geopy)
+    distance = np.full(len(lat), np.inf)
+    distance[has_prev] = geodesic_m(prev_lon[has_prev], prev_lat[has_prev], lon[has_prev], lat[has_prev])
+    return has_prev & (distance <= max_distance_m)
+
+
+def _pair_features(uid, points, paths, pairs, colors):
+    """GeoJSON-объекты участков пути по дорогам к точкам pairs от предыдущих точек трека"""
+    times = points['signal_time']
+    speeds = points['speed'].to_numpy(dtype=np.float64)
+    features = []
+    for i in pairs.tolist():
+        # путь по дорогам между точками; пропускаем «путь» из одной точки
+        path = paths[i]
+        if path is None or len(path) < 2:
+            continue
+        features.append({
+            "type": "Feature",
+            "properties": {
+                "uuid": uid,
+                "start_time": times.iat[i - 1].isoformat(),
+                "end_time": times.iat[i].isoformat(),
+                "speed_kmh": round(float(speeds[i]) * 3.6, 2),
+                "color": str(colors[i])
+            },
+            "geometry": mapping(LineString([(lon, lat) for lon, lat in path]))
+        })
+    return features
+
+
+def low_speed_features(uid, points, paths, avg_speed_kmh, mid_speed_kmh,
+                       max_distance_m=MAX_SEGMENT_DISTANCE_M, lat_column='lat', lon_column='lon'):
+    """
+    GeoJSON-объекты участков трека по дорогам со скоростью ниже средней (желтые и красные)
+
+    Параметры:
+        uid: Идентификатор ТС
+        points (DataFrame): Точки трека по времени (signal_time, speed в м/с)
+        paths (list): Пути по дорогам к каждой точке (match_track)
+        avg_speed_kmh, mid_speed_kmh (float): Пороги раскраски, км/ч
+        max_distance_m (float): Участки с большим прямым разрывом между точками пропускаются
+        lat_column, lon_column (str): Столбцы исходных координат точек
+
+    Возвращает:
+        list: Объекты GeoJSON (uuid, start_time, end_time, speed_kmh, color)
+    """
+    mask, colors = low_speed_pairs(points, avg_speed_kmh, mid_speed_kmh, max_distance_m, lat_column, lon_column)
+    return _pair_features(uid, points, paths, np.flatnonzero(mask), colors)
+
+
+def filter_speed_outliers(df, multiplier=IQR_MULTIPLIER):
+    """
+    Скорость в км/ч (столбец speed_kmh) и отбрасывание выбросов по IQR
+
+    Возвращает:
+        DataFrame: Точки, скорость которых лежит в [Q1 - k·IQR, Q3 + k·IQR]
+    """
+    df = df.assign(speed_kmh=df['speed'] * 3.6)
+    q1 = df['speed_kmh'].quantile(0.25)
+    q3 = df['speed_kmh'].quantile(0.75)
+    iqr = q3 - q1
+    lower = q1 - multiplier * iqr
+    upper = q3 + multiplier * iqr
+    return df[(df['speed_kmh'] >= lower) & (df['speed_kmh'] <= upper)].reset_index(drop=True)
+
+
+def route_uuid_avg_speeds(df):
+    """
+    Средняя скорость каждого ТС по маршрутам
+
+    Возвращает:
+        dict: {"max_speed_kmh": ..., "routes": {маршрут: {uuid: {"speed": км/ч}}}}
+    """
+    nested_routes = defaultdict(dict)
+    max_speed = 0
+    for (route, uuid), group in df.groupby(['route', 'uuid']):
+        mean_speed = group['speed_kmh'].mean()
+        max_speed = max(max_speed, mean_speed)
+        nested_routes[str(route)][str(uuid)] = {
+            'speed': round(mean_speed, 2)
+        }
+    return {
+        "max_speed_kmh": round(max_speed, 2),
+        "routes": nested_routes
+    }
+
+
+def speed_segments(df, road_net, route_cache=None, router=None, max_distance_m=MAX_SEGMENT_DISTANCE_M):
+    """
+    Желтые и красные участки треков по дорогам (douwload_speed_tracks.py)
+
+    Параметры:
+        df (DataFrame): Точки (filter_speed_outliers), пороги — от их средней скорости
+        road_net (RoadNetwork): Дорожная сеть
+        route_cache (RouteCache/None): Кэш маршрутов между узлами графа
+        router (Router/None): Поиск путей между узлами
+        max_distance_m (float): Участки с большим прямым разрывом между точками пропускаются
+
+    Возвращает:
+        list: Объекты GeoJSON (low_speed_features)
+    """
+    # средняя и «половинчатая» скорости (km/h)
+    avg_speed_kmh = df['speed_kmh'].mean()
+    mid_speed_kmh = avg_speed_kmh / 2
+
+    # пары точек и их цвета — масками по всем ТС сразу; к поиску путей доходят только
+    # желтые и красные участки без большого разрыва
+    df = df.sort_values(['uuid', 'signal_time'], kind='stable').reset_index(drop=True)
+    mask, colors = low_speed_pairs(df, avg_speed_kmh, mid_speed_kmh, max_distance_m, by='uuid')
+
+    features = []
+    for uid, grp in df.groupby('uuid'):
+        keep = mask[grp.index.to_numpy()]
+        if not keep.any():
+            continue  # у ТС нет медленных участков: трек не привязывается
+        # привязка всего трека к дорогам за один проход (HMM + Витерби),
+        # пути по дорогам восстанавливаются только для отобранных пар
+        match = match_track(road_net, grp['lat'].to_numpy(), grp['lon'].to_numpy(),
+                            route_cache=route_cache, router=router, path_mask=keep)
+        features.extend(_pair_features(uid, grp, match['paths'], np.flatnonzero(keep),
+                                       colors[grp.index.to_numpy()]))
+    return features
+
+
+def link_speed_observations(df, road_net, route_cache=None, router=None, max_distance_m=MAX_SEGMENT_DISTANCE_M,
+                            source_timezone=SOURCE_TIMEZONE):
+    """
+    Наблюдения скорости на дорогах по привязанным к сети трекам всех ТС (для speed_cube)
+
+    Участок между соседними точками трека привязывается к дорогам (match_track);
+    каждая дорога его пути получает наблюдение со скоростью в конечной точке
+    участка (как при раскраске участков) и ее часом и типом дня по местному
+    времени (speed_cube.TIMEZONE)
+
+    Параметры:
+        df (DataFrame): Точки (filter_speed_outliers: speed_kmh, signal_time — datetime, uuid)
+        road_net (RoadNetwork): Дорожная сеть
+        route_cache (RouteCache/None): Кэш маршрутов между узлами графа
+        router (Router/None): Поиск путей между узлами
+        max_distance_m (float): Участки с большим прямым разрывом между точками пропускаются
+        source_timezone (str): Часовой пояс signal_time в точках
+
+    Возвращает:
+        dict: Массивы одной длины — link (индекс дороги), hour, day_type, speed_kmh
+    """
+    df = df.sort_values(['uuid', 'signal_time'], kind='stable').reset_index(drop=True)
+    mask = pair_mask(df, max_distance_m, by='uuid')
+    times = local_time(pd.DatetimeIndex(df['signal_time']), source_timezone, TIMEZONE)
+    hour = times.hour.to_numpy()
+    day_type = day_type_index(times)
+    speed_kmh = df['speed_kmh'].to_numpy(dtype=np.float64)
+
+    link_parts, point_parts = [], []
+    for uid, grp in df.groupby('uuid', sort=False):
+        index = grp.index.to_numpy()
+        keep = mask[index]
+        if not keep.any():
+            continue
+        match = match_track(road_net, grp['lat'].to_numpy(), grp['lon'].to_numpy(),
+                            route_cache=route_cache, router=router, path_mask=keep)
+        for i in np.flatnonzero(keep).tolist():
+            links = match['links'][i]
+            if links:
+                link_parts.append(np.asarray(links, dtype=np.int64))
+                point_parts.append(np.full(len(links), index[i]))
+
+    if not link_parts:
+        return {'link': np.empty(0, dtype=np.int64), 'hour': np.empty(0, dtype=np.int64),
+                'day_type': np.empty(0, dtype=np.int64), 'speed_kmh': np.empty(0)}
+    point = np.concatenate(point_parts)
+    return {
+        'link': np.concatenate(link_parts),
+        'hour': hour[point].astype(np.int64),
+        'day_type': day_type[point],
+        'speed_kmh': speed_kmh[point],
+    }
+
+
+def _stop_marker(stop):
+    """Маркер остановки: цвет и иконка по типу остановки"""
+    if stop['is_first']:
+        icon_color, icon_name, stop_type = 'green', 'play', 'Начальная остановка'
+    elif stop['is_last']:
+        icon_color, icon_name, stop_type = 'red', 'stop', 'Финальная по времени'
+    elif stop.get('is_terminal', False):
+        icon_color, icon_name, stop_type = 'darkred', 'flag-checkered', 'Конечная остановка'
+    else:
+        icon_color, icon_name, stop_type = 'blue', 'bus', 'Промежуточная остановка'
+
+    # Время остановки в минутах и секундах
+    stop_time_str = f"{int(stop['duration'] // 60)} мин {int(stop['duration'] % 60)} сек"
+    popup_text = (f"{stop_type}<br>ID: {stop['stop_id']}<br>Название: {stop['stop_name']}"
+                  f"<br>Координаты: {stop['lat']}, {stop['lon']}"
+                  f"<br>Количество точек: {stop['point_count']}<br>Время остановки: {stop_time_str}")
+    if stop_type == 'Конечная остановка' and pd.notna(stop.get('unique_uuids')):
+        popup_text += f"<br>UUID автобусов: {stop['unique_uuids']}"
+    return folium.Marker(
+        location=[stop['lat'], stop['lon']],
+        popup=popup_text,
+        tooltip=f"{stop['stop_name']} ({stop['point_count']} точек, {stop_time_str})",
+        icon=folium.Icon(color=icon_color, icon=icon_name, prefix='fa')
+    )
+
+
+def _speed_legend(avg_speed_kmh, mid_speed_kmh):
+    return f"""
+<div style="position: fixed; bottom: 50px; left: 50px; width: 200px;
+     background-color: white; border:2px solid grey; z-index:9999; padding: 10px; font-size:14px;">
+  <b>Легенда скорости</b><br>
+  <div style="display: flex; align-items: center; margin-top:4px;">
+    <div style="width:16px; height:16px; background:green; margin-right:6px;"></div>
+    ≥ {avg_speed_kmh:.1f} км/ч
+  </div>
+  <div style="display: flex; align-items: center; margin-top:4px;">
+    <div style="width:16px; height:16px; background:orange; margin-right:6px;"></div>
+    {mid_speed_kmh:.1f} – {avg_speed_kmh:.1f} км/ч
+  </div>
+  <div style="display: flex; align-items: center; margin-top:4px;">
+    <div style="width:16px; height:16px; background:red; margin-right:6px;"></div>
+    < {mid_speed_kmh:.1f} км/ч
+  </div>
+</div>
+"""
+
+
+def build_route_map(road_net, df, stops, tracks, avg_speed_kmh, mid_speed_kmh, tile_server=None, log=print):
+    """
+    Карта маршрута: сеть дорог, точки, остановки и треки ТС, раскрашенные по скорости
+
+    Параметры:
+        road_net (RoadNetwork): Дорожная сеть
+        df (DataFrame): Точки маршрута (snap_track)
+        stops (DataFrame): Остановки (find_route_stops)
+        tracks (list): Треки ТС (match_uuid_tracks)
+        avg_speed_kmh, mid_speed_kmh (float): Пороги раскраски, км/ч
+        tile_server (str/None): Адрес сервера тайлов; без него сеть дорог встраивается в HTML
+        log (callable): Функция вывода сообщений о ходе работы
+
+    Возвращает:
+        folium.Map: Карта
+    """
+    # Центр карты — средние исходные GPS-координаты
+    lat_column, lon_column = ('gps_lat', 'gps_lon') if 'gps_lat' in df.columns else ('lat', 'lon')
+    map_tracks = folium.Map(location=[df[lat_column].mean(), df[lon_column].mean()], zoom_start=12, tiles=None)
+    # Отключаемый слой OpenStreetMap
+    folium.TileLayer(
+        tiles='OpenStreetMap',
+        name='OSM карта',
+        control=True,
+        overlay=True,
+        show=True
+    ).add_to(map_tracks)
+
+    # Сеть дорог: при наличии архива тайлов (tiles/build_tiles.py) — тайлы с локального сервера,
+    # иначе только геометрия из общего массива вершин, без атрибутов шейп-файла
+    if tile_server:
+        fg_roads = TiledGeoJson(
+            tile_server,
+            'roads',
+            name="Сеть дорог",
+            show=False,
+            color="blue",
+            popup={'NO': 'Звено', 'length_m': 'Длина, м'},
+            layer_info=server_layers(tile_server).get('roads'),
+            weight=1,
+            opacity=0.5,
+        )
+    else:
+        fg_roads = LineLayer(
+            np.split(np.asarray(road_net.link_coords), np.asarray(road_net.link_offsets)[1:-1]),
+            name="Сеть дорог",
+            show=False,
+            color="blue",
+            weight=1,
+            opacity=0.5,
+        )
+    fg_roads.add_to(map_tracks)
+
+    # Слой точек маршрута: все точки одним массивом, цвет и всплывающие окна — в браузере
+    log("Добавление точек на карту...")
+    point_popup = pd.DataFrame({
+        'Точка #': df.index,
+        'Широта': df['lat'],
+        'Долгота': df['lon'],
+        'Скорость, м/с': df['speed'],
+    })
+    if 'signal_time' in df.columns:
+        point_popup['Время'] = df['signal_time'].astype(str).to_numpy()
+    if 'direction' in df.columns:
+        point_popup['Направление'] = df['direction'].to_numpy()
+    PointLayer(
+        df['lat'], df['lon'],
+        name="Точки маршрута",
+        color=df['speed'], breaks=[STOP_SPEED_THRESHOLD], palette=['orange', 'blue'],  # медленные точки — оранжевые
+        popup=point_popup,
+        tooltip={'Точка #': df.index},
+        precision=6,
+    ).add_to(map_tracks)
+
+    log("Добавление остановок на карту...")
+    stops_layer = folium.FeatureGroup(name="Остановки")
+    for _, stop in stops.iterrows():
+        _stop_marker(stop).add_to(stops_layer)
+    stops_layer.add_to(map_tracks)
+
+    # Треки ТС: участки пути между соседними точками, скорость участка — скорость в его конечной точке
+    log("Добавление маршрутов по uuid...")
+    for track in tracks:
+        found = np.array([path is not None for path in track['paths']])
+        found[0] = False
+        segments = track['points'][found]
+        seg_speed_kmh = segments['speed'].to_numpy() * 3.6
+        LineLayer(
+            [path for path in track['paths'] if path is not None],
+            name=f"Автобус {track['uuid']}",
+            show=False,
+            color=seg_speed_kmh, breaks=[mid_speed_kmh, avg_speed_kmh], palette=['red', 'orange', 'green'],
+            tooltip={
+                'UUID': np.full(len(segments), track['uuid']),
+                'Время': segments['signal_time'].astype(str).to_numpy(),
+                'Скорость, км/ч': np.round(seg_speed_kmh, 1),
+                'Средняя, км/ч': np.full(len(segments), round(avg_speed_kmh, 1)),
+            },
+        ).add_to(map_tracks)
+        if track['missing_paths']:
+            log(f"⚠️ Нет пути между точками для UUID {track['uuid']}: {track['missing_paths']} пар")
+
+    folium.LayerControl(collapsed=False).add_to(map_tracks)
+    map_tracks.get_root().html.add_child(folium.Element(_speed_legend(avg_speed_kmh, mid_speed_kmh)))
+    return map_tracks
+
+
+def run_route(df, road_net, output_dir='.', route_cache=None, router=None, tile_server=None,
+              write_segments=False, verbose=True):
+    """
+    Полная обработка одного маршрута: привязка точек, остановки, треки ТС,
+    карта и GTFS (то же, что transports_with_stops.py)
+
+    Параметры:
+        df (DataFrame): Точки маршрута (lat, lon, speed, signal_time, uuid)
+        road_net (RoadNetwork): Дорожная сеть
+        output_dir (str): Каталог результатов маршрута
+        route_cache (RouteCache/None): Кэш маршрутов между узлами графа
+        router (Router/None): Поиск путей между узлами
+        tile_server (str/None): Адрес сервера тайлов для слоя дорог
+        write_segments (bool): Сохранить также остановки (stops.csv) и участки
+            со скоростью ниже средней (GeoJSON)
+        verbose (bool): Печатать ход работы
+
+    Возвращает:
+        dict: Итоги (points, uuids, stops, segments, seconds) и пути к файлам
+    """
+    log = print if verbose else _quiet
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+
+    df = prepare_track(df)
+    if df.empty:
+        raise ValueError("Нет точек с координатами, скоростью и временем")
+    log(f"Загружено {len(df)} записей с координатами")
+
+    # Средняя и «половинчатая» скорости по всему маршруту
+    avg_speed_kmh = df['speed'].mean() * 3.6
+    mid_speed_kmh = avg_speed_kmh / 2
+
+    log("Определение остановок...")
+    stops = find_route_stops(df, log=log)
+    if len(stops) > 0:
+        log(f"Найдено {len(stops)} остановок")
+
+    log("Снаппим все точки маршрута на сеть дорог…")
+    df = snap_track(road_net, df)
+
+    tracks = match_uuid_tracks(road_net, df, route_cache=route_cache, router=router)
+
+    log("Создание карты...")
+    map_tracks = build_route_map(road_net, df, stops, tracks, avg_speed_kmh, mid_speed_kmh,
+                                 tile_server=tile_server, log=log)
+    map_file = os.path.join(output_dir, MAP_FILE)
+    map_tracks.save(map_file)
+    log(f"Карта сохранена в файл: {map_file}")
+
+    log("Экспорт данных в формат GTFS...")
+    gtfs_zip = os.path.join(output_dir, GTFS_FILE)
+    gtfs_counts = write_route_gtfs(df, gtfs_zip, road_net, route_cache=route_cache, router=router, tracks=tracks)
+    log(f"Данные экспортированы в формат GTFS: {gtfs_zip} "
+        f"(рейсов {gtfs_counts.get('trips.txt', 0)}, остановок {gtfs_counts.get('stops.txt', 0)})")
+
+    result = {
+        'points': len(df),
+        'uuids': len(tracks),
+        'stops': len(stops),
+        'map_file': map_file,
+        'gtfs_file': gtfs_zip,
+    }
+    if write_segments:
+        features = []
+        for track in tracks:
+            features.extend(low_speed_features(track['uuid'], track['points'], track['paths'],
+                                               avg_speed_kmh, mid_speed_kmh,
+                                               lat_column='gps_lat', lon_column='gps_lon'))
+        segments_file = os.path.join(output_dir, SEGMENTS_FILE)
+        with open(segments_file, 'w', encoding='utf-8') as f:
+            json.dump({"type": "FeatureCollection", "features": features}, f, ensure_ascii=False)
+        stops_file = os.path.join(output_dir, STOPS_FILE)
+        stops.to_csv(stops_file, index=False, sep=';')
+        result.update(segments=len(features), segments_file=segments_file, stops_file=stops_file)
+
+    result['seconds'] = round(time.perf_counter() - start, 1)
+    return result
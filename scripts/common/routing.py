@@ -0,0 +1,304 @@
+import heapq
+import math
+import os
+
+import networkx as nx
+import numpy as np
+
+from road_network import EARTH_RADIUS_M
+
+CH_CACHE_FILE = 'ch.npz'
+WITNESS_SETTLED_LIMIT = 60  # узлов на один поиск свидетеля при сжатии (CH)
+
+
+class Router:
+    """
+    Поиск кратчайших путей по графу дорожной сети в виде массивов (узлы — целые индексы)
+
+    Режимы:
+        'ch'    — иерархии сжатия (contraction hierarchies, по умолчанию): однократная
+                  предобработка (кэшируется рядом с дорожной сетью), затем двунаправленный
+                  поиск только «вверх» по иерархии; на графе УДС в десятки раз быстрее
+                  nx.shortest_path (routing_benchmark.py)
+        'astar' — A* с нижней оценкой по расстоянию большого круга без предобработки;
+                  по скорости запроса на уровне nx.shortest_path, нужен как эталон и когда
+                  строить CH не имеет смысла
+    """
+
+    def __init__(self, road_net, mode='ch'):
+        if mode not in ('astar', 'ch'):
+            raise ValueError(f"Неизвестный режим маршрутизации: {mode}")
+        self.road_net = road_net
+        self.mode = mode
+        self._indptr = np.asarray(road_net.indptr).tolist()
+        self._indices = np.asarray(road_net.indices).tolist()
+        self._weights = np.asarray(road_net.edge_weight).tolist()
+        coords = np.radians(np.asarray(road_net.node_coords))
+        self._lon = coords[:, 0].tolist()
+        self._lat = coords[:, 1].tolist()
+        self._cos_lat = np.cos(coords[:, 1]).tolist()
+        if mode == 'ch':
+            self._load_ch()
+
+    # ---------- A* ----------
+
+    def _heuristic(self, node, target):
+        """Расстояние большого круга до цели, м — не превышает длины любого пути"""
+        dlat = self._lat[target] - self._lat[node]
+        dlon = self._lon[target] - self._lon[node]
+        a = (math.sin(dlat / 2) ** 2
+             + self._cos_lat[node] * self._cos_lat[target] * math.sin(dlon / 2) ** 2)
+        return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+    def _astar(self, source, target):
+        indptr, indices, weights = self._indptr, self._indices, self._weights
+        heuristic = self._heuristic
+        dist = {source: 0.0}
+        parent = {source: -1}
+        closed = set()
+        heap = [(heuristic(source, target), 0.0, source)]
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            if u == target:
+                return d, parent
+            closed.add(u)
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                nd = d + weights[k]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd + heuristic(v, target), nd, v))
+        return math.inf, parent
+
+    # ---------- Contraction hierarchies ----------
+
+    def _load_ch(self):
+        path = os.path.join(self.road_net.cache_dir, CH_CACHE_FILE) if self.road_net.cache_dir else None
+        data = None
+        if path and os.path.exists(path):
+            data = np.load(path)
+            if str(data['network_hash']) != str(self.road_net.content_hash):
+                data = None
+        if data is None:
+            print("Предобработка иерархий сжатия (CH)...")
+            data = build_contraction_hierarchy(self.road_net)
+            if path:
+                np.savez(path, network_hash=np.array(str(self.road_net.content_hash)), **data)
+
+        self._up_indptr = data['up_indptr'].tolist()
+        self._up_indices = data['up_indices'].tolist()
+        self._up_weights = data['up_weights'].tolist()
+        self._middle = {}
+        up_sources = np.repeat(np.arange(len(data['up_indptr']) - 1), np.diff(data['up_indptr']))
+        for u, v, m in zip(up_sources.tolist(), self._up_indices, data['up_middle'].tolist()):
+            if m >= 0:
+                self._middle[(u, v)] = m
+                self._middle[(v, u)] = m
+
+    def _ch_query(self, source, target):
+        up_indptr, up_indices, up_weights = self._up_indptr, self._up_indices, self._up_weights
+        dist = ({source: 0.0}, {target: 0.0})
+        parent = ({source: -1}, {target: -1})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meeting = math.inf, -1
+        while heaps[0] or heaps[1]:
+            for side in (0, 1):
+                heap = heaps[side]
+                if not heap:
+                    continue
+                d, u = heapq.heappop(heap)
+                if d > dist[side].get(u, math.inf):
+                    continue
+                if d >= best:
+                    heap.clear()
+                    continue
+                other = dist[1 - side].get(u)
+                if other is not None and d + other < best:
+                    best, meeting = d + other, u
+                for k in range(up_indptr[u], up_indptr[u + 1]):
+                    v = up_indices[k]
+                    nd = d + up_weights[k]
+                    if nd < dist[side].get(v, math.inf):
+                        dist[side][v] = nd
+                        parent[side][v] = u
+                        heapq.heappush(heap, (nd, v))
+        if meeting < 0:
+            return math.inf, None
+
+        forward = [meeting]
+        while parent[0][forward[-1]] >= 0:
+            forward.append(parent[0][forward[-1]])
+        backward = [meeting]
+        while parent[1][backward[-1]] >= 0:
+            backward.append(parent[1][backward[-1]])
+        packed = forward[::-1] + backward[1:]
+        return best, self._unpack(packed)
+
+    def _unpack(self, packed):
+        """Разворачивает сокращения (shortcut) пути в исходные ребра графа"""
+        path = [packed[0]]
+        stack = list(zip(packed[:-1], packed[1:]))[::-1]
+        while stack:
+            u, v = stack.pop()
+            middle = self._middle.get((u, v))
+            if middle is None:
+                path.append(v)
+            else:
+                stack.append((middle, v))
+                stack.append((u, middle))
+        return path
+
+    # ---------- Общий интерфейс ----------
+
+    def shortest_path(self, source, target):
+        """
+        Кратчайший путь между узлами графа — замена nx.shortest_path
+
+        Параметры:
+            source (int): Индекс начального узла
+            target (int): Индекс конечного узла
+
+        Возвращает:
+            list: Последовательность индексов узлов от source до target
+
+        Исключения:
+            nx.NetworkXNoPath: если путь не существует
+        """
+        source, target = int(source), int(target)
+        if source == target:
+            return [source]
+        if self.mode == 'ch':
+            length, path = self._ch_query(source, target)
+        else:
+            length, parent = self._astar(source, target)
+            path = None
+            if math.isfinite(length):
+                path = [target]
+                while path[-1] != source:
+                    path.append(parent[path[-1]])
+                path.reverse()
+        if path is None:
+            raise nx.NetworkXNoPath(f"Нет пути между узлами {source} и {target}")
+        return path
+
+    def shortest_path_length(self, source, target):
+        """Длина кратчайшего пути, м (inf, если пути нет)"""
+        source, target = int(source), int(target)
+        if source == target:
+            return 0.0
+        if self.mode == 'ch':
+            return self._ch_query(source, target)[0]
+        return self._astar(source, target)[0]
+
+
+def _witness_distance(adj, source, target, exclude, limit):
+    """Ограниченный поиск Дейкстры: есть ли путь source -> target короче limit в обход exclude"""
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    settled = 0
+    while heap and settled < WITNESS_SETTLED_LIMIT:
+        d, u = heapq.heappop(heap)
+        if d > dist.get(u, math.inf):
+            continue
+        if u == target or d > limit:
+            break
+        settled += 1
+        for v, w in adj[u].items():
+            if v == exclude:
+                continue
+            nd = d + w
+            if nd < dist.get(v, math.inf):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist.get(target, math.inf)
+
+
+def _shortcuts(adj, node):
+    """Сокращения, необходимые при удалении узла из графа"""
+    neighbors = list(adj[node].items())
+    result = []
+    for i, (u, wu) in enumerate(neighbors):
+        for v, wv in neighbors[i + 1:]:
+            via = wu + wv
+            if _witness_distance(adj, u, v, node, via) > via:
+                result.append((u, v, via))
+    return result
+
+
+def build_contraction_hierarchy(road_net):
+    """
+    Предобработка иерархий сжатия для неориентированного графа дорожной сети
+
+    Узлы сжимаются по возрастанию «разности ребер» (добавленные сокращения минус
+    удаленные ребра) с ленивым пересчетом приоритета
+
+    Возвращает:
+        dict: CSR-массивы графа «вверх по иерархии»: up_indptr, up_indices,
+        up_weights и up_middle (средний узел сокращения или -1)
+    """
+    n = road_net.n_nodes
+    indptr = np.asarray(road_net.indptr).tolist()
+    indices = np.asarray(road_net.indices).tolist()
+    weights = np.asarray(road_net.edge_weight).tolist()
+
+    adj = [dict() for _ in range(n)]
+    for u in range(n):
+        for k in range(indptr[u], indptr[u + 1]):
+            v, w = indices[k], weights[k]
+            if w < adj[u].get(v, math.inf):
+                adj[u][v] = w
+                adj[v][u] = w
+
+    edges = {}  # (u, v) при u < v -> (вес, средний узел)
+    for u in range(n):
+        for v, w in adj[u].items():
+            if u < v:
+                edges[(u, v)] = (w, -1)
+
+    contracted_neighbors = [0] * n
+
+    def priority(node):
+        return len(_shortcuts(adj, node)) - len(adj[node]) + contracted_neighbors[node]
+
+    heap = [(priority(node), node) for node in range(n)]
+    heapq.heapify(heap)
+    rank = [0] * n
+    order = 0
+    while heap:
+        _, node = heapq.heappop(heap)
+        current = priority(node)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, node))
+            continue
+
+        for u, v, via in _shortcuts(adj, node):
+            if via < adj[u].get(v, math.inf):
+                adj[u][v] = via
+                adj[v][u] = via
+                edges[(min(u, v), max(u, v))] = (via, node)
+        for u in adj[node]:
+            del adj[u][node]
+            contracted_neighbors[u] += 1
+        adj[node] = {}
+        rank[node] = order
+        order += 1
+
+    # Граф «вверх»: каждое ребро хранится у узла с меньшим рангом
+    up_src, up_dst, up_w, up_mid = [], [], [], []
+    for (u, v), (w, middle) in edges.items():
+        low, high = (u, v) if rank[u] < rank[v] else (v, u)
+        up_src.append(low)
+        up_dst.append(high)
+        up_w.append(w)
+        up_mid.append(middle)
+    up_src = np.array(up_src, dtype=np.int64)
+    order = np.argsort(up_src, kind='stable')
+    return {
+        'up_indptr': np.concatenate([[0], np.cumsum(np.bincount(up_src, minlength=n))]).astype(np.int64),
+        'up_indices': np.array(up_dst, dtype=np.int64)[order],
+        'up_weights': np.array(up_w, dtype=np.float64)[order],
+        'up_middle': np.array(up_mid, dtype=np.int64)[order],
+    }
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+
+# Версия формата хранилища: при изменении структуры все файлы обрабатываются заново
+STORE_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+FRAGMENTS_DIR = 'fragments'
+
+
+def default_store_path(geojson_file):
+    """Каталог хранилища рядом с итоговым GeoJSON (low_speed_segments.geojson -> low_speed_segments_store)"""
+    base, _ = os.path.splitext(geojson_file)
+    return f"{base}_store"
+
+
+def file_hash(path):
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _replace_atomic(path, write):
+    """Запись во временный файл и замена: прерванный запуск не оставляет недописанный файл"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class SegmentStore:
+    """
+    Хранилище участков с низкой скоростью по анкетам, пополняемое по одному GPX файлу
+
+    Признаки каждого GPX файла лежат в отдельном фрагменте (по признаку GeoJSON
+    на строку) и записываются один раз. Манифест хранит для каждого файла размер,
+    время изменения и SHA-256 содержимого, поэтому при повторном запуске
+    обрабатываются только новые и измененные файлы, а итоговый GeoJSON собирается
+    из фрагментов одним проходом в конце
+    """
+
+    def __init__(self, store_dir, distance_method=None):
+        self.store_dir = store_dir
+        self.distance_method = distance_method
+        self.files = {}
+        # changed — изменились фрагменты или состав файлов (итоговый GeoJSON нужно собрать
+        # заново); manifest_changed — только записи манифеста (время изменения файла)
+        self.changed = False
+        self.manifest_changed = False
+        self._digests = {}
+
+        manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            # Результаты другой версии формата или другого способа расчета расстояний не переиспользуются
+            if (manifest.get('version') == STORE_VERSION
+                    and manifest.get('distance_method') == distance_method):
+                self.files = manifest['files']
+        os.makedirs(os.path.join(store_dir, FRAGMENTS_DIR), exist_ok=True)
+
+    def _fragment_path(self, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.store_dir, FRAGMENTS_DIR, f'{name}.ndjson')
+
+    def needs_update(self, key, path):
+        """
+        Нужно ли (заново) обрабатывать GPX файл
+
+        Совпадение размера и времени изменения считается неизменностью файла
+        без чтения; иначе сравнивается SHA-256 содержимого
+
+        Параметры:
+            key (str): Ключ файла в манифесте (путь относительно каталога анкет)
+            path (str): Путь к GPX файлу
+
+        Возвращает:
+            bool: True, если файла нет в хранилище или его содержимое изменилось
+        """
+        stat = os.stat(path)
+        entry = self.files.get(key)
+        if (entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+                and os.path.exists(self._fragment_path(key))):
+            return False
+        digest = file_hash(path)
+        if entry is not None and entry['sha256'] == digest and os.path.exists(self._fragment_path(key)):
+            # Файл только переписан тем же содержимым: обновляем время изменения
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            self.manifest_changed = True
+            return False
+        self._digests[key] = (digest, stat.st_size, stat.st_mtime_ns)
+        return True
+
+    def put(self, key, result, features):
+        """
+        Сохраняет признаки и итоги одного GPX файла (после needs_update)
+
+        Параметры:
+            key (str): Ключ файла в манифесте
+            result (dict): Итоги анализа файла (analyze_low_speed_segments)
+            features (list): Признаки GeoJSON участков с низкой скоростью
+        """
+        digest, size, mtime_ns = self._digests.pop(key)
+
+        def write(f):
+            for feature in features:
+                f.write(json.dumps(feature, ensure_ascii=False))
+                f.write('\n')
+
+        _replace_atomic(self._fragment_path(key), write)
+        self.files[key] = {
+            'sha256': digest,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'segments': len(features),
+            'total_distance_m': result['total_distance'],
+            'total_time_sec': result['total_time_sec'],
+            'avg_speed_kph': result['avg_speed'],
+            'low_speed_threshold_kph': result['low_speed_threshold'],
+        }
+        self.changed = True
+
+    def discard(self, key):
+        """Убирает файл из хранилища (файл удален или его обработка завершилась ошибкой)"""
+        self._digests.pop(key, None)
+        if self.files.pop(key, None) is not None:
+            self.changed = True
+        fragment = self._fragment_path(key)
+        if os.path.exists(fragment):
+            os.remove(fragment)
+
+    def prune(self, keys):
+        """Убирает из хранилища файлы, которых нет среди keys"""
+        for key in set(self.files) - set(keys):
+            self.discard(key)
+
+    def save(self):
+        """Сохраняет манифест, если в нем что-то изменилось"""
+        if not (self.changed or self.manifest_changed):
+            return
+        manifest = {
+            'version': STORE_VERSION,
+            'distance_method': self.distance_method,
+            'files': self.files,
+        }
+        _replace_atomic(os.path.join(self.store_dir, MANIFEST_FILE),
+                        lambda f: json.dump(manifest, f, ensure_ascii=False, indent=2))
+
+    def materialize(self, keys, output_geojson_path):
+        """
+        Собирает итоговый GeoJSON из фрагментов: признаки копируются построчно,
+        без загрузки всей коллекции в память
+
+        Параметры:
+            keys (list): Ключи файлов в порядке следования в коллекции
+            output_geojson_path (str): Путь к итоговому GeoJSON
+        """
+        entries = [self.files[key] for key in keys if key in self.files]
+        properties = {
+            'sources_processed': [os.path.basename(key) for key in keys if key in self.files],
+            'total_distance_m': sum(entry['total_distance_m'] for entry in entries),
+            'total_time_sec': sum(entry['total_time_sec'] for entry in entries),
+            'last_avg_speed_kph': entries[-1]['avg_speed_kph'] if entries else None,
+            'last_low_speed_threshold_kph': entries[-1]['low_speed_threshold_kph'] if entries else None,
+        }
+
+        def write(f):
+            f.write('{"type": "FeatureCollection", "properties": ')
+            f.write(json.dumps(properties, ensure_ascii=False))
+            f.write(', "features": [')
+            separator = '\n'
+            for key in keys:
+                if key not in self.files:
+                    continue
+                with open(self._fragment_path(key), 'r', encoding='utf-8') as fragment:
+                    for line in fragment:
+                        f.write(separator)
+                        f.write(line.rstrip('\n'))
+                        separator = ',\n'
+            f.write('\n]}\n')
+
+        _replace_atomic(output_geojson_path, write)
+        return sum(entry['segments'] for entry in entries)
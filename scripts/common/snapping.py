@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import shapely
+
+SNAP_CHUNK_SIZE = 200_000  # точек за один проход: ограничивает пиковую память
+
+
+def _snap_chunk(road_net, lat, lon):
+    """Привязка одного блока точек: ближайшая дорога + проекция на нее"""
+    n = len(lat)
+    result = {
+        'lat': np.full(n, np.nan),
+        'lon': np.full(n, np.nan),
+        'link_id': np.full(n, -1, dtype=np.int64),
+        'offset_m': np.full(n, np.nan),
+    }
+
+    points = shapely.points(lon, lat)
+    point_idx, link_idx = road_net.road_tree.query_nearest(points, all_matches=False)
+    if len(point_idx) == 0:
+        return result
+
+    lines = road_net.road_geoms[link_idx]
+    points = points[point_idx]
+    # Положение проекции на дороге (доля длины) и сама спроецированная точка
+    fraction = shapely.line_locate_point(lines, points, normalized=True)
+    snapped = shapely.get_coordinates(shapely.line_interpolate_point(lines, fraction, normalized=True))
+
+    result['lon'][point_idx] = snapped[:, 0]
+    result['lat'][point_idx] = snapped[:, 1]
+    result['link_id'][point_idx] = link_idx
+    result['offset_m'][point_idx] = fraction * np.asarray(road_net.link_length_m)[link_idx]
+    return result
+
+
+def snap_points(road_net, lat, lon, chunk_size=SNAP_CHUNK_SIZE):
+    """
+    Векторизованная привязка массива GPS-точек к ближайшим дорогам
+
+    Параметры:
+        road_net (RoadNetwork): Дорожная сеть (road_network.load_road_network)
+        lat (array): Широты точек
+        lon (array): Долготы точек
+        chunk_size (int): Размер блока точек, обрабатываемого за один проход
+
+    Возвращает:
+        DataFrame: lat, lon — привязанные координаты; link_id — индекс дороги
+        (-1, если точка не привязана); link_no — номер дороги NO;
+        offset_m — расстояние от начала дороги до проекции, м
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+
+    chunks = [
+        _snap_chunk(road_net, lat[start:start + chunk_size], lon[start:start + chunk_size])
+        for start in range(0, len(lat), chunk_size)
+    ]
+    if not chunks:
+        chunks = [_snap_chunk(road_net, lat, lon)]
+
+    snapped = pd.DataFrame({
+        name: np.concatenate([chunk[name] for chunk in chunks])
+        for name in ('lat', 'lon', 'link_id', 'offset_m')
+    })
+    link_id = snapped['link_id'].to_numpy()
+    link_no = np.asarray(road_net.link_no)[np.maximum(link_id, 0)]
+    snapped.insert(3, 'link_no', np.where(link_id >= 0, link_no, -1))
+    return snapped
@@ -0,0 +1,225 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from avl_store import LOCAL_TIMEZONE
+
+CUBE_DIR = '../../sources/speed_cube'
+CUBE_VERSION = 2
+META_FILE = 'meta.json'
+ARRAYS = ('counts', 'sums', 'sumsq')
+HOURS = 24
+DAY_TYPES = ('weekday', 'weekend')  # будни, выходные (суббота и воскресенье)
+TIMEZONE = LOCAL_TIMEZONE  # часы суток и типы дня — по местному времени
+
+
+def day_type_index(times):
+    """Тип дня (номер в DAY_TYPES) для массива моментов местного времени: 0 — будни, 1 — выходные"""
+    return (pd.DatetimeIndex(times).dayofweek.to_numpy() >= 5).astype(np.int64)
+
+
+def _day_types(day_type):
+    """Номера типов дня: принимает номера или названия из DAY_TYPES (скаляр или массив)"""
+    day_type = np.asarray(day_type)
+    if day_type.dtype.kind in 'US':
+        index = pd.Index(DAY_TYPES).get_indexer(day_type.ravel())
+        if (index < 0).any():
+            raise ValueError(f"Неизвестный тип дня, ожидается один из: {', '.join(DAY_TYPES)}")
+        return index.reshape(day_type.shape)
+    return day_type.astype(np.int64)
+
+
+class SpeedCube:
+    """
+    Куб скоростей «дорога × час суток × тип дня»
+
+    Плотные массивы формы (число дорог, 24, число типов дня): число наблюдений,
+    сумма и сумма квадратов скорости (км/ч). Из них без исходных точек получаются
+    средняя и СКО в любой ячейке, а кубы разных маршрутов и месяцев складываются.
+    Массивы хранятся в формате .npy и при чтении отображаются в память, поэтому
+    запрос читает с диска только нужные ячейки
+    """
+
+    def __init__(self, counts, sums, sumsq, link_no=None, network_hash=None):
+        if not counts.shape == sums.shape == sumsq.shape:
+            raise ValueError("Массивы куба должны быть одной формы")
+        self.counts = counts
+        self.sums = sums
+        self.sumsq = sumsq
+        self.link_no = link_no
+        self.network_hash = network_hash
+        self._no_index = None
+
+    @classmethod
+    def empty(cls, road_net):
+        """Пустой куб для всех дорог сети"""
+        shape = (road_net.n_links, HOURS, len(DAY_TYPES))
+        return cls(
+            np.zeros(shape, dtype=np.int64),
+            np.zeros(shape, dtype=np.float64),
+            np.zeros(shape, dtype=np.float64),
+            link_no=np.asarray(road_net.link_no),
+            network_hash=road_net.content_hash,
+        )
+
+    @property
+    def n_links(self):
+        return self.counts.shape[0]
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def add(self, links, hours, day_types, speeds_kmh):
+        """
+        Добавляет наблюдения скорости (NaN пропускаются)
+
+        Параметры:
+            links (array): Индексы дорог в дорожной сети
+            hours (array): Час суток (0–23)
+            day_types (array): Тип дня (номер или название из DAY_TYPES)
+            speeds_kmh (array): Скорость, км/ч
+        """
+        speeds_kmh = np.asarray(speeds_kmh, dtype=np.float64)
+        cells = np.ravel_multi_index(
+            (np.asarray(links, dtype=np.int64), np.asarray(hours, dtype=np.int64), _day_types(day_types)),
+            self.counts.shape,
+        )
+        valid = ~np.isnan(speeds_kmh)
+        cells, speeds_kmh = cells[valid], speeds_kmh[valid]
+        size = self.counts.size
+        self.counts += np.bincount(cells, minlength=size).reshape(self.counts.shape)
+        self.sums += np.bincount(cells, weights=speeds_kmh, minlength=size).reshape(self.counts.shape)
+        self.sumsq += np.bincount(cells, weights=speeds_kmh ** 2, minlength=size).reshape(self.counts.shape)
+        return self
+
+    def merge(self, other):
+        """Добавляет к кубу другой куб той же дорожной сети"""
+        if other.counts.shape != self.counts.shape or other.network_hash != self.network_hash:
+            raise ValueError("Кубы построены по разным дорожным сетям")
+        self.counts += other.counts
+        self.sums += other.sums
+        self.sumsq += other.sumsq
+        return self
+
+    def matches(self, road_net):
+        """Куб построен по этой дорожной сети"""
+        return self.network_hash == road_net.content_hash and self.n_links == road_net.n_links
+
+    def save(self, cube_dir=CUBE_DIR):
+        """
+        Сохраняет массивы куба (.npy) и описание (meta.json)
+
+        Каждый файл пишется во временный и заменяется; описание — последним
+        """
+        os.makedirs(cube_dir, exist_ok=True)
+        arrays = dict(zip(ARRAYS, (self.counts, self.sums, self.sumsq)))
+        if self.link_no is not None:
+            arrays['link_no'] = np.asarray(self.link_no)
+        for name, array in arrays.items():
+            path = os.path.join(cube_dir, f'{name}.npy')
+            with open(f'{path}.tmp', 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(f'{path}.tmp', path)
+
+        meta = {
+            'version': CUBE_VERSION,
+            'network_hash': self.network_hash,
+            'shape': list(self.counts.shape),
+            'day_types': list(DAY_TYPES),
+            'timezone': TIMEZONE,
+            'observations': self.count,
+        }
+        meta_path = os.path.join(cube_dir, META_FILE)
+        with open(f'{meta_path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(f'{meta_path}.tmp', meta_path)
+
+    @classmethod
+    def load(cls, cube_dir=CUBE_DIR, mmap=True):
+        """
+        Загружает куб
+
+        Параметры:
+            cube_dir (str): Каталог куба
+            mmap (bool): Отобразить массивы в память только для чтения (для запросов);
+                False — прочитать в память целиком (чтобы добавлять наблюдения)
+
+        Возвращает:
+            SpeedCube: Куб
+        """
+        with open(os.path.join(cube_dir, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if (meta.get('version') != CUBE_VERSION or meta.get('day_types') != list(DAY_TYPES)
+                or meta.get('timezone') != TIMEZONE):
+            raise ValueError(f"Куб скоростей в {cube_dir} другого формата, его нужно построить заново")
+        mode = 'r' if mmap else None
+        arrays = [np.load(os.path.join(cube_dir, f'{name}.npy'), mmap_mode=mode) for name in ARRAYS]
+        if any(list(array.shape) != meta['shape'] for array in arrays):
+            raise ValueError(f"Куб скоростей в {cube_dir} записан не полностью")
+        link_no_path = os.path.join(cube_dir, 'link_no.npy')
+        link_no = np.load(link_no_path) if os.path.exists(link_no_path) else None
+        return cls(*arrays, link_no=link_no, network_hash=meta.get('network_hash'))
+
+    def links_by_no(self, no):
+        """Индексы дорог по их номерам NO из shapefile (-1 — такой дороги нет)"""
+        if self.link_no is None:
+            raise ValueError("В кубе нет номеров дорог")
+        if self._no_index is None:
+            self._no_index = pd.Index(self.link_no)
+        no = np.asarray(no)
+        return self._no_index.get_indexer(no.ravel()).reshape(no.shape)
+
+    def lookup(self, links, hours, day_types):
+        """
+        Пакетный запрос: число наблюдений, средняя скорость и СКО по ячейкам
+
+        Аргументы согласуются по правилам broadcasting numpy, поэтому можно
+        запросить, например, все часы для набора дорог одним вызовом
+
+        Параметры:
+            links (array): Индексы дорог (-1 — нет дороги: пустая ячейка)
+            hours (array): Час суток (0–23)
+            day_types (array): Тип дня (номер или название из DAY_TYPES)
+
+        Возвращает:
+            pd.DataFrame: count, mean_kmh, std_kmh (NaN без наблюдений; СКО — от двух наблюдений)
+        """
+        links, hours, day_types = np.broadcast_arrays(
+            np.asarray(links, dtype=np.int64), np.asarray(hours, dtype=np.int64), _day_types(day_types))
+        links, hours, day_types = links.ravel(), hours.ravel(), day_types.ravel()
+        known = links >= 0
+        n = np.zeros(len(links), dtype=np.int64)
+        sums = np.zeros(len(links))
+        sumsq = np.zeros(len(links))
+        cell = (links[known], hours[known], day_types[known])
+        n[known] = self.counts[cell]
+        sums[known] = self.sums[cell]
+        sumsq[known] = self.sumsq[cell]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, sums / n, np.nan)
+            variance = np.where(n > 1, (sumsq - sums * mean) / (n - 1), np.nan)
+        return pd.DataFrame({
+            'count': n,
+            'mean_kmh': mean,
+            'std_kmh': np.sqrt(np.maximum(variance, 0)),
+        })
+
+    def query(self, link, hour, day_type):
+        """
+        Запрос одной ячейки
+
+        Возвращает:
+            dict: count, mean_kmh, std_kmh
+        """
+        row = self.lookup([link], [hour], [day_type]).iloc[0]
+        return {'count': int(row['count']), 'mean_kmh': float(row['mean_kmh']), 'std_kmh': float(row['std_kmh'])}
+
+    def profile(self, link, day_type):
+        """Суточный профиль скорости дороги: lookup по всем часам (индекс — час)"""
+        table = self.lookup(link, np.arange(HOURS), day_type)
+        table.index.name = 'hour'
+        return table
@@ -0,0 +1,276 @@
+import json
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import avl_store
+
+INDEX_VERSION = 1
+META_FILE = '_index.json'  # '_' — pyarrow не принимает файл за часть данных
+TIME_BUCKET_S = 3600       # с: точки сортируются по часу, внутри часа — по ключу Z-кривой
+ROW_GROUP_ROWS = 4096      # строк в блоке (группе строк Parquet) — единица чтения при запросе
+ZORDER_BITS = 20           # бит на координату ключа Z-кривой (шаг ~0.0002° по широте)
+SEQ_COLUMN = 'seq'         # порядковый номер точки в секции хранилища
+
+
+def default_index_path(csv_file):
+    """Путь к индексу рядом с исходным CSV (december.csv -> december_index)"""
+    base, _ = os.path.splitext(csv_file)
+    return f"{base}_index"
+
+
+def index_exists(index_dir):
+    """Проверяет, что индекс уже построен (описание пишется последним)"""
+    return os.path.exists(os.path.join(index_dir, META_FILE))
+
+
+def _spread_bits(v):
+    """Раздвигает младшие 32 бита: бит k переходит в бит 2k"""
+    v = v & 0xFFFFFFFF
+    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v << 2)) & 0x3333333333333333
+    v = (v | (v << 1)) & 0x5555555555555555
+    return v
+
+
+def zorder_key(lat, lon, bits=ZORDER_BITS):
+    """
+    Ключ Z-кривой (порядок Мортона) для координат: близкие точки получают близкие ключи
+
+    Возвращает:
+        np.ndarray: uint64 — чередование бит долготы (четные) и широты (нечетные)
+    """
+    scale = (1 << bits) - 1
+    x = np.clip((np.asarray(lon, dtype=np.float64) + 180.0) / 360.0, 0, 1) * scale
+    y = np.clip((np.asarray(lat, dtype=np.float64) + 90.0) / 180.0, 0, 1) * scale
+    x = np.nan_to_num(x).astype(np.uint64)
+    y = np.nan_to_num(y).astype(np.uint64)
+    return _spread_bits(x) | (_spread_bits(y) << np.uint64(1))
+
+
+def _sorted_partition(table, time_bucket_s):
+    """Точки секции в порядке индекса: час, ключ Z-кривой, исходный порядок"""
+    seq = np.arange(table.num_rows, dtype=np.int64)
+    signal_time = table['signal_time'].to_numpy(zero_copy_only=False).astype('datetime64[s]').astype(np.int64)
+    # Точки без времени — в конец, без координат — в конец своего часа
+    bucket = np.where(table['signal_time'].is_null().to_numpy(zero_copy_only=False),
+                      np.iinfo(np.int64).max, signal_time // time_bucket_s)
+    key = zorder_key(table['lat'].to_numpy(zero_copy_only=False), table['lon'].to_numpy(zero_copy_only=False))
+    order = np.lexsort((seq, key, bucket))
+    return table.append_column(SEQ_COLUMN, pa.array(seq)).take(order)
+
+
+def build_index(store_dir, index_dir, time_bucket_s=TIME_BUCKET_S, row_group_rows=ROW_GROUP_ROWS):
+    """
+    Строит пространственно-временной индекс по колоночному хранилищу AVL-данных
+
+    Индекс — копия хранилища с тем же секционированием по типу транспорта и
+    маршруту, в которой точки каждой секции отсортированы по часу и ключу
+    Z-кривой и разбиты на небольшие блоки. В метаданных Parquet для каждого
+    блока хранятся min/max времени, широты, долготы и uuid, поэтому запрос по
+    области, интервалу времени, маршруту и uuid читает только подходящие блоки.
+    Секции обрабатываются по одной: память — на одну секцию
+
+    Параметры:
+        store_dir (str): Каталог колоночного хранилища (avl_store.build_store)
+        index_dir (str): Каталог индекса
+        time_bucket_s (int): Интервал времени для сортировки, с
+        row_group_rows (int): Строк в блоке
+
+    Возвращает:
+        dict: Описание индекса (_index.json)
+    """
+    dataset = avl_store.open_store(store_dir)
+    keys = dataset.to_table(columns=avl_store.PARTITION_COLUMNS).group_by(avl_store.PARTITION_COLUMNS).aggregate([])
+    if os.path.exists(os.path.join(index_dir, META_FILE)):
+        os.remove(os.path.join(index_dir, META_FILE))
+
+    rows = 0
+    time_min, time_max = None, None
+    for vehicle_type, route in zip(keys['vehicle_type'].to_pylist(), keys['route'].to_pylist()):
+        condition = (ds.field('vehicle_type') == vehicle_type) & (ds.field('route') == route)
+        table = dataset.to_table(columns=avl_store.AVL_SCHEMA.names, filter=condition)
+        table = _sorted_partition(table, time_bucket_s)
+
+        partition_dir = os.path.join(index_dir, f'vehicle_type={vehicle_type}', f'route={route}')
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, 'part-0.parquet')
+        # Столбцы секционирования хранятся в именах каталогов
+        pq.write_table(table.drop_columns(avl_store.PARTITION_COLUMNS), f'{path}.tmp',
+                       row_group_size=row_group_rows)
+        os.replace(f'{path}.tmp', path)
+
+        rows += table.num_rows
+        bounds = pc.min_max(table['signal_time'])
+        if bounds['min'].is_valid:
+            low, high = bounds['min'].as_py(), bounds['max'].as_py()
+            time_min = low if time_min is None else min(time_min, low)
+            time_max = high if time_max is None else max(time_max, high)
+
+    meta = {
+        'version': INDEX_VERSION,
+        'time_bucket_s': time_bucket_s,
+        'row_group_rows': row_group_rows,
+        'zorder_bits': ZORDER_BITS,
+        'rows': rows,
+        'partitions': keys.num_rows,
+        'time_min': time_min.isoformat() if time_min else None,
+        'time_max': time_max.isoformat() if time_max else None,
+    }
+    with open(os.path.join(index_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+def ensure_index(csv_file, index_dir=None):
+    """
+    Путь к индексу месячного CSV; хранилище и индекс строятся, если их еще нет
+
+    Возвращает:
+        str: Каталог индекса
+    """
+    index_dir = index_dir or default_index_path(csv_file)
+    if not index_exists(index_dir):
+        store_dir = avl_store.default_store_path(csv_file)
+        if not avl_store.store_exists(store_dir):
+            avl_store.build_store(csv_file, store_dir)
+        build_index(store_dir, index_dir)
+    return index_dir
+
+
+def read_meta(index_dir):
+    """Описание индекса (_index.json)"""
+    with open(os.path.join(index_dir, META_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') != INDEX_VERSION:
+        raise ValueError(f"Индекс в {index_dir} другого формата, его нужно построить заново")
+    return meta
+
+
+def open_index(index_dir):
+    """Индекс как набор данных pyarrow (без чтения самих данных)"""
+    return ds.dataset(index_dir, format='parquet', partitioning=avl_store._partitioning())
+
+
+def _hour_windows(hours, start, end):
+    """
+    Интервалы [начало, конец) часов суток hours=(с, до) для каждого дня от start до end
+
+    Время суток не следует из статистики блоков, поэтому условие разворачивается
+    в интервалы абсолютного времени, по которым блоки отбрасываются
+    """
+    first_hour, last_hour = hours
+    windows = []
+    day = pd.Timestamp(start).normalize()
+    if last_hour <= first_hour:
+        day -= timedelta(days=1)  # утренняя часть первого дня — из интервала предыдущего
+    while day <= pd.Timestamp(end):
+        window_start = day + timedelta(hours=first_hour)
+        if last_hour > first_hour:
+            windows.append((window_start, day + timedelta(hours=last_hour)))
+        else:
+            # Интервал через полночь, например (22, 6)
+            windows.append((window_start, day + timedelta(days=1, hours=last_hour)))
+        day += timedelta(days=1)
+    return windows
+
+
+def query_filter(index_dir, bbox=None, start=None, end=None, hours=None,
+                 vehicle_type=None, route=None, uuid=None):
+    """
+    Условие запроса к индексу (pyarrow.dataset.Expression) или None — без условий
+
+    Параметры: как у query
+    """
+    conditions = []
+    if vehicle_type is not None:
+        conditions.append(ds.field('vehicle_type') == vehicle_type.lower())
+    if route is not None:
+        conditions.append(ds.field('route') == str(route))
+    if uuid is not None:
+        conditions.append(ds.field('uuid').isin([int(u) for u in np.atleast_1d(uuid)]))
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        conditions.append((ds.field('lon') >= min_lon) & (ds.field('lon') <= max_lon) &
+                          (ds.field('lat') >= min_lat) & (ds.field('lat') <= max_lat))
+    if start is not None:
+        conditions.append(ds.field('signal_time') >= pd.Timestamp(start).to_pydatetime())
+    if end is not None:
+        conditions.append(ds.field('signal_time') < pd.Timestamp(end).to_pydatetime())
+    if hours is not None:
+        meta = read_meta(index_dir)
+        if meta['time_min'] is None:
+            return ds.scalar(False)
+        windows = _hour_windows(hours, start or meta['time_min'], end or meta['time_max'])
+        condition = ds.scalar(False)
+        for window_start, window_end in windows:
+            condition = condition | ((ds.field('signal_time') >= window_start.to_pydatetime()) &
+                                     (ds.field('signal_time') < window_end.to_pydatetime()))
+        conditions.append(condition)
+
+    if not conditions:
+        return None
+    condition = conditions[0]
+    for other in conditions[1:]:
+        condition = condition & other
+    return condition
+
+
+def query(index_dir, bbox=None, start=None, end=None, hours=None,
+          vehicle_type=None, route=None, uuid=None, columns=None):
+    """
+    Точки AVL по области, интервалу времени, часам суток, маршруту и uuid
+
+    Читаются только блоки, статистика которых пересекается с условием; точки
+    возвращаются в исходном порядке секции (как avl_store.read_route)
+
+    Параметры:
+        index_dir (str): Каталог индекса (build_index)
+        bbox (tuple/None): Область (min_lon, min_lat, max_lon, max_lat)
+        start, end (datetime/str/None): Интервал времени signal_time [start, end)
+        hours (tuple/None): Часы суток (с, до), например (7, 9) — с 7:00 до 9:00 каждого дня
+        vehicle_type (str/None): Тип транспорта
+        route (str/int/None): Номер маршрута
+        uuid (int/list/None): Идентификатор ТС или их список
+        columns (list/None): Список нужных столбцов (по умолчанию все)
+
+    Возвращает:
+        DataFrame: Точки, удовлетворяющие всем условиям
+    """
+    columns = columns or avl_store.AVL_SCHEMA.names
+    condition = query_filter(index_dir, bbox, start, end, hours, vehicle_type, route, uuid)
+    table = open_index(index_dir).to_table(
+        columns=list(dict.fromkeys(columns + avl_store.PARTITION_COLUMNS + [SEQ_COLUMN])),
+        filter=condition,
+    )
+    table = table.sort_by([(name, 'ascending') for name in avl_store.PARTITION_COLUMNS + [SEQ_COLUMN]])
+    return table.select(columns).to_pandas()
+
+
+def count_blocks(index_dir, **conditions):
+    """
+    Число блоков, которые прочитает запрос, и общее число блоков индекса
+
+    Параметры:
+        conditions: Условия запроса (как у query)
+
+    Возвращает:
+        tuple: (блоков к чтению, всего блоков)
+    """
+    dataset = open_index(index_dir)
+    condition = query_filter(index_dir, **conditions)
+    selected = total = 0
+    for fragment in dataset.get_fragments():
+        total += fragment.num_row_groups
+    for fragment in dataset.get_fragments(filter=condition):
+        selected += (len(fragment.split_by_row_group(condition, schema=dataset.schema))
+                     if condition is not None else fragment.num_row_groups)
+    return selected, total
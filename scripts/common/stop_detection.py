@@ -0,0 +1,261 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.spatial
+
+from road_network import to_metric
+
+# Параметры определения остановок
+STOP_SPEED_THRESHOLD = 1.9          # м/с: точки медленнее считаются стоянием
+MIN_STOP_DURATION = 35              # с: минимальная продолжительность стоянки в точке
+STOP_CLUSTER_DISTANCE_M = 100       # м: точки стоянок ближе этого — одна остановка
+STOP_AGGREGATION_DISTANCE_M = 10    # м: остановки ближе этого объединяются
+STOP_MERGE_DISTANCE_M = 30          # м: остановки разных маршрутов ближе этого — одна остановка города
+# Признаки конечных остановок
+DURATION_FACTOR = 3.0               # стоянка дольше медианы во столько раз
+MIN_POINTS = 10                     # меньше точек — возможен выброс
+MIN_UUIDS = 3                       # конечную посещает не меньше стольких ТС
+
+STOPS_COLUMNS = ['stop_id', 'stop_name', 'lat', 'lon', 'signal_time', 'duration',
+                 'point_count', 'is_first', 'is_last']
+
+# Смещения соседних ячеек сетки (половина окна 5x5: каждая пара ячеек проверяется один раз)
+_NEIGHBOR_OFFSETS = [(dx, dy) for dx in range(0, 3) for dy in range(-2, 3) if dx > 0 or dy > 0]
+_PAIR_BATCH = 4_000_000     # пар точек за одно векторное сравнение
+_DENSE_PAIR_LIMIT = 10_000  # пары плотных ячеек сравниваются через KD-дерево
+
+
+def _linked_cell_pairs(x, y, order, bounds, first, second, distance_m):
+    """Какие из пар соседних ячеек содержат хотя бы одну пару точек не дальше distance_m"""
+    size_first = bounds[first + 1] - bounds[first]
+    size_second = bounds[second + 1] - bounds[second]
+    products = size_first * size_second
+    linked = np.zeros(len(first), dtype=bool)
+    limit = distance_m ** 2
+
+    # Обычные ячейки: все пары точек сравниваются векторно, пачками
+    sparse = np.flatnonzero(products <= _DENSE_PAIR_LIMIT)
+    passed = np.cumsum(products[sparse]) - products[sparse]
+    start = 0
+    while start < len(sparse):
+        stop = max(start + 1, int(np.searchsorted(passed, passed[start] + _PAIR_BATCH)))
+        pairs = sparse[start:stop]
+        counts = products[pairs]
+        pair = np.repeat(np.arange(len(pairs)), counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        a = order[bounds[first[pairs]][pair] + within // size_second[pairs][pair]]
+        b = order[bounds[second[pairs]][pair] + within % size_second[pairs][pair]]
+        close = (x[a] - x[b]) ** 2 + (y[a] - y[b]) ** 2 <= limit
+        linked[pairs[np.unique(pair[close])]] = True
+        start = stop
+
+    # Плотные ячейки (конечные, депо): поиск ближайшего соседа по KD-дереву ячейки
+    trees = {}
+    for k in np.flatnonzero(products > _DENSE_PAIR_LIMIT).tolist():
+        i, j = int(first[k]), int(second[k])
+        if j not in trees:
+            members = order[bounds[j]:bounds[j + 1]]
+            trees[j] = scipy.spatial.cKDTree(np.column_stack([x[members], y[members]]))
+        members = order[bounds[i]:bounds[i + 1]]
+        dist, _ = trees[j].query(np.column_stack([x[members], y[members]]), distance_upper_bound=distance_m)
+        linked[k] = np.isfinite(dist).any()
+    return linked
+
+
+def grid_clusters(x, y, distance_m):
+    """
+    Кластеризация одиночной связью: точки на расстоянии не больше distance_m
+    (напрямую или цепочкой) попадают в один кластер — как DBSCAN с min_samples=1
+
+    Точки раскладываются по ячейкам хэш-сетки со стороной distance_m / sqrt(2):
+    точки одной ячейки заведомо ближе порога, поэтому сравниваются только
+    соседние ячейки, а кластеры — связные компоненты графа ячеек
+
+    Параметры:
+        x (array): Координаты X точек в метрической проекции, м
+        y (array): Координаты Y точек, м
+        distance_m (float): Порог расстояния, м
+
+    Возвращает:
+        ndarray: Номер кластера каждой точки (в порядке первого появления)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    cell_size = distance_m / np.sqrt(2)
+    cx = np.floor((x - x.min()) / cell_size).astype(np.int64)
+    cy = np.floor((y - y.min()) / cell_size).astype(np.int64) + 2
+    stride = int(cy.max()) + 3
+    cell_keys, point_cell = np.unique(cx * stride + cy, return_inverse=True)
+    point_cell = point_cell.ravel()
+    order = np.argsort(point_cell, kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(point_cell, minlength=len(cell_keys)))])
+
+    # Пары занятых соседних ячеек — поиском ключей в отсортированном массиве
+    first, second = [], []
+    for dx, dy in _NEIGHBOR_OFFSETS:
+        neighbor = cell_keys + dx * stride + dy
+        pos = np.minimum(np.searchsorted(cell_keys, neighbor), len(cell_keys) - 1)
+        found = np.flatnonzero(cell_keys[pos] == neighbor)
+        first.append(found)
+        second.append(pos[found])
+    first, second = np.concatenate(first), np.concatenate(second)
+    linked = _linked_cell_pairs(x, y, order, bounds, first, second, distance_m)
+
+    graph = scipy.sparse.coo_matrix(
+        (np.ones(int(linked.sum())), (first[linked], second[linked])),
+        shape=(len(cell_keys), len(cell_keys)),
+    )
+    _, cell_label = scipy.sparse.csgraph.connected_components(graph, directed=False)
+    # Нумерация кластеров в порядке первой точки, как у DBSCAN
+    _, first_point, labels = np.unique(cell_label[point_cell], return_index=True, return_inverse=True)
+    rank = np.empty(len(first_point), dtype=np.int64)
+    rank[np.argsort(first_point, kind='stable')] = np.arange(len(first_point))
+    return rank[labels.ravel()]
+
+
+def cluster_points(lat, lon, distance_m):
+    """Кластеризация точек (lat, lon) с порогом в метрах (проекция METRIC_CRS)"""
+    x, y = to_metric(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+    return grid_clusters(x, y, distance_m)
+
+
+def empty_stops():
+    """Пустая таблица остановок"""
+    return pd.DataFrame(columns=STOPS_COLUMNS)
+
+
+def detect_stops(df, speed_threshold=STOP_SPEED_THRESHOLD, min_duration=MIN_STOP_DURATION,
+                 distance_m=STOP_CLUSTER_DISTANCE_M, group_column=None):
+    """
+    Определение остановок по точкам с низкой скоростью
+
+    Параметры:
+        df (DataFrame): Точки с колонками lat, lon, speed, signal_time (отсортированы по времени)
+        speed_threshold (float): Порог скорости стоянки, м/с
+        min_duration (float): Минимальная продолжительность стоянки в точке, с
+        distance_m (float): Порог расстояния между точками одной остановки, м
+        group_column (str/None): Колонка ТС (например, 'uuid'): продолжительность
+            считается до следующей медленной точки того же ТС; по умолчанию — до
+            следующей медленной точки в общей последовательности
+
+    Возвращает:
+        tuple: (DataFrame остановок STOPS_COLUMNS, DataFrame точек стоянок
+        с номером остановки в колонке cluster_id)
+    """
+    low_speed_points = df[df['speed'] < speed_threshold].copy()
+    if group_column is not None:
+        next_time = low_speed_points.groupby(group_column)['signal_time'].shift(-1)
+    else:
+        next_time = low_speed_points['signal_time'].shift(-1)
+    low_speed_points['duration'] = (next_time - low_speed_points['signal_time']).dt.total_seconds()
+    low_speed_points = low_speed_points.dropna(subset=['duration'])
+
+    potential_stops = low_speed_points[low_speed_points['duration'] > min_duration].copy()
+    if len(potential_stops) == 0:
+        potential_stops['cluster_id'] = pd.Series(dtype=np.int64)
+        return empty_stops(), potential_stops
+
+    potential_stops['cluster_id'] = cluster_points(
+        potential_stops['lat'].to_numpy(), potential_stops['lon'].to_numpy(), distance_m
+    )
+    stops = potential_stops.groupby('cluster_id').agg(
+        lat=('lat', 'mean'),
+        lon=('lon', 'mean'),
+        signal_time=('signal_time', 'min'),
+        duration=('duration', 'sum'),
+        point_count=('cluster_id', 'size'),
+    ).reset_index(drop=True)
+
+    stops['stop_id'] = 'stop_' + stops.index.astype(str)
+    stops['stop_name'] = 'Остановка ' + stops.index.astype(str)
+
+    # Начальная и конечная остановки — ближайшие по времени к началу и концу данных
+    stops['is_first'] = False
+    stops['is_last'] = False
+    first_stop_idx = (stops['signal_time'] - df['signal_time'].min()).abs().idxmin()
+    stops.loc[first_stop_idx, ['is_first', 'stop_name']] = [True, 'Начальная остановка']
+    last_stop_idx = (stops['signal_time'] - df['signal_time'].max()).abs().idxmin()
+    stops.loc[last_stop_idx, ['is_last', 'stop_name']] = [True, 'Конечная остановка']
+    return stops[STOPS_COLUMNS], potential_stops
+
+
+def potential_terminals(stops, duration_factor=DURATION_FACTOR, min_points=MIN_POINTS):
+    """
+    Признак возможной конечной: стоянка намного дольше медианы и достаточно
+    точек (мало точек -> возможен выброс)
+
+    Возвращает:
+        pd.Series: bool по остановкам
+    """
+    median_stop_duration = stops['duration'].median()
+    return (stops['duration'] > median_stop_duration * duration_factor) & (stops['point_count'] >= min_points)
+
+
+def aggregate_stops(stops, distance_m=STOP_AGGREGATION_DISTANCE_M):
+    """
+    Объединение близких остановок
+
+    Параметры:
+        stops (DataFrame): Остановки (detect_stops)
+        distance_m (float): Порог расстояния между объединяемыми остановками, м
+
+    Возвращает:
+        tuple: (DataFrame объединенных остановок с колонкой stop_cluster,
+        номер объединенной остановки для каждой исходной)
+    """
+    labels = cluster_points(stops['lat'].to_numpy(), stops['lon'].to_numpy(), distance_m)
+    aggregated = stops.assign(stop_cluster=labels).groupby('stop_cluster').agg({
+        'lat': 'mean',
+        'lon': 'mean',
+        'signal_time': 'min',
+        'duration': 'sum',
+        'point_count': 'sum',
+        'is_first': 'any',
+        'is_last': 'any'
+    }).reset_index()
+    return aggregated, labels
+
+
+def merge_stops(stops, distance_m=STOP_MERGE_DISTANCE_M):
+    """
+    Объединение остановок разных маршрутов в общий справочник остановок города
+
+    Параметры:
+        stops (DataFrame): Остановки маршрутов с колонками vehicle_type, route,
+            lat, lon, duration, point_count, is_first, is_last
+        distance_m (float): Порог расстояния между объединяемыми остановками, м
+
+    Возвращает:
+        tuple: (DataFrame справочника: stop_id, stop_name, lat, lon, duration,
+        point_count, route_count, routes, is_terminal; номер остановки
+        справочника для каждой исходной остановки)
+    """
+    labels = cluster_points(stops['lat'].to_numpy(), stops['lon'].to_numpy(), distance_m)
+    stops = stops.assign(
+        city_stop=labels,
+        route_key=stops['vehicle_type'].astype(str) + ':' + stops['route'].astype(str),
+        is_terminal=stops['is_first'] | stops['is_last'],
+        # Координаты остановки — среднее, взвешенное по числу точек стоянок
+        weighted_lat=stops['lat'] * stops['point_count'],
+        weighted_lon=stops['lon'] * stops['point_count'],
+    )
+    catalogue = stops.groupby('city_stop').agg(
+        weighted_lat=('weighted_lat', 'sum'),
+        weighted_lon=('weighted_lon', 'sum'),
+        duration=('duration', 'sum'),
+        point_count=('point_count', 'sum'),
+        route_count=('route_key', 'nunique'),
+        routes=('route_key', lambda keys: ';'.join(sorted(set(keys)))),
+        is_terminal=('is_terminal', 'any'),
+    ).reset_index(drop=True)
+    catalogue['lat'] = catalogue['weighted_lat'] / catalogue['point_count']
+    catalogue['lon'] = catalogue['weighted_lon'] / catalogue['point_count']
+    catalogue['stop_id'] = 'stop_' + catalogue.index.astype(str)
+    catalogue['stop_name'] = 'Остановка ' + catalogue.index.astype(str)
+    columns = ['stop_id', 'stop_name', 'lat', 'lon', 'duration', 'point_count',
+               'route_count', 'routes', 'is_terminal']
+    return catalogue[columns], labels
@@ -0,0 +1,282 @@
+import gzip
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+TILE_SIZE = 256             # пикселей в тайле (как у подложки OSM)
+DEFAULT_PORT = 8765
+SERVER_START_TIMEOUT = 10   # с: ожидание запуска сервера тайлов
+TILE_SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tiles', 'tile_server.py')
+SIMPLIFY_PIXELS = 1.0       # допуск упрощения геометрии, пикселей текущего масштаба
+CLIP_MARGIN_PIXELS = 4      # запас при обрезке по тайлу, чтобы линии на стыках не рвались
+
+
+def lonlat_to_tile(lon, lat, zoom):
+    """Дробные координаты тайла (x, y) в схеме XYZ (Web Mercator) для точек (lon, lat)"""
+    n = 2 ** zoom
+    lat_rad = np.radians(np.clip(lat, -85.05112878, 85.05112878))
+    x = (np.asarray(lon) + 180.0) / 360.0 * n
+    y = (1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n
+    return x, y
+
+
+def tile_bounds(x, y, zoom):
+    """Границы тайлов (lon_min, lat_min, lon_max, lat_max)"""
+    n = 2 ** zoom
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    lon_min = x / n * 360.0 - 180.0
+    lon_max = (x + 1) / n * 360.0 - 180.0
+    lat_max = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y / n))))
+    lat_min = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + 1) / n))))
+    return lon_min, lat_min, lon_max, lat_max
+
+
+def open_archive(path, create=False):
+    """
+    Открывает архив тайлов (один файл SQLite)
+
+    Параметры:
+        path (str): Путь к архиву
+        create (bool): Создать архив и таблицы, если их нет
+
+    Возвращает:
+        sqlite3.Connection: Соединение с архивом
+    """
+    if create:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path)
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tiles (
+                layer TEXT NOT NULL,
+                zoom INTEGER NOT NULL,
+                x INTEGER NOT NULL,
+                y INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (layer, zoom, x, y)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS metadata (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        return conn
+    return sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True, check_same_thread=False)
+
+
+def read_layers(conn):
+    """Описание слоев архива: {слой: {min_zoom, max_zoom, bounds, properties}}"""
+    row = conn.execute("SELECT value FROM metadata WHERE name = 'layers'").fetchone()
+    return json.loads(row[0]) if row else {}
+
+
+def write_layer(conn, layer, tiles, info):
+    """
+    Заменяет слой в архиве
+
+    Параметры:
+        conn (sqlite3.Connection): Соединение с архивом (open_archive(create=True))
+        layer (str): Имя слоя
+        tiles (iterable): Кортежи (zoom, x, y, data) — data: GeoJSON тайла, сжатый gzip
+        info (dict): Описание слоя (min_zoom, max_zoom, bounds, properties)
+    """
+    with conn:
+        conn.execute("DELETE FROM tiles WHERE layer = ?", (layer,))
+        conn.executemany(
+            "INSERT INTO tiles (layer, zoom, x, y, data) VALUES (?, ?, ?, ?, ?)",
+            ((layer, zoom, x, y, data) for zoom, x, y, data in tiles),
+        )
+        layers = read_layers(conn)
+        layers[layer] = info
+        conn.execute(
+            "INSERT OR REPLACE INTO metadata (name, value) VALUES ('layers', ?)",
+            (json.dumps(layers, ensure_ascii=False),),
+        )
+
+
+def read_tile(conn, layer, zoom, x, y):
+    """Сжатый GeoJSON тайла или None, если в тайле нет объектов"""
+    row = conn.execute(
+        "SELECT data FROM tiles WHERE layer = ? AND zoom = ? AND x = ? AND y = ?",
+        (layer, zoom, x, y),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def read_segments(path, columns):
+    """Геометрии и свойства сегментов из GeoJSON"""
+    segments = gpd.read_file(path).to_crs(epsg=4326)
+    segments = segments[segments.geometry.notna() & ~segments.geometry.is_empty].reset_index(drop=True)
+    properties = segments[[name for name in columns if name in segments.columns]].copy()
+    for name in properties.columns:
+        if pd.api.types.is_float_dtype(properties[name]):
+            properties[name] = properties[name].round(2)
+        elif not pd.api.types.is_numeric_dtype(properties[name]):
+            properties[name] = properties[name].astype(str)
+    return segments.geometry.values, properties
+
+
+def cut_tiles(geoms, properties, zoom):
+    """
+    Нарезка слоя на тайлы одного масштаба
+
+    Геометрия упрощается с допуском в доли пикселя этого масштаба, округляется
+    до точности пикселя и обрезается по границам тайлов (с небольшим запасом)
+
+    Возвращает:
+        list: Кортежи (zoom, x, y, data) — data: GeoJSON тайла, сжатый gzip
+    """
+    degrees_per_pixel = 360.0 / (TILE_SIZE * 2 ** zoom)
+    simplified = shapely.simplify(geoms, degrees_per_pixel * SIMPLIFY_PIXELS)
+    decimals = int(np.ceil(np.log10(1 / degrees_per_pixel)))
+    simplified = shapely.set_precision(simplified, 10.0 ** -decimals)
+    keep = ~shapely.is_empty(simplified)
+
+    bounds = np.where(keep[:, None], shapely.bounds(simplified), 0.0)
+    x0, y0 = lonlat_to_tile(bounds[:, 0], bounds[:, 3], zoom)
+    x1, y1 = lonlat_to_tile(bounds[:, 2], bounds[:, 1], zoom)
+    x0, y0, x1, y1 = (np.floor(v).astype(np.int64) for v in (x0, y0, x1, y1))
+    nx = np.where(keep, x1 - x0 + 1, 0)
+    counts = nx * np.where(keep, y1 - y0 + 1, 0)
+
+    # Пары (объект, тайл) для всех тайлов, которые пересекает рамка объекта
+    feature = np.repeat(np.arange(len(simplified)), counts)
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    tx = x0[feature] + within % nx[feature]
+    ty = y0[feature] + within // nx[feature]
+    lon_min, lat_min, lon_max, lat_max = tile_bounds(tx, ty, zoom)
+    margin = degrees_per_pixel * CLIP_MARGIN_PIXELS
+    boxes = shapely.box(lon_min - margin, lat_min - margin, lon_max + margin, lat_max + margin)
+    clipped = shapely.intersection(simplified[feature], boxes)
+    found = ~shapely.is_empty(clipped)
+    feature, tx, ty, clipped = feature[found], tx[found], ty[found], clipped[found]
+
+    geometry_json = shapely.to_geojson(clipped)
+    property_json = [json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+                     for record in properties.to_dict('records')]
+
+    tiles = []
+    order = np.lexsort((ty, tx))
+    tile_keys = np.column_stack([tx[order], ty[order]])
+    starts = np.flatnonzero(np.r_[True, (tile_keys[1:] != tile_keys[:-1]).any(axis=1)])
+    ends = np.r_[starts[1:], len(order)]
+    for start, end in zip(starts, ends):
+        items = order[start:end]
+        features = ','.join(
+            f'{{"type":"Feature","geometry":{geometry_json[k]},"properties":{property_json[feature[k]]}}}'
+            for k in items
+        )
+        body = f'{{"type":"FeatureCollection","features":[{features}]}}'.encode('utf-8')
+        tiles.append((zoom, int(tile_keys[start, 0]), int(tile_keys[start, 1]), gzip.compress(body, 6)))
+    return tiles
+
+
+def build_layer(conn, name, geoms, properties, min_zoom=10, max_zoom=16):
+    """
+    Нарезает слой на всех масштабах и записывает его в архив
+
+    Параметры:
+        conn (sqlite3.Connection): Соединение с архивом (open_archive(create=True))
+        name (str): Имя слоя
+        geoms (array): Геометрии shapely в EPSG:4326
+        properties (DataFrame): Свойства объектов, сохраняемые в тайлах
+        min_zoom, max_zoom (int): Диапазон масштабов
+    """
+    start = time.perf_counter()
+    tiles = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        tiles.extend(cut_tiles(geoms, properties, zoom))
+    info = {
+        'min_zoom': min_zoom,
+        'max_zoom': max_zoom,
+        'bounds': [float(v) for v in shapely.total_bounds(geoms)],
+        'properties': list(properties.columns),
+        'tiles': len(tiles),
+    }
+    write_layer(conn, name, tiles, info)
+    size_mb = sum(len(tile[3]) for tile in tiles) / 2 ** 20
+    print(f"  {name}: {len(geoms)} объектов, {len(tiles)} тайлов, {size_mb:.1f} МБ, "
+          f"{time.perf_counter() - start:.1f} с")
+
+
+def tile_server_url(port=DEFAULT_PORT):
+    return f'http://127.0.0.1:{port}'
+
+
+def tile_server_running(port=DEFAULT_PORT):
+    """Отвечает ли локальный сервер тайлов"""
+    try:
+        with urllib.request.urlopen(f'{tile_server_url(port)}/layers.json', timeout=0.5) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def server_layers(url_base):
+    """Описание слоев архива, который отдает сервер тайлов (/layers.json); пустой словарь, если он не отвечает"""
+    try:
+        with urllib.request.urlopen(f'{url_base.rstrip("/")}/layers.json', timeout=0.5) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except (urllib.error.URLError, OSError, ValueError):
+        return {}
+
+
+def start_tile_server(archive_path, port=DEFAULT_PORT):
+    """
+    Запускает сервер тайлов отдельным фоновым процессом
+
+    Возвращает:
+        subprocess.Popen: Процесс сервера
+    """
+    return subprocess.Popen(
+        [sys.executable, os.path.abspath(TILE_SERVER_SCRIPT),
+         '--archive', os.path.abspath(archive_path), '--port', str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def ensure_tile_server(archive_path, port=DEFAULT_PORT):
+    """
+    Адрес сервера тайлов; если архив есть, а сервер не запущен — запускает его
+
+    Параметры:
+        archive_path (str): Путь к архиву тайлов
+        port (int): Порт сервера
+
+    Возвращает:
+        str/None: Базовый URL сервера или None, если архива нет или сервер не запустился
+    """
+    if not os.path.exists(archive_path):
+        return None
+    if tile_server_running(port):
+        return tile_server_url(port)
+    start_tile_server(archive_path, port)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if tile_server_running(port):
+            return tile_server_url(port)
+        time.sleep(0.2)
+    return None
+
+
+def archive_layers(archive_path):
+    """Описание слоев архива по пути к нему (пустой словарь, если архива нет)"""
+    if not os.path.exists(archive_path):
+        return {}
+    conn = open_archive(archive_path)
+    try:
+        return read_layers(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+from pyproj import Geod
+
+from gpx_reader import MISSING_TIME
+from road_network import haversine_m
+
+DISTANCE_METHODS = ('ellipsoidal', 'haversine', 'geodesic')
+LOW_SPEED_RATIO = 0.5  # участок медленнее этой доли средней скорости трека — низкая скорость
+
+# Эллипсоид WGS84
+_WGS84_A = 6378137.0
+_WGS84_E2 = 6.69437999014e-3
+_GEOD = Geod(ellps='WGS84')
+
+SEGMENT_COLUMNS = ['start_lat', 'start_lon', 'end_lat', 'end_lon', 'start_time', 'end_time',
+                   'distance_m', 'time_sec', 'speed_kmh']
+
+
+def ellipsoidal_m(lon1, lat1, lon2, lat2):
+    """
+    Векторизованное расстояние на эллипсоиде WGS84 в метрах для коротких отрезков
+
+    Разности широт и долгот переводятся в метры по радиусам кривизны меридиана
+    и первого вертикала на средней широте отрезка. Для отрезков между соседними
+    точками трека (десятки метров) отличие от точного геодезического решения —
+    доли миллиметра
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    mid = (lat1 + lat2) / 2
+    w2 = 1 - _WGS84_E2 * np.sin(mid) ** 2
+    meridian = _WGS84_A * (1 - _WGS84_E2) / w2 ** 1.5
+    vertical = _WGS84_A / np.sqrt(w2)
+    dlon = (lon2 - lon1 + np.pi) % (2 * np.pi) - np.pi
+    return np.hypot(meridian * (lat2 - lat1), vertical * np.cos(mid) * dlon)
+
+
+def geodesic_m(lon1, lat1, lon2, lat2):
+    """Точное геодезическое расстояние на WGS84 (Karney, как geopy.distance.distance), м"""
+    return _GEOD.inv(lon1, lat1, lon2, lat2)[2]
+
+
+def pair_distances(lat, lon, method='ellipsoidal'):
+    """
+    Расстояния между соседними точками трека
+
+    Параметры:
+        lat, lon (np.ndarray): Координаты точек
+        method (str): ellipsoidal — быстрый расчет на эллипсоиде (по умолчанию),
+            haversine — по сфере, geodesic — точное решение для проверки
+
+    Возвращает:
+        np.ndarray: Длины n - 1 отрезков, м
+    """
+    if method not in DISTANCE_METHODS:
+        raise ValueError(f"Неизвестный способ расчета расстояний: {method}")
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if len(lat) < 2:
+        return np.empty(0)
+    if method == 'haversine':
+        return haversine_m(lon[:-1], lat[:-1], lon[1:], lat[1:])
+    if method == 'geodesic':
+        return np.asarray(geodesic_m(lon[:-1], lat[:-1], lon[1:], lat[1:]))
+    return ellipsoidal_m(lon[:-1], lat[:-1], lon[1:], lat[1:])
+
+
+def segment_stats(track, method='ellipsoidal'):
+    """
+    Статистика всех отрезков трека между соседними точками одним векторным расчетом
+
+    Отрезки без времени у одной из точек или с неположительной длительностью
+    отбрасываются
+
+    Параметры:
+        track (dict): Массивы lat, lon, time (мс) — результат gpx_reader.read_gpx
+        method (str): Способ расчета расстояний (pair_distances)
+
+    Возвращает:
+        pd.DataFrame: Отрезки (SEGMENT_COLUMNS), время начала и конца — мс Unix-времени
+    """
+    lat = np.asarray(track['lat'], dtype=np.float64)
+    lon = np.asarray(track['lon'], dtype=np.float64)
+    time = np.asarray(track['time'], dtype=np.int64)
+
+    distance = pair_distances(lat, lon, method)
+    valid = (time[:-1] != MISSING_TIME) & (time[1:] != MISSING_TIME)
+    duration = np.where(valid, time[1:] - time[:-1], 0) / 1000
+    keep = np.flatnonzero(valid & (duration > 0))
+
+    return pd.DataFrame({
+        'start_lat': lat[keep],
+        'start_lon': lon[keep],
+        'end_lat': lat[keep + 1],
+        'end_lon': lon[keep + 1],
+        'start_time': time[keep],
+        'end_time': time[keep + 1],
+        'distance_m': distance[keep],
+        'time_sec': duration[keep],
+        'speed_kmh': distance[keep] / duration[keep] * 3.6,
+    }, columns=SEGMENT_COLUMNS)
+
+
+def track_summary(segments, low_speed_ratio=LOW_SPEED_RATIO):
+    """
+    Итоги трека по его отрезкам
+
+    Возвращает:
+        dict: total_distance (м), total_time_sec, avg_speed (км/ч)
+            и low_speed_threshold (км/ч)
+    """
+    total_distance = float(segments['distance_m'].sum())
+    total_time = float(segments['time_sec'].sum())
+    avg_speed = total_distance / total_time * 3.6 if total_time > 0 else 0
+    return {
+        'total_distance': total_distance,
+        'total_time_sec': total_time,
+        'avg_speed': avg_speed,
+        'low_speed_threshold': avg_speed * low_speed_ratio,
+    }
+
+
+def low_speed_mask(segments, threshold):
+    """Маска отрезков медленнее порога threshold, км/ч"""
+    return segments['speed_kmh'].to_numpy() < threshold
@@ -0,0 +1,16 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import avl_store
+import st_index
+
+path = '../../sources/geotracks_transports/'
+csv_file = f'{path}december.csv'
+store_dir = avl_store.build_store(csv_file)
+print(f"Колоночное хранилище сохранено в {store_dir}")
+
+# Пространственно-временной индекс для запросов по области, времени, маршруту и uuid
+index_dir = st_index.default_index_path(csv_file)
+meta = st_index.build_index(store_dir, index_dir)
+print(f"Индекс ({meta['rows']} точек) сохранён в {index_dir}")
@@ -1,22 +1,49 @@
 import argparse
+import os
 import sys
 
 import pandas as pd
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import avl_store
+import st_index
 
-def filter_transport_data(csv_file, vehicle_type, route=None):
+
+def filter_transport_data(csv_file, vehicle_type, route=None, columns=None,
+                          bbox=None, start=None, end=None, hours=None, uuid=None):
     """
     Фильтрует данные по типу транспорта и маршруту
 
+    Если рядом с CSV уже построено колоночное хранилище (converter_to_parquet.py),
+    читается только нужная секция и столбцы, без разбора всего CSV. Если построен
+    пространственно-временной индекс (или задана область, время или uuid — тогда он
+    строится один раз), читаются только блоки индекса, подходящие под условия
+
     Параметры:
         csv_file (str): Путь к CSV файлу
         vehicle_type (str): Тип транспорта (bus/minibus/tramway/trolleybus)
         route (str/int/None): Номер маршрута (опционально)
+        columns (list/None): Список нужных столбцов (по умолчанию все)
+        bbox (tuple/None): Область (min_lon, min_lat, max_lon, max_lat)
+        start, end (str/None): Интервал времени signal_time [start, end)
+        hours (tuple/None): Часы суток (с, до)
+        uuid (int/list/None): Идентификатор ТС или их список
 
     Возвращает:
         DataFrame: Отфильтрованные данные
     """
     try:
+        index_dir = st_index.default_index_path(csv_file)
+        has_conditions = any(value is not None for value in (bbox, start, end, hours, uuid))
+        if has_conditions or st_index.index_exists(index_dir):
+            index_dir = st_index.ensure_index(csv_file, index_dir)
+            return st_index.query(index_dir, bbox=bbox, start=start, end=end, hours=hours,
+                                  vehicle_type=vehicle_type, route=route, uuid=uuid, columns=columns)
+
+        store_dir = avl_store.default_store_path(csv_file)
+        if avl_store.store_exists(store_dir):
+            return avl_store.read_route(store_dir, vehicle_type, route, columns=columns)
+
         # Чтение CSV файла
         df = pd.read_csv(csv_file, low_memory=False)
 
@@ -27,6 +54,9 @@ def filter_transport_data(csv_file, vehicle_type, route=None):
         if route is not None:
             filtered = filtered[filtered['route'].astype(str) == str(route)]
 
+        if columns is not None:
+            filtered = filtered[columns]
+
         return filtered
 
     except Exception as e:
@@ -41,6 +71,13 @@ def parse_arguments():
                         choices=['bus', 'minibus', 'tramway', 'trolleybus'],
                         help='Тип транспорта для фильтрации')
     parser.add_argument('--route', help='Номер маршрута (опционально)')
+    parser.add_argument('--bbox', type=float, nargs=4, metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'),
+                        help='Только точки в области')
+    parser.add_argument('--start', help='Начало интервала времени (например, "2024-12-13 07:00")')
+    parser.add_argument('--end', help='Конец интервала времени (не включая)')
+    parser.add_argument('--hours', type=int, nargs=2, metavar=('FROM', 'TO'),
+                        help='Часы суток каждого дня, например 7 9 — с 7:00 до 9:00')
+    parser.add_argument('--uuid', type=int, nargs='+', help='Только эти ТС')
     return parser.parse_args()
 
 
@@ -53,16 +90,21 @@ def main():
     result = filter_transport_data(
         csv_file=csv_path,
         vehicle_type=args.vehicle_type,
-        route=args.route
+        route=args.route,
+        bbox=args.bbox,
+        start=args.start,
+        end=args.end,
+        hours=args.hours,
+        uuid=args.uuid
     )
 
     # Вывод результатов
     if not result.empty:
         print(f"Найдено записей: {len(result)}")
 
-        # Сохранение в файл
-        output_file = "../../sources/current_route/current_route.csv"
-        result.to_csv(output_file, index=False, sep=';')
+        # Сохранение в двоичный файл Arrow IPC: следующие этапы отображают его в память без разбора текста
+        output_file = avl_store.CURRENT_ROUTE_PATH
+        avl_store.write_current_route(result, output_file)
         print(f"Данные сохранены в {output_file}")
         sys.exit(0)  # Успешное завершение
     else:
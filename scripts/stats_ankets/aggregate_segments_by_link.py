@@ -0,0 +1,131 @@
+import argparse
+import os
+import sys
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from road_network import load_road_network, to_metric
+
+ROADS_SHP_PATH = '../../sources/UDS/Граф Иркутск_link.SHP'
+SEGMENTS_GEOJSON = '../../sources/stats_ankets/low_speed_segments.geojson'
+LINKS_TABLE = '../../sources/stats_ankets/low_speed_links.csv'
+SNAP_DISTANCE_M = 25  # м: сегменты дальше от дорог не привязываются
+LINK_COLUMNS = ['NO', 'length_m', 'segments', 'surveys', 'distance_m', 'mean_speed_kph']
+
+
+def read_survey_segments(geojson_path):
+    """Сегменты анкет (LineString) со скоростью, длиной и исходным GPX файлом"""
+    segments = gpd.read_file(geojson_path, columns=['speed_kph', 'distance_m', 'source_file'])
+    segments = segments[segments.geometry.notna() & ~segments.geometry.is_empty]
+    return segments.to_crs(epsg=4326).reset_index(drop=True)
+
+
+def assign_links(road_net, geoms, max_distance_m=SNAP_DISTANCE_M):
+    """
+    Привязка сегментов анкет к дорогам через STR-дерево метрических геометрий
+
+    Сегмент — отрезок между соседними точками трека (секунды движения), поэтому
+    он относится к той дороге, которая ближе всего к его середине
+
+    Параметры:
+        road_net (RoadNetwork): Дорожная сеть
+        geoms (np.ndarray): Геометрии сегментов (EPSG:4326)
+        max_distance_m (float): Наибольшее расстояние от середины сегмента до дороги, м
+
+    Возвращает:
+        np.ndarray: Индекс дороги для каждого сегмента (-1 — не привязан)
+    """
+    link = np.full(len(geoms), -1, dtype=np.int64)
+    if len(geoms) == 0:
+        return link
+    middle = shapely.get_coordinates(shapely.line_interpolate_point(geoms, 0.5, normalized=True))
+    x, y = to_metric(middle[:, 0], middle[:, 1])
+    segment_idx, link_idx = road_net.metric_tree.query_nearest(
+        shapely.points(x, y), max_distance=max_distance_m, all_matches=False)
+    link[segment_idx] = link_idx
+    return link
+
+
+def aggregate_by_link(road_net, segments, link):
+    """
+    Сводка сегментов анкет по дорогам
+
+    Параметры:
+        road_net (RoadNetwork): Дорожная сеть
+        segments (pd.DataFrame): Сегменты со столбцами speed_kph, distance_m, source_file
+        link (np.ndarray): Индекс дороги каждого сегмента (assign_links)
+
+    Возвращает:
+        pd.DataFrame: По строке на дорогу (индекс — номер дороги в road_net):
+            NO, length_m, segments — число сегментов, surveys — число анкет,
+            distance_m — их суммарная длина, mean_speed_kph — средняя скорость,
+            взвешенная по длине сегментов
+    """
+    matched = link >= 0
+    data = pd.DataFrame({
+        'link': link[matched],
+        'speed_kph': segments['speed_kph'].to_numpy()[matched],
+        'distance_m': segments['distance_m'].to_numpy()[matched],
+        'source_file': segments['source_file'].to_numpy()[matched],
+    })
+    data['weighted_speed'] = data['speed_kph'] * data['distance_m']
+    table = data.groupby('link').agg(
+        segments=('distance_m', 'size'),
+        surveys=('source_file', 'nunique'),
+        distance_m=('distance_m', 'sum'),
+        weighted_speed=('weighted_speed', 'sum'),
+        plain_speed=('speed_kph', 'mean'),
+    )
+    # Если все сегменты дороги нулевой длины, среднее по длине не определено — берем простое среднее
+    distance = table['distance_m'].to_numpy()
+    table['mean_speed_kph'] = np.where(
+        distance > 0,
+        table['weighted_speed'].to_numpy() / np.where(distance > 0, distance, 1),
+        table['plain_speed'].to_numpy(),
+    )
+    links = table.index.to_numpy()
+    table['NO'] = np.asarray(road_net.link_no)[links]
+    table['length_m'] = np.asarray(road_net.link_length_m)[links]
+    table.index.name = 'link'
+    return table[LINK_COLUMNS]
+
+
+def build_link_table(road_net, geojson_path=SEGMENTS_GEOJSON, output_csv=LINKS_TABLE):
+    """
+    Привязка всех сегментов анкет к дорогам и сохранение сводной таблицы по дорогам
+
+    Возвращает:
+        pd.DataFrame: Таблица aggregate_by_link
+    """
+    segments = read_survey_segments(geojson_path)
+    link = assign_links(road_net, segments.geometry.values)
+    table = aggregate_by_link(road_net, segments, link)
+    print(f"Сегментов: {len(segments)}, привязано к дорогам: {int((link >= 0).sum())}, дорог: {len(table)}")
+
+    os.makedirs(os.path.dirname(output_csv) or '.', exist_ok=True)
+    export = table.round({'length_m': 1, 'distance_m': 1, 'mean_speed_kph': 2})
+    export.to_csv(output_csv, sep=';', index=False)
+    print(f"Сводка по дорогам сохранена в {output_csv}")
+    return table
+
+
+def parse_arguments():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Сводка сегментов анкет с низкой скоростью по дорогам УДС')
+    parser.add_argument('--segments', default=SEGMENTS_GEOJSON, help='GeoJSON сегментов анкет')
+    parser.add_argument('--output', default=LINKS_TABLE, help='Таблица по дорогам (CSV)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    road_net = load_road_network(ROADS_SHP_PATH)
+    build_link_table(road_net, args.segments, args.output)
+
+
+if __name__ == "__main__":
+    main()
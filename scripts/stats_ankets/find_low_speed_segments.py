@@ -1,88 +1,89 @@
-import gpxpy
-from geopy.distance import distance
-from datetime import timedelta
 import json
 import sys
 import os
 from collections import defaultdict
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from gpx_reader import read_gpx, to_datetime
+from track_stats import low_speed_mask, segment_stats, track_summary
 
-def analyze_and_append_low_speed_segments(gpx_path, output_geojson_path):
+
+def segment_features(segments, source_file):
+    """
+    Признаки GeoJSON для отрезков трека
+
+    Параметры:
+        segments (pd.DataFrame): Отрезки (track_stats.segment_stats)
+        source_file (str): Имя GPX файла для свойств признаков
+
+    Возвращает:
+        list: Признаки LineString со скоростью, длиной и временем отрезка
+    """
+    columns = [segments[column].tolist() for column in (
+        'start_lon', 'start_lat', 'end_lon', 'end_lat',
+        'speed_kmh', 'distance_m', 'time_sec', 'start_time', 'end_time')]
+    return [
+        {
+            'type': 'Feature',
+            'geometry': {
+                'type': 'LineString',
+                'coordinates': [[start_lon, start_lat], [end_lon, end_lat]]
+            },
+            'properties': {
+                'speed_kph': speed,
+                'distance_m': dist,
+                'time_sec': time_sec,
+                'start_time': to_datetime(start_time).isoformat(),
+                'end_time': to_datetime(end_time).isoformat(),
+                'source_file': source_file
+            }
+        }
+        for start_lon, start_lat, end_lon, end_lat, speed, dist, time_sec, start_time, end_time in zip(*columns)
+    ]
+
+
+def analyze_low_speed_segments(gpx_path, distance_method='ellipsoidal'):
+    """
+    Анализирует GPX файл: итоги трека и участки с низкой скоростью
+
+    Параметры:
+        gpx_path (str): Путь к GPX файлу
+        distance_method (str): Способ расчета расстояний (track_stats.DISTANCE_METHODS),
+            geodesic — точный, для проверки
+
+    Возвращает:
+        tuple: (итоги трека — total_distance, total_time_sec, avg_speed,
+            low_speed_threshold, low_speed_segments_count; признаки GeoJSON участков)
+    """
+    # Потоковое чтение точек трека и векторный расчет всех отрезков
+    segments = segment_stats(read_gpx(gpx_path), method=distance_method)
+    summary = track_summary(segments)
+
+    # Признаки GeoJSON строятся только для участков медленнее порога (50% от средней)
+    low_speed = segments[low_speed_mask(segments, summary['low_speed_threshold'])]
+    features = segment_features(low_speed, os.path.basename(gpx_path))
+    return {**summary, 'low_speed_segments_count': len(features)}, features
+
+
+def analyze_and_append_low_speed_segments(gpx_path, output_geojson_path, distance_method='ellipsoidal'):
     """
     Анализирует GPX файл и добавляет участки с низкой скоростью в GeoJSON
 
+    Для одного файла; каталог анкет обрабатывается через хранилище
+    segment_store (iteration_all_ankets.process_gpx_directory)
+
     Параметры:
         gpx_path (str): Путь к GPX файлу
         output_geojson_path (str): Путь к GeoJSON файлу для сохранения (будет создан или дополнен)
+        distance_method (str): Способ расчета расстояний (track_stats.DISTANCE_METHODS)
 
     Возвращает:
         dict: Результаты анализа
     """
-    # Чтение GPX файла
-    with open(gpx_path, encoding='utf-8') as gpx_file:
-        gpx = gpxpy.parse(gpx_file)
-
-    # Собираем все точки трека
-    points = []
-    for track in gpx.tracks:
-        for segment in track.segments:
-            for point in segment.points:
-                points.append({
-                    'latitude': point.latitude,
-                    'longitude': point.longitude,
-                    'time': point.time,
-                    'elevation': point.elevation
-                })
-
-    # Расчет статистики
-    total_distance = 0.0
-    total_time = timedelta()
-    segments = []
-
-    # Рассчитываем параметры для каждого сегмента
-    for i in range(1, len(points)):
-        prev = points[i - 1]
-        curr = points[i]
-
-        dist = distance(
-            (prev['latitude'], prev['longitude']),
-            (curr['latitude'], curr['longitude'])
-        ).meters
-
-        time_diff = curr['time'] - prev['time']
-
-        if time_diff.total_seconds() > 0:
-            speed = (dist / time_diff.total_seconds()) * 3.6  # км/ч
-            total_distance += dist
-            total_time += time_diff
-
-            segments.append({
-                'type': 'Feature',
-                'geometry': {
-                    'type': 'LineString',
-                    'coordinates': [
-                        [prev['longitude'], prev['latitude']],
-                        [curr['longitude'], curr['latitude']]
-                    ]
-                },
-                'properties': {
-                    'speed_kph': speed,
-                    'distance_m': dist,
-                    'time_sec': time_diff.total_seconds(),
-                    'start_time': prev['time'].isoformat(),
-                    'end_time': curr['time'].isoformat(),
-                    'source_file': os.path.basename(gpx_path)
-                }
-            })
-
-    # Расчет средней скорости
-    avg_speed = (total_distance / total_time.total_seconds()) * 3.6 if total_time.total_seconds() > 0 else 0
-
-    # Определение порога для "низкой скорости" (50% от средней)
-    low_speed_threshold = avg_speed * 0.5
-
-    # Фильтрация сегментов с низкой скоростью
-    low_speed_features = [seg for seg in segments if seg['properties']['speed_kph'] < low_speed_threshold]
+    summary, low_speed_features = analyze_low_speed_segments(gpx_path, distance_method)
+    total_distance = summary['total_distance']
+    avg_speed = summary['avg_speed']
+    low_speed_threshold = summary['low_speed_threshold']
 
     # Загрузка существующего GeoJSON или создание нового
     if os.path.exists(output_geojson_path):
@@ -115,7 +116,7 @@ def analyze_and_append_low_speed_segments(gpx_path, output_geojson_path):
     geojson['features'].extend(low_speed_features)
     geojson['properties']['sources_processed'].append(os.path.basename(gpx_path))
     geojson['properties']['total_distance_m'] += total_distance
-    geojson['properties']['total_time_sec'] += total_time.total_seconds()
+    geojson['properties']['total_time_sec'] += summary['total_time_sec']
     geojson['properties']['last_avg_speed_kph'] = avg_speed
     geojson['properties']['last_low_speed_threshold_kph'] = low_speed_threshold
 
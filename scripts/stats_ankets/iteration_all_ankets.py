@@ -1,62 +1,143 @@
-import json
+import argparse
 import os
-from find_low_speed_segments import analyze_and_append_low_speed_segments
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from find_low_speed_segments import analyze_low_speed_segments
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from segment_store import SegmentStore, default_store_path
+
+
+def iter_gpx_files(root_dir):
+    """Пути ко всем GPX файлам директории и её поддиректорий (в порядке обхода os.walk)"""
+    for root, dirs, files in os.walk(root_dir):
+        for file in files:
+            if file.lower().endswith('.gpx'):
+                yield os.path.join(root, file)
+
+
+def analyze_files(gpx_paths, distance_method='ellipsoidal', workers=1):
+    """
+    Анализ GPX файлов: последовательно или пулом процессов
+
+    Каждый файл считается независимо, результаты отдаются в порядке gpx_paths
+    независимо от того, какой процесс закончил первым
+
+    Параметры:
+        gpx_paths (list): Пути к GPX файлам
+        distance_method (str): Способ расчета расстояний (track_stats.DISTANCE_METHODS)
+        workers (int): Число процессов (1 — без пула)
+
+    Возвращает:
+        generator: (итоги, признаки, None) или (None, None, ошибка) для каждого файла
+    """
+    if workers <= 1 or len(gpx_paths) <= 1:
+        for gpx_path in gpx_paths:
+            try:
+                yield (*analyze_low_speed_segments(gpx_path, distance_method), None)
+            except Exception as e:
+                yield None, None, e
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(gpx_paths))) as executor:
+        futures = [executor.submit(analyze_low_speed_segments, gpx_path, distance_method)
+                   for gpx_path in gpx_paths]
+        for future in futures:
+            try:
+                yield (*future.result(), None)
+            except Exception as e:
+                yield None, None, e
 
-def clear_geojson_file(file_path):
-    """Очищает GeoJSON файл, оставляя только базовую структуру"""
-    empty_geojson = {
-        "type": "FeatureCollection",
-        "features": []
-    }
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(empty_geojson, f, ensure_ascii=False, indent=4)
-    print(f"Файл {file_path} очищен")
 
-def process_gpx_directory(root_dir, output_geojson):
+def process_gpx_directory(root_dir, output_geojson, store_dir=None, distance_method='ellipsoidal', workers=1):
     """
     Рекурсивно обрабатывает все GPX файлы в директории и её поддиректориях
 
+    Результаты каждого файла сохраняются в хранилище segment_store, поэтому при
+    повторном запуске обрабатываются только новые и измененные файлы. Файлы
+    можно считать в несколько процессов: в хранилище результаты записывает
+    только основной процесс в порядке обхода директории, так что итоговый
+    GeoJSON не зависит от числа процессов. Итоговый GeoJSON собирается из
+    хранилища один раз в конце
+
     Параметры:
         root_dir (str): Корневая директория для поиска GPX файлов
         output_geojson (str): Путь к выходному GeoJSON файлу
+        store_dir (str): Каталог хранилища (по умолчанию рядом с выходным файлом)
+        distance_method (str): Способ расчета расстояний (track_stats.DISTANCE_METHODS)
+        workers (int): Число процессов для анализа файлов
+
+    Возвращает:
+        dict: Итоги — processed, unchanged, failed (число файлов), segments,
+            changed (изменился ли итоговый GeoJSON)
     """
-    # Очищаем выходной файл перед началом обработки
-    if os.path.exists(output_geojson):
-        clear_geojson_file(output_geojson)
-    else:
-        # Создаем пустой файл, если его нет
-        with open(output_geojson, 'w', encoding='utf-8') as f:
-            json.dump({
-                "type": "FeatureCollection",
-                "features": []
-            }, f, ensure_ascii=False, indent=4)
+    store = SegmentStore(store_dir or default_store_path(output_geojson), distance_method)
 
-    total_files = 0
-    total_segments = 0
+    keys = []
+    pending = []
+    unchanged = 0
+    failed = 0
 
-    # Рекурсивный обход директории
-    for root, dirs, files in os.walk(root_dir):
-        for file in files:
-            if file.lower().endswith('.gpx'):
-                gpx_path = os.path.join(root, file)
-                try:
-                    # Обработка каждого GPX файла
-                    result = analyze_and_append_low_speed_segments(gpx_path, output_geojson)
-                    total_files += 1
-                    total_segments += result['low_speed_segments_count']
-
-                    print(f"Обработан: {gpx_path}")
-                    print(f"  Добавлено сегментов: {result['low_speed_segments_count']}")
-                    print(f"  Средняя скорость: {result['avg_speed']:.1f} км/ч")
-                except Exception as e:
-                    print(f"Ошибка при обработке {gpx_path}: {str(e)}")
+    for gpx_path in iter_gpx_files(root_dir):
+        key = os.path.relpath(gpx_path, root_dir)
+        keys.append(key)
+        try:
+            if store.needs_update(key, gpx_path):
+                pending.append((key, gpx_path))
+            else:
+                unchanged += 1
+        except Exception as e:
+            store.discard(key)
+            failed += 1
+            print(f"Ошибка при обработке {gpx_path}: {str(e)}")
+
+    # Анализ новых и измененных GPX файлов
+    if workers > 1 and len(pending) > 1:
+        print(f"Файлов для обработки: {len(pending)}, процессов: {min(workers, len(pending))}")
+    processed = 0
+    results = analyze_files([gpx_path for _, gpx_path in pending], distance_method, workers)
+    for (key, gpx_path), (result, features, error) in zip(pending, results):
+        if error is not None:
+            store.discard(key)
+            failed += 1
+            print(f"Ошибка при обработке {gpx_path}: {str(error)}")
+            continue
+        store.put(key, result, features)
+        processed += 1
+
+        print(f"Обработан: {gpx_path}")
+        print(f"  Добавлено сегментов: {result['low_speed_segments_count']}")
+        print(f"  Средняя скорость: {result['avg_speed']:.1f} км/ч")
+
+    # Файлы, удаленные из директории, убираются из хранилища
+    store.prune(keys)
+    store.save()
+    changed = store.changed or not os.path.exists(output_geojson)
+    if changed:
+        total_segments = store.materialize(keys, output_geojson)
+    else:
+        total_segments = sum(store.files[key]['segments'] for key in keys if key in store.files)
 
     # Итоговая статистика
     print("\n=== Итоговая статистика ===")
-    print(f"Всего обработано GPX файлов: {total_files}")
-    print(f"Всего добавлено сегментов: {total_segments}")
-    print(f"Итоговый файл: {output_geojson}")
+    print(f"Обработано GPX файлов: {processed}, без изменений: {unchanged}, с ошибками: {failed}")
+    print(f"Всего сегментов: {total_segments}")
+    print(f"Итоговый файл: {output_geojson}" + ("" if changed else " (не изменился)"))
+
+    return {
+        'processed': processed,
+        'unchanged': unchanged,
+        'failed': failed,
+        'segments': total_segments,
+        'changed': changed,
+    }
+
+
+def parse_arguments():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Участки с низкой скоростью по всем GPX файлам анкет')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Число процессов')
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
@@ -67,4 +148,5 @@ if __name__ == "__main__":
     output_geojson_file = "../../sources/stats_ankets/low_speed_segments.geojson"
 
     # Запуск обработки
-    process_gpx_directory(root_directory, output_geojson_file)
\ No newline at end of file
+    args = parse_arguments()
+    process_gpx_directory(root_directory, output_geojson_file, workers=args.workers)
@@ -1,40 +1,64 @@
 import folium
 import webbrowser
-import json
-import geopandas as gpd
+import os
+import sys
+import numpy as np
+import pandas as pd
 import iteration_all_ankets
-
-
-def display_geojson_segments(geojson_path, uds_geojson_path):
+from aggregate_segments_by_link import build_link_table
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from map_layers import LineLayer, TiledGeoJson
+from road_network import load_road_network
+from tile_store import archive_layers, ensure_tile_server
+
+TILES_ARCHIVE = '../../sources/tiles/tiles.sqlite'
+ROADS_SHP_PATH = '../../sources/UDS/Граф Иркутск_link.SHP'
+# Скоростные диапазоны: (название слоя, нижняя граница, верхняя граница, цвет)
+SPEED_GROUPS = [
+    ('< 5 км/ч', 0, 5, 'red'),
+    ('5-10 км/ч', 5, 10, 'orange'),
+    ('10-20 км/ч', 10, 20, 'green'),
+]
+
+
+def add_road_layer(m, road_net, tile_server, layer_info=None):
+    """Фоновый слой УДС: тайлы с локального сервера (масштабы — из описания слоя в архиве) или геометрия из дорожной сети"""
+    if tile_server:
+        TiledGeoJson(
+            tile_server, 'roads',
+            name='Улично-дорожная сеть',
+            color='blue', weight=1, opacity=0.6,
+            popup={'NO': 'Звено', 'length_m': 'Длина, м'},
+            layer_info=layer_info,
+            show=False
+        ).add_to(m)
+    else:
+        LineLayer(
+            np.split(np.asarray(road_net.link_coords), np.asarray(road_net.link_offsets)[1:-1]),
+            name='Улично-дорожная сеть',
+            color='blue', weight=1, opacity=0.6,
+            show=False
+        ).add_to(m)
+
+
+def display_link_speeds(link_table, road_net):
     """
-    Отображает сегменты треков из GeoJSON файла с возможностью наложения и отключения графа УДС
-    """
-    # Загрузка GeoJSON данных треков
-    try:
-        with open(geojson_path, 'r', encoding='utf-8') as f:
-            geojson_data = json.load(f)
-
-        if not geojson_data.get('features'):
-            print("В GeoJSON файле треков нет данных для отображения")
-            return
-    except Exception as e:
-        print(f"Ошибка загрузки файла треков: {str(e)}")
-        return
+    Отображает дороги УДС с сегментами анкет с низкой скоростью, раскрашенные
+    по средней скорости на дороге, с возможностью отключения графа УДС
 
-    # Определяем границы всех сегментов
-    all_coords = []
-    for feature in geojson_data['features']:
-        if feature['geometry']['type'] == 'LineString':
-            all_coords.extend(feature['geometry']['coordinates'])
-
-    if not all_coords:
-        print("Нет координат для отображения")
+    Параметры:
+        link_table (pd.DataFrame): Сводка по дорогам (aggregate_segments_by_link.aggregate_by_link)
+        road_net (RoadNetwork): Дорожная сеть
+    """
+    if link_table.empty:
+        print("Нет сегментов, привязанных к дорогам, для отображения")
         return
 
-    # Автоматическое определение центра карты
-    lats = [coord[1] for coord in all_coords]
-    lons = [coord[0] for coord in all_coords]
-    center = [sum(lats) / len(lats), sum(lons) / len(lons)]
+    # Автоматическое определение центра карты по вершинам дорог со сводкой
+    links = link_table.index.to_numpy()
+    coords = np.concatenate([road_net.link_geometry(link) for link in links])
+    center = [float(coords[:, 1].mean()), float(coords[:, 0].mean())]
 
     # 1. Создаем карту БЕЗ автоматической подложки
     m = folium.Map(location=center, zoom_start=13, tiles=None, control_scale=True)
@@ -48,62 +72,38 @@ def display_geojson_segments(geojson_path, uds_geojson_path):
         show=True
     ).add_to(m)
 
-    # 3. Добавляем граф УДС
-    roads = gpd.read_file(uds_geojson_path).to_crs(epsg=4326)
-    folium.GeoJson(
-        roads,
-        name='Улично-дорожная сеть',
-        style_function=lambda feat: {
-            "color": "blue",
-            "weight": 1,
-            "opacity": 0.6
-        },
-        overlay=True,
-        control=True,
-        show=False
-    ).add_to(m)
-
-    # Создаем группы слоев для треков
-    speed_under_5 = folium.FeatureGroup(name='< 5 км/ч', show=True)
-    speed_5_to_10 = folium.FeatureGroup(name='5-10 км/ч', show=True)
-    speed_10_to_20 = folium.FeatureGroup(name='10-20 км/ч', show=True)
-
-    # Добавляем сегменты в соответствующие группы
-    for feature in geojson_data['features']:
-        if feature['geometry']['type'] == 'LineString':
-            speed = feature['properties'].get('speed_kph', 0)
-
-            if speed < 5:
-                color = 'red'
-                layer = speed_under_5
-            elif speed < 10:
-                color = 'orange'
-                layer = speed_5_to_10
-            elif speed < 20:
-                color = 'green'
-                layer = speed_10_to_20
-            else:
-                continue
-
-            folium.PolyLine(
-                locations=[(lat, lon) for lon, lat in feature['geometry']['coordinates']],
-                color=color,
-                weight=5,
-                opacity=0.8,
-                popup=f"Скорость: {speed:.1f} км/ч"
-            ).add_to(layer)
-
-    # Добавляем группы треков на карту
-    speed_under_5.add_to(m)
-    speed_5_to_10.add_to(m)
-    speed_10_to_20.add_to(m)
+    # 3. УДС: при наличии архива тайлов — с локального сервера тайлов, иначе встраивается в HTML
+    layers = archive_layers(TILES_ARCHIVE)
+    tile_server = ensure_tile_server(TILES_ARCHIVE) if 'roads' in layers else None
+    add_road_layer(m, road_net, tile_server, layers.get('roads'))
+
+    # 4. Дороги со сводкой сегментов анкет по скоростным диапазонам: по линии на дорогу
+    speed = link_table['mean_speed_kph'].to_numpy()
+    for name, low, high, color in SPEED_GROUPS:
+        group = link_table[(speed >= low) & (speed < high)]
+        if group.empty:
+            continue
+        LineLayer(
+            [road_net.link_geometry(link) for link in group.index],
+            name=name,
+            color=color,
+            popup=pd.DataFrame({
+                'Звено': group['NO'].to_numpy(),
+                'Средняя скорость, км/ч': group['mean_speed_kph'].round(1).to_numpy(),
+                'Сегментов': group['segments'].to_numpy(),
+                'Анкет': group['surveys'].to_numpy(),
+                'Длина сегментов, м': group['distance_m'].round(1).to_numpy(),
+            }),
+            weight=5, opacity=0.8,
+            show=True
+        ).add_to(m)
 
     # Добавляем легенду
     legend_html = '''
     <div style="
-        position: fixed; 
-        bottom: 50px; 
-        left: 50px; 
+        position: fixed;
+        bottom: 50px;
+        left: 50px;
         width: 200px;
         background-color: white;
         border: 2px solid grey;
@@ -111,7 +111,7 @@ def display_geojson_segments(geojson_path, uds_geojson_path):
         font-size: 14px;
         padding: 10px;
     ">
-        <b>Скоростные диапазоны</b><br>
+        <b>Средняя скорость на звене</b><br>
         <i style="background:red; width:15px; height:15px; display:inline-block;"></i> < 5 км/ч<br>
         <i style="background:orange; width:15px; height:15px; display:inline-block;"></i> 5-10 км/ч<br>
         <i style="background:green; width:15px; height:15px; display:inline-block;"></i> 10-20 км/ч
@@ -129,17 +129,21 @@ def display_geojson_segments(geojson_path, uds_geojson_path):
     print(f"Карта сохранена в {output_file}")
 
 
-# Пример использования
-if __name__ == "__main__":
+def main():
+    """Пересчет сегментов по всем анкетам, сводка по дорогам и отображение ее на карте с УДС"""
     # Укажите параметры
     root_directory = "../../sources/geotracks_ankets/"
     output_geojson_file = "../../sources/stats_ankets/low_speed_segments.geojson"
     # Вызов функции
     iteration_all_ankets.process_gpx_directory(root_directory, output_geojson_file)
 
-    # Укажите пути к файлам
-    geojson_file = "../../sources/stats_ankets/low_speed_segments.geojson"
-    uds_file = "../../sources/UDS/Граф Иркутск_link_geojson.geojson"
+    # Привязка сегментов к дорогам и сводка по дорогам
+    road_net = load_road_network(ROADS_SHP_PATH)
+    link_table = build_link_table(road_net, output_geojson_file)
 
     # Вызов функции с наложением графа УДС
-    display_geojson_segments(geojson_file, uds_file)
\ No newline at end of file
+    display_link_speeds(link_table, road_net)
+
+
+if __name__ == "__main__":
+    main()
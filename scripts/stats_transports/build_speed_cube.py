@@ -0,0 +1,122 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import avl_store
+from route_batch import (CSV_PATH, ROADS_SHP_PATH, ensure_store, init_worker, prepare_routing, select_routes,
+                         take_cache_entries, worker)
+from route_cache import load_route_cache
+from route_pipeline import IQR_MULTIPLIER, MAX_SEGMENT_DISTANCE_M, filter_speed_outliers, link_speed_observations
+from routing import Router
+from speed_cube import CUBE_DIR, SpeedCube
+
+READ_COLUMNS = ['uuid', 'signal_time', 'lat', 'lon', 'speed']
+
+
+def observations(df, road_net, route_cache=None, router=None):
+    """
+    Наблюдения скорости на дорогах по точкам одного маршрута: та же очистка
+    и IQR-фильтр, что в douwload_speed_tracks.py
+
+    Возвращает:
+        dict: Массивы link, hour, day_type, speed_kmh (route_pipeline.link_speed_observations)
+    """
+    df = df.dropna(subset=['lat', 'lon', 'speed', 'signal_time'])
+    df = filter_speed_outliers(df, IQR_MULTIPLIER)
+    return link_speed_observations(df, road_net, route_cache=route_cache, router=router,
+                                   max_distance_m=MAX_SEGMENT_DISTANCE_M)
+
+
+def route_observations(store_dir, vehicle_type, route):
+    """
+    Наблюдения одного маршрута в процессе-исполнителе
+
+    Возвращает:
+        tuple: (тип транспорта, маршрут, наблюдения или None, текст ошибки или None,
+            новые записи кэша маршрутов для основного процесса)
+    """
+    result, error = None, None
+    try:
+        df = avl_store.read_route(store_dir, vehicle_type, route, columns=READ_COLUMNS)
+        if df.empty:
+            error = 'нет данных'
+        else:
+            result = observations(df, worker['road_net'], worker['route_cache'], worker['router'])
+    except Exception as e:
+        error = str(e)
+    return vehicle_type, route, result, error, take_cache_entries()
+
+
+def parse_arguments():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(
+        description='Куб скоростей «дорога × час суток × тип дня» по привязанным к сети трекам AVL'
+    )
+    parser.add_argument('routes', nargs='*',
+                        help='Маршруты вида <тип>:<маршрут> или all — все из routes.json; '
+                             'без аргументов — выбранный маршрут (current_route)')
+    parser.add_argument('--csv', default=CSV_PATH, help='Месячный CSV с AVL-данными')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Число процессов')
+    parser.add_argument('--output', default=CUBE_DIR, help='Каталог куба')
+    parser.add_argument('--update', action='store_true',
+                        help='Добавить наблюдения к существующему кубу (например, следующий месяц)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    start = time.perf_counter()
+
+    road_net = prepare_routing(ROADS_SHP_PATH)
+    if args.update and os.path.exists(os.path.join(args.output, 'meta.json')):
+        cube = SpeedCube.load(args.output, mmap=False)
+        if not cube.matches(road_net):
+            print("Куб построен по другой дорожной сети: для обновления его нужно построить заново",
+                  file=sys.stderr)
+            sys.exit(1)
+    else:
+        cube = SpeedCube.empty(road_net)
+
+    if not args.routes:
+        # Выбранный маршрут (extract_type_route.py) — в этом процессе
+        print("Привязка треков выбранного маршрута к дорогам...")
+        df = avl_store.read_current_route(columns=READ_COLUMNS)
+        route_cache = load_route_cache(road_net)
+        result = observations(df, road_net, route_cache, Router(road_net, mode='ch'))
+        route_cache.save()
+        cube.add(result['link'], result['hour'], result['day_type'], result['speed_kmh'])
+        print(f"  Наблюдений: {len(result['link'])}")
+    else:
+        routes = select_routes(args.routes)
+        store_dir = ensure_store(args.csv)
+
+        route_cache = load_route_cache(road_net)
+        print(f"Маршрутов: {len(routes)}, процессов: {args.workers}")
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                 initargs=(ROADS_SHP_PATH,)) as executor:
+            futures = [executor.submit(route_observations, store_dir, vehicle_type, route)
+                       for vehicle_type, route in routes]
+            # Наблюдения складываются в куб только в основном процессе
+            for future in futures:
+                vehicle_type, route, result, error, cache_entries = future.result()
+                route_cache.merge(cache_entries)
+                if error is not None:
+                    print(f"  {vehicle_type} {route}: ошибка — {error}")
+                    continue
+                cube.add(result['link'], result['hour'], result['day_type'], result['speed_kmh'])
+                print(f"  {vehicle_type} {route}: наблюдений {len(result['link'])}")
+        # Записи кэша маршрутов всех процессов сохраняются один раз из основного процесса
+        route_cache.save()
+
+    cube.save(args.output)
+    covered = int((cube.counts.sum(axis=(1, 2)) > 0).sum())
+    print(f"Наблюдений в кубе: {cube.count}, дорог с наблюдениями: {covered} из {cube.n_links}")
+    print(f"Куб скоростей сохранён в «{args.output}»")
+    print(f"Готово за {time.perf_counter() - start:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
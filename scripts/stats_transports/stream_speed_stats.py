@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import avl_store
+from quantile_sketch import SpeedSketch
+from route_pipeline import IQR_MULTIPLIER
+
+CSV_PATH = '../../sources/geotracks_transports/december.csv'
+OUTPUT_JSON = 'month_uuid_avg_speeds.json'
+COLUMNS = ['vehicle_type', 'route', 'uuid', 'lat', 'lon', 'speed', 'signal_time']
+GROUP_COLUMNS = ['vehicle_type', 'route']
+
+
+def _clean(chunk):
+    """Точки с координатами, скоростью и временем; скорость в км/ч"""
+    chunk = chunk.dropna(subset=['lat', 'lon', 'speed', 'signal_time'])
+    return chunk.assign(speed_kmh=chunk['speed'].to_numpy(dtype=np.float64) * 3.6)
+
+
+def _iter_chunks(sources, block_size):
+    for source in sources:
+        for chunk in avl_store.iter_batches(source, COLUMNS, block_size=block_size):
+            chunk = _clean(chunk)
+            if len(chunk):
+                yield chunk
+
+
+def build_sketches(sources, block_size=avl_store.CSV_BLOCK_SIZE):
+    """
+    Первый проход: эскизы распределения скорости по каждому маршруту
+
+    Возвращает:
+        tuple: ({(тип транспорта, маршрут): SpeedSketch}, общий SpeedSketch — объединение всех)
+    """
+    sketches = defaultdict(SpeedSketch)
+    for chunk in _iter_chunks(sources, block_size):
+        speed = chunk['speed_kmh'].to_numpy()
+        for key, idx in chunk.groupby(GROUP_COLUMNS, sort=False).indices.items():
+            sketches[key].update(speed[idx])
+    total = SpeedSketch()
+    for sketch in sketches.values():
+        total.merge(sketch)
+    return dict(sketches), total
+
+
+def filtered_uuid_speeds(sources, bounds, block_size=avl_store.CSV_BLOCK_SIZE):
+    """
+    Второй проход: IQR-фильтр по границам маршрута и накопление суммы и числа
+    скоростей по каждому ТС. Размер накопителя — число пар (маршрут, ТС), а не точек;
+    маршрут — тип транспорта и номер, как у границ фильтра
+
+    Параметры:
+        sources (list): Источники AVL-данных (CSV или колоночные хранилища)
+        bounds (dict): {(тип транспорта, маршрут): (нижняя, верхняя граница скорости, км/ч)}
+
+    Возвращает:
+        pd.DataFrame: sum, count скоростей по (vehicle_type, route, uuid)
+    """
+    totals = None
+    keys = list(bounds)
+    lower = np.array([bounds[key][0] for key in keys] + [np.nan])
+    upper = np.array([bounds[key][1] for key in keys] + [np.nan])
+    key_index = pd.MultiIndex.from_tuples(keys, names=GROUP_COLUMNS) if keys else None
+    for chunk in _iter_chunks(sources, block_size):
+        # Номер маршрута каждой точки в списке границ (-1 — маршрута нет в первом проходе)
+        position = np.full(len(chunk), -1)
+        if keys:
+            position = key_index.get_indexer(pd.MultiIndex.from_frame(chunk[GROUP_COLUMNS]))
+        speed = chunk['speed_kmh'].to_numpy()
+        keep = (speed >= lower[position]) & (speed <= upper[position])
+        part = chunk[keep].groupby(GROUP_COLUMNS + ['uuid'])['speed_kmh'].agg(['sum', 'count'])
+        totals = part if totals is None else totals.add(part, fill_value=0)
+    return totals
+
+
+def uuid_speeds_json(totals):
+    """
+    Средняя скорость каждого ТС по маршрутам в формате route_pipeline.route_uuid_avg_speeds,
+    но с ключом маршрута <тип транспорта>_<маршрут> (bus_10): в месячных данных
+    номера маршрутов разных типов транспорта совпадают
+    """
+    nested_routes = defaultdict(dict)
+    max_speed = 0
+    if totals is not None:
+        means = totals['sum'] / totals['count']
+        for (vehicle_type, route, uuid), mean_speed in means.items():
+            max_speed = max(max_speed, mean_speed)
+            nested_routes[f'{vehicle_type}_{route}'][str(uuid)] = {
+                'speed': round(mean_speed, 2)
+            }
+    return {
+        "max_speed_kmh": round(max_speed, 2),
+        "routes": nested_routes
+    }
+
+
+def parse_arguments():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(
+        description='Средние скорости ТС по месячным AVL-данным потоково: IQR-фильтр по эскизам квантилей'
+    )
+    parser.add_argument('sources', nargs='*', default=[CSV_PATH],
+                        help='CSV или колоночные хранилища (несколько месяцев — несколько путей)')
+    parser.add_argument('--scope', choices=['route', 'global'], default='route',
+                        help='Границы IQR-фильтра: по каждому маршруту или общие')
+    parser.add_argument('--multiplier', type=float, default=IQR_MULTIPLIER, help='Множитель IQR')
+    parser.add_argument('--block-size', type=int, default=avl_store.CSV_BLOCK_SIZE,
+                        help='Байт CSV на один пакет')
+    parser.add_argument('--output', default=OUTPUT_JSON, help='JSON со средними скоростями')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    start = time.perf_counter()
+
+    print("Проход 1: эскизы распределения скорости...")
+    sketches, total = build_sketches(args.sources, args.block_size)
+    if args.scope == 'global':
+        bounds = {key: total.iqr_bounds(args.multiplier) for key in sketches}
+    else:
+        bounds = {key: sketch.iqr_bounds(args.multiplier) for key, sketch in sketches.items()}
+    low, high = total.iqr_bounds(args.multiplier)
+    print(f"Точек: {total.count}, маршрутов: {len(sketches)}, "
+          f"общие границы скорости: {low:.1f}–{high:.1f} км/ч")
+
+    print("Проход 2: фильтр выбросов и средние скорости ТС...")
+    totals = filtered_uuid_speeds(args.sources, bounds, args.block_size)
+    result = uuid_speeds_json(totals)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    kept = int(totals['count'].sum()) if totals is not None else 0
+    print(f"После фильтра точек: {kept} из {total.count}")
+    print(f"JSON со средней скоростью по маршрутам и UUID сохранён в «{args.output}»")
+    print(f"Готово за {time.perf_counter() - start:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
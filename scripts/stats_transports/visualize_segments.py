@@ -1,10 +1,18 @@
 import folium
 import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from map_layers import TiledGeoJson
+from tile_store import archive_layers, ensure_tile_server
 
 # Пути к файлам
 GEOJSON_PATH = 'segments_yellow_red_on_roads.geojson'
 SPEED_STATS_PATH = 'route_uuid_avg_speeds.json'
 OUTPUT_HTML = 'segments_speed_groups_map.html'
+TILES_ARCHIVE = '../../sources/tiles/tiles.sqlite'
+TILES_LAYER = 'transport_segments'
 
 # Загружаем максимальную скорость из JSON
 with open(SPEED_STATS_PATH, 'r', encoding='utf-8') as f:
@@ -16,56 +24,81 @@ yellow_upper = max_speed / 2
 yellow_lower = yellow_upper / 2
 print(f"Диапазоны: красный = 0–{yellow_lower:.2f}, жёлтый = {yellow_lower:.2f}–{yellow_upper:.2f} км/ч")
 
-# Загружаем GeoJSON
-with open(GEOJSON_PATH, 'r', encoding='utf-8') as f:
-    geojson_data = json.load(f)
-
-# Центр карты
-lats = []
-lons = []
-for feature in geojson_data['features']:
-    coords = feature['geometry']['coordinates']
-    for lon, lat in coords:
-        lats.append(lat)
-        lons.append(lon)
-center = [sum(lats) / len(lats), sum(lons) / len(lons)]
-
-# Создаём карту
-m = folium.Map(location=center, zoom_start=12, tiles='OpenStreetMap')
-
-# Группы по скорости
-speed_red = folium.FeatureGroup(name=f'0–{yellow_lower:.1f} км/ч (красный)', show=True)
-speed_yellow = folium.FeatureGroup(name=f'{yellow_lower:.1f}–{yellow_upper:.1f} км/ч (жёлтый)', show=True)
-
-# Добавляем сегменты
-for feature in geojson_data['features']:
-    if feature['geometry']['type'] != 'LineString':
-        continue
-
-    coords = feature['geometry']['coordinates']
-    path = [(lat, lon) for lon, lat in coords]
-    speed = feature['properties'].get('speed_kmh', 0)
-
-    if speed < yellow_lower:
-        color = 'red'
-        layer = speed_red
-    elif speed < yellow_upper:
-        color = 'yellow'
-        layer = speed_yellow
-    else:
-        continue
-
-    folium.PolyLine(
-        locations=path,
-        color=color,
-        weight=5,
-        opacity=0.8,
-        popup=folium.Popup(f"Скорость: {speed:.1f} км/ч", parse_html=True)
-    ).add_to(layer)
-
-# Добавляем группы
-speed_red.add_to(m)
-speed_yellow.add_to(m)
+# Сегменты — тайлами с локального сервера, если слой нарезан из текущего GeoJSON (build_tiles.py)
+layer_info = archive_layers(TILES_ARCHIVE).get(TILES_LAYER)
+tile_server = None
+if layer_info and os.path.getmtime(TILES_ARCHIVE) >= os.path.getmtime(GEOJSON_PATH):
+    tile_server = ensure_tile_server(TILES_ARCHIVE)
+
+if tile_server:
+    lon_min, lat_min, lon_max, lat_max = layer_info['bounds']
+    center = [(lat_min + lat_max) / 2, (lon_min + lon_max) / 2]
+    m = folium.Map(location=center, zoom_start=12, tiles='OpenStreetMap')
+    # Группа по скорости — отдельный слой тайлов с фильтром по диапазону speed_kmh
+    for name, low, high in ((f'0–{yellow_lower:.1f} км/ч (красный)', 0, yellow_lower),
+                            (f'{yellow_lower:.1f}–{yellow_upper:.1f} км/ч (жёлтый)', yellow_lower, yellow_upper)):
+        TiledGeoJson(
+            tile_server, TILES_LAYER,
+            name=name,
+            color_property='speed_kmh',
+            palette=['red', 'yellow'],
+            breaks=[yellow_lower],
+            value_range=(low, high),
+            popup={'speed_kmh': 'Скорость, км/ч'},
+            layer_info=layer_info,
+            weight=5, opacity=0.8,
+        ).add_to(m)
+else:
+    # Загружаем GeoJSON
+    with open(GEOJSON_PATH, 'r', encoding='utf-8') as f:
+        geojson_data = json.load(f)
+
+    # Центр карты
+    lats = []
+    lons = []
+    for feature in geojson_data['features']:
+        coords = feature['geometry']['coordinates']
+        for lon, lat in coords:
+            lats.append(lat)
+            lons.append(lon)
+    center = [sum(lats) / len(lats), sum(lons) / len(lons)]
+
+    # Создаём карту
+    m = folium.Map(location=center, zoom_start=12, tiles='OpenStreetMap')
+
+    # Группы по скорости
+    speed_red = folium.FeatureGroup(name=f'0–{yellow_lower:.1f} км/ч (красный)', show=True)
+    speed_yellow = folium.FeatureGroup(name=f'{yellow_lower:.1f}–{yellow_upper:.1f} км/ч (жёлтый)', show=True)
+
+    # Добавляем сегменты
+    for feature in geojson_data['features']:
+        if feature['geometry']['type'] != 'LineString':
+            continue
+
+        coords = feature['geometry']['coordinates']
+        path = [(lat, lon) for lon, lat in coords]
+        speed = feature['properties'].get('speed_kmh', 0)
+
+        if speed < yellow_lower:
+            color = 'red'
+            layer = speed_red
+        elif speed < yellow_upper:
+            color = 'yellow'
+            layer = speed_yellow
+        else:
+            continue
+
+        folium.PolyLine(
+            locations=path,
+            color=color,
+            weight=5,
+            opacity=0.8,
+            popup=folium.Popup(f"Скорость: {speed:.1f} км/ч", parse_html=True)
+        ).add_to(layer)
+
+    # Добавляем группы
+    speed_red.add_to(m)
+    speed_yellow.add_to(m)
 
 # Легенда
 legend_html = f'''
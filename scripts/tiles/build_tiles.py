@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from road_network import load_road_network
+from tile_store import build_layer, open_archive, read_segments
+
+ARCHIVE_PATH = '../../sources/tiles/tiles.sqlite'
+ROADS_SHP_PATH = '../../sources/UDS/Граф Иркутск_link.SHP'
+# Слой -> GeoJSON с сегментами и сохраняемые в тайлах свойства (слой сегментов
+# показывает stats_transports/visualize_segments.py)
+SEGMENT_SOURCES = {
+    'transport_segments': ('../stats_transports/segments_yellow_red_on_roads.geojson',
+                           ['speed_kmh', 'uuid', 'start_time']),
+}
+MIN_ZOOM = 10
+MAX_ZOOM = 16
+
+
+def road_layer():
+    """Геометрии и свойства дорог из кэша дорожной сети"""
+    road_net = load_road_network(ROADS_SHP_PATH)
+    properties = pd.DataFrame({
+        'NO': np.asarray(road_net.link_no),
+        'length_m': np.round(np.asarray(road_net.link_length_m), 1),
+    })
+    return road_net.road_geoms, properties
+
+
+def parse_arguments():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Нарезка УДС и скоростных сегментов на тайлы')
+    parser.add_argument('--archive', default=ARCHIVE_PATH, help='Архив тайлов (SQLite)')
+    parser.add_argument('--layers', nargs='+', choices=['roads'] + list(SEGMENT_SOURCES),
+                        help='Слои для нарезки (по умолчанию все, для которых есть данные)')
+    parser.add_argument('--min-zoom', type=int, default=MIN_ZOOM, help='Минимальный масштаб')
+    parser.add_argument('--max-zoom', type=int, default=MAX_ZOOM, help='Максимальный масштаб')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    layers = args.layers or ['roads'] + [name for name, (path, _) in SEGMENT_SOURCES.items()
+                                         if os.path.exists(path)]
+
+    print(f"Нарезка тайлов (масштабы {args.min_zoom}–{args.max_zoom}) в {args.archive}")
+    conn = open_archive(args.archive, create=True)
+    try:
+        for name in layers:
+            if name == 'roads':
+                geoms, properties = road_layer()
+            else:
+                path, columns = SEGMENT_SOURCES[name]
+                if not os.path.exists(path):
+                    print(f"  {name}: файл {path} не найден, пропускаем")
+                    continue
+                geoms, properties = read_segments(path, columns)
+            build_layer(conn, name, geoms, properties, args.min_zoom, args.max_zoom)
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    print(f"Архив тайлов сохранен в {args.archive}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from tile_store import DEFAULT_PORT, open_archive, read_layers, read_tile
+
+ARCHIVE_PATH = '../../sources/tiles/tiles.sqlite'
+TILE_PATH = re.compile(r'^/(?P<layer>[\w-]+)/(?P<zoom>\d+)/(?P<x>\d+)/(?P<y>\d+)\.geojson$')
+EMPTY_TILE = b'{"type":"FeatureCollection","features":[]}'
+
+
+class TileRequestHandler(BaseHTTPRequestHandler):
+    """
+    Отдает тайлы из архива: /<слой>/<z>/<x>/<y>.geojson и описание слоев /layers.json
+    """
+
+    archive_path = None
+    _local = threading.local()
+
+    def _archive(self):
+        # Соединение SQLite — отдельное для каждого потока сервера
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = open_archive(self.archive_path)
+        return conn
+
+    def _send(self, body, content_type='application/json', gzip=False, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-cache')
+        if gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/layers.json':
+            layers = read_layers(self._archive())
+            self._send(json.dumps(layers, ensure_ascii=False).encode('utf-8'))
+            return
+
+        match = TILE_PATH.match(path)
+        if match is None:
+            self._send(b'{"error":"not found"}', status=404)
+            return
+        data = read_tile(self._archive(), match['layer'], int(match['zoom']), int(match['x']), int(match['y']))
+        if data is None:
+            # Пустой тайл — обычный ответ, а не ошибка: в нем просто нет объектов
+            self._send(EMPTY_TILE)
+        else:
+            self._send(data, gzip=True)
+
+    def log_message(self, format, *args):
+        # Без записи каждого запроса тайла в консоль
+        pass
+
+
+def parse_arguments():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Локальный сервер тайлов УДС и скоростных сегментов')
+    parser.add_argument('--archive', default=ARCHIVE_PATH, help='Архив тайлов (build_tiles.py)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Порт сервера')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    if not os.path.exists(args.archive):
+        print(f"Архив тайлов не найден: {args.archive}. Сначала запустите build_tiles.py", file=sys.stderr)
+        sys.exit(1)
+
+    TileRequestHandler.archive_path = os.path.abspath(args.archive)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), TileRequestHandler)
+    print(f"Сервер тайлов: http://127.0.0.1:{args.port} (архив {args.archive})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import avl_store
+from gtfs_export import GtfsWriter, route_tables
+from route_batch import (CSV_PATH, ROADS_SHP_PATH, ensure_store, init_worker, load_route_list, prepare_routing,
+                         take_cache_entries, worker)
+from route_cache import load_route_cache
+from route_pipeline import prepare_track
+
+OUTPUT_FILE = '../../sources/gtfs/city_gtfs.zip'
+READ_COLUMNS = ['uuid', 'signal_time', 'lat', 'lon', 'speed']
+
+
+def route_gtfs_tables(store_dir, vehicle_type, route):
+    """
+    Таблицы GTFS одного маршрута в процессе-исполнителе
+
+    Возвращает:
+        tuple: (таблицы (gtfs_export.route_tables) или None, если данных нет;
+            новые записи кэша маршрутов для основного процесса)
+    """
+    df = avl_store.read_route(store_dir, vehicle_type, route, columns=READ_COLUMNS)
+    df = prepare_track(df)
+    if df.empty:
+        return None, take_cache_entries()
+    tables = route_tables(vehicle_type, route, df, worker.get('road_net'),
+                          worker.get('route_cache'), worker.get('router'))
+    return tables, take_cache_entries()
+
+
+def parse_arguments():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='GTFS-архив города по всем маршрутам из routes.json')
+    parser.add_argument('--csv', default=CSV_PATH, help='Месячный CSV с AVL-данными')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Число процессов')
+    parser.add_argument('--no-match', action='store_true',
+                        help='Формы рейсов по точкам треков, без привязки к дорогам')
+    parser.add_argument('--output', default=OUTPUT_FILE, help='ZIP-архив GTFS')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    start = time.perf_counter()
+
+    store_dir = ensure_store(args.csv)
+    roads_shp, route_cache = None, None
+    if not args.no_match:
+        route_cache = load_route_cache(prepare_routing(ROADS_SHP_PATH))
+        roads_shp = ROADS_SHP_PATH
+
+    routes = load_route_list()
+    print(f"Маршрутов: {len(routes)}, процессов: {args.workers}")
+
+    # Таблицы маршрутов считаются параллельно, в архив пишет только основной процесс
+    with GtfsWriter(args.output) as writer, \
+            ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                initargs=(roads_shp,)) as executor:
+        futures = [executor.submit(route_gtfs_tables, store_dir, vehicle_type, route)
+                   for vehicle_type, route in routes]
+        for (vehicle_type, route), future in zip(routes, futures):
+            try:
+                tables, cache_entries = future.result()
+            except Exception as e:
+                print(f"  {vehicle_type} {route}: ошибка — {e}")
+                continue
+            if route_cache is not None:
+                route_cache.merge(cache_entries)
+            if tables is None:
+                print(f"  {vehicle_type} {route}: нет данных")
+                continue
+            writer.add(tables)
+            print(f"  {vehicle_type} {route}: остановок {len(tables['stops.txt'])}, "
+                  f"рейсов {len(tables['trips.txt'])}")
+    if route_cache is not None:
+        # Записи кэша маршрутов всех процессов сохраняются один раз из основного процесса
+        route_cache.save()
+
+    counts = writer.counts
+    print(f"Маршрутов: {counts['routes.txt']}, остановок: {counts['stops.txt']}, "
+          f"рейсов: {counts['trips.txt']}, записей расписания: {counts['stop_times.txt']}")
+    print(f"GTFS сохранен в {args.output}")
+    print(f"Готово за {time.perf_counter() - start:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
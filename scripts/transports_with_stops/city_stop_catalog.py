@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import avl_store
+from route_batch import CSV_PATH, ensure_store, load_route_list
+from stop_detection import STOP_MERGE_DISTANCE_M, aggregate_stops, detect_stops, merge_stops
+
+OUTPUT_DIR = '../../sources/stops'
+READ_COLUMNS = ['uuid', 'signal_time', 'lat', 'lon', 'speed']
+
+
+def route_stops(store_dir, vehicle_type, route):
+    """
+    Остановки одного маршрута — та же логика, что в transports_with_stops.py
+    (выполняется в отдельном процессе)
+
+    Параметры:
+        store_dir (str): Каталог колоночного хранилища AVL-данных
+        vehicle_type (str): Тип транспорта
+        route (str): Номер маршрута
+
+    Возвращает:
+        DataFrame: Объединенные остановки маршрута с колонками vehicle_type, route
+    """
+    df = avl_store.read_route(store_dir, vehicle_type, route, columns=READ_COLUMNS)
+    df = df.dropna(subset=['lat', 'lon', 'speed', 'signal_time']).sort_values('signal_time')
+    if df.empty:
+        return pd.DataFrame()
+
+    # По маршруту едет несколько ТС: продолжительность стоянки считается по каждому uuid
+    stops, _ = detect_stops(df, group_column='uuid')
+    if len(stops) == 0:
+        return pd.DataFrame()
+    if len(stops) > 1:
+        stops, _ = aggregate_stops(stops)
+        stops['stop_id'] = 'stop_' + stops.index.astype(str)
+    stops.insert(0, 'vehicle_type', vehicle_type)
+    stops.insert(1, 'route', route)
+    return stops.drop(columns=['stop_cluster', 'signal_time'], errors='ignore')
+
+
+def parse_arguments():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Справочник остановок города по всем маршрутам')
+    parser.add_argument('--csv', default=CSV_PATH, help='Месячный CSV с AVL-данными')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Число процессов')
+    parser.add_argument('--merge-distance', type=float, default=STOP_MERGE_DISTANCE_M,
+                        help='Порог объединения остановок разных маршрутов, м')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help='Каталог для результатов')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    start = time.perf_counter()
+
+    store_dir = ensure_store(args.csv)
+    routes = load_route_list()
+    print(f"Маршрутов: {len(routes)}, процессов: {args.workers}")
+
+    route_tables = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(route_stops, store_dir, vehicle_type, route)
+                   for vehicle_type, route in routes]
+        for (vehicle_type, route), future in zip(routes, futures):
+            stops = future.result()
+            if stops.empty:
+                print(f"  {vehicle_type} {route}: остановки не найдены")
+                continue
+            print(f"  {vehicle_type} {route}: {len(stops)} остановок")
+            route_tables.append(stops)
+
+    if not route_tables:
+        print("Остановки не найдены ни на одном маршруте")
+        sys.exit(1)
+
+    all_stops = pd.concat(route_tables, ignore_index=True)
+    catalogue, labels = merge_stops(all_stops, args.merge_distance)
+
+    # Связь остановок маршрутов с остановками справочника
+    route_stop_links = all_stops[['vehicle_type', 'route', 'stop_id', 'is_first', 'is_last']].rename(
+        columns={'stop_id': 'route_stop_id'}
+    )
+    route_stop_links['stop_id'] = catalogue['stop_id'].to_numpy()[labels]
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    catalogue_file = os.path.join(args.output_dir, 'city_stops.csv')
+    links_file = os.path.join(args.output_dir, 'route_stops.csv')
+    catalogue.to_csv(catalogue_file, index=False, sep=';')
+    route_stop_links.to_csv(links_file, index=False, sep=';')
+
+    print(f"Остановок маршрутов: {len(all_stops)}, в справочнике города: {len(catalogue)}")
+    print(f"Справочник остановок сохранен в {catalogue_file}")
+    print(f"Связи маршрутов и остановок сохранены в {links_file}")
+    print(f"Готово за {time.perf_counter() - start:.1f} с")
+
+
+if __name__ == "__main__":
+    main()